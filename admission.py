@@ -0,0 +1,329 @@
+import hashlib
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_db, DB_NAME
+
+# Most requests in flight in this process before new ones get 429; 0 = no limit.
+# Off by default: a gthread worker already runs at most GUNICORN_THREADS at once,
+# and a page load's parallel reads should not be shed
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "0"))
+SHED_RETRY_AFTER = float(os.getenv("SHED_RETRY_AFTER", "1"))
+# "<tokens per second>/<burst>" for writes, per session and per route; "0" = no limit.
+# Buckets live in each worker process
+RATE_LIMIT_SESSION = os.getenv("RATE_LIMIT_SESSION", "5/20")
+RATE_LIMIT_ROUTE = os.getenv("RATE_LIMIT_ROUTE", "100/200")
+RATE_LIMIT_KEYS = int(os.getenv("RATE_LIMIT_KEYS", "10000"))
+# Proxies in front of the app that append to X-Forwarded-For (Render runs one); 0 = trust none
+FORWARDED_PROXIES = int(os.getenv("FORWARDED_PROXIES", "1"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# A claim whose request never finished (worker killed) is given up after this long
+IDEMPOTENCY_PENDING_TTL = float(os.getenv("IDEMPOTENCY_PENDING_TTL", "60"))
+IDEMPOTENCY_PURGE_EVERY = 256
+IDEMPOTENCY_KEY_MAX = 255
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# WSGI environ flag: AsyncApp.guarded already admitted this request before handing it to Flask
+ADMITTED_ENVIRON = "hms.admitted"
+
+# Idempotency claim outcomes
+CLAIMED = "claimed"
+REPLAY = "replay"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
+
+
+def parse_rate(spec):
+    """"5/20" -> (5.0, 20.0); "5" -> (5.0, 5.0); "0" -> (0.0, 0.0)"""
+    rate, _, burst = str(spec).partition("/")
+    rate = float(rate or 0)
+    return rate, float(burst) if burst else rate
+
+
+def retry_after(seconds):
+    """Retry-After value: whole seconds, at least 1"""
+    return str(max(1, math.ceil(seconds)))
+
+
+def new_session_id():
+    """Stored in the session at login so each login gets its own rate limit bucket"""
+    return secrets.token_urlsafe(12)
+
+
+def client_addr(remote_addr, forwarded, proxies=FORWARDED_PROXIES):
+    """Client address as ProxyFix(x_for=proxies) sees it: the entry the last trusted proxy appended"""
+    hops = [hop.strip() for hop in (forwarded or "").split(",") if hop.strip()]
+    if proxies and len(hops) >= proxies:
+        return hops[-proxies]
+    return remote_addr
+
+
+def actor(session, addr):
+    """Rate limit and idempotency scope: the login session, else the client address"""
+    return session.get("sid") or session.get("email") or addr
+
+
+def idempotent(view):
+    """Mark a view (or a Resource method) as honouring the Idempotency-Key header"""
+    view.idempotent = True
+    return view
+
+
+# --------------------------------------------------
+# TOKEN BUCKETS
+# --------------------------------------------------
+class RateLimiter:
+    """Token bucket per key, refilled at `rate` per second up to `burst`.
+
+    Only the least recently used `maxkeys` buckets are kept; a bucket left
+    alone for burst/rate seconds is full again, so dropping it loses nothing.
+    """
+
+    def __init__(self, rate, burst, maxkeys=RATE_LIMIT_KEYS):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.maxkeys = maxkeys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def take(self, key):
+        """0 if a token was taken, else seconds until one is available"""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxkeys:
+                self._buckets.popitem(last=False)
+            if allowed:
+                return 0
+            self.limited += 1
+            return (1 - tokens) / self.rate
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "keys": len(self._buckets), "limited": self.limited}
+
+
+# --------------------------------------------------
+# LOAD SHEDDING + RATE LIMITS
+# --------------------------------------------------
+class Guard:
+    """Admission check run before a request does any work.
+
+    Past `max_in_flight` concurrent requests new ones are refused outright;
+    writes also spend a token from their session's and their route's bucket.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, session_rate=RATE_LIMIT_SESSION, route_rate=RATE_LIMIT_ROUTE):
+        self.max_in_flight = max_in_flight
+        self.sessions = RateLimiter(*parse_rate(session_rate))
+        self.routes = RateLimiter(*parse_rate(route_rate))
+        self.in_flight = 0
+        self.peak = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def admit(self, actor, route, write):
+        """None when admitted (call leave() when done), else (error, retry after seconds)"""
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return "Server busy, retry shortly", SHED_RETRY_AFTER
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        if write:
+            wait = self.sessions.take(actor) or self.routes.take(route)
+            if wait:
+                self.leave()
+                return "Too many requests", wait
+        return None
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "peak": self.peak,
+            "max_in_flight": self.max_in_flight,
+            "shed": self.shed,
+            "sessions": self.sessions.stats(),
+            "routes": self.routes.stats(),
+        }
+
+
+# --------------------------------------------------
+# IDEMPOTENCY KEYS
+# --------------------------------------------------
+class IdempotencyStore:
+    """Stored responses to writes sent with an Idempotency-Key, kept `ttl` seconds.
+
+    The first request with a key claims it; a retry while it still runs is
+    told so, a retry after it finished gets its response back, and reusing
+    the key for a different body is refused. Rows are keyed by a digest of
+    (actor, route, key), so keys from different users never meet.
+    """
+
+    def __init__(self, path=DB_NAME, ttl=IDEMPOTENCY_TTL, pending_ttl=IDEMPOTENCY_PENDING_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self._claims = 0
+        self.counts = {CLAIMED: 0, REPLAY: 0, IN_PROGRESS: 0, MISMATCH: 0}
+
+    def init_schema(self):
+        with get_db(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key BLOB PRIMARY KEY,
+                    fingerprint BLOB NOT NULL,
+                    status INTEGER,
+                    content_type TEXT,
+                    body BLOB,
+                    expires REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+
+    @staticmethod
+    def scope(actor, route, client_key):
+        return hashlib.sha1(json.dumps([actor, route, client_key]).encode()).digest()
+
+    @staticmethod
+    def fingerprint(body):
+        return hashlib.sha1(body or b"").digest()
+
+    def claim(self, key, fingerprint):
+        """(CLAIMED, None), (REPLAY, (status, content_type, body)), (IN_PROGRESS, None) or (MISMATCH, None)"""
+        now = time.time()
+        with get_db(self.path) as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND expires <= ?", (key, now))
+            claimed = conn.execute(
+                "INSERT OR IGNORE INTO idempotency_keys (key, fingerprint, expires) VALUES (?, ?, ?)",
+                (key, fingerprint, now + self.pending_ttl)
+            ).rowcount
+            row = None if claimed else conn.execute(
+                "SELECT fingerprint, status, content_type, body FROM idempotency_keys WHERE key = ?", (key,)
+            ).fetchone()
+            self._claims += 1
+            if self._claims % IDEMPOTENCY_PURGE_EVERY == 0:
+                conn.execute("DELETE FROM idempotency_keys WHERE expires <= ?", (now,))
+
+        if claimed or row is None:
+            outcome, stored = CLAIMED, None
+        elif bytes(row[0]) != fingerprint:
+            outcome, stored = MISMATCH, None
+        elif row[1] is None:
+            outcome, stored = IN_PROGRESS, None
+        else:
+            outcome, stored = REPLAY, (row[1], row[2], bytes(row[3]))
+        self.counts[outcome] += 1
+        return outcome, stored
+
+    def complete(self, key, status, content_type, body):
+        with get_db(self.path) as conn:
+            conn.execute(
+                "UPDATE idempotency_keys SET status = ?, content_type = ?, body = ?, expires = ? WHERE key = ? AND status IS NULL",
+                (status, content_type, body, time.time() + self.ttl, key)
+            )
+
+    def release(self, key):
+        """Drop an unfinished claim so a retry runs the request again"""
+        with get_db(self.path) as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND status IS NULL", (key,))
+
+    def stats(self):
+        with get_db(self.path) as conn:
+            size = conn.execute("SELECT COUNT(*) FROM idempotency_keys WHERE expires > ?", (time.time(),)).fetchone()[0]
+        return dict(self.counts, stored=size, ttl=self.ttl)
+
+
+guard = Guard()
+idempotency_keys = IdempotencyStore()
+
+
+# --------------------------------------------------
+# FLASK HOOK
+# --------------------------------------------------
+def install(app, guard=guard, keys=idempotency_keys):
+    """Load shedding, write rate limits and Idempotency-Key replay for `app`.
+
+    Views opt in to idempotency with @idempotent. Responses below 500 are
+    stored; a 5xx or an exception releases the key so a retry runs again.
+    """
+    from flask import g, jsonify, request, session
+
+    def refuse(status, error, wait):
+        response = jsonify({"error": error})
+        response.status_code = status
+        response.headers["Retry-After"] = retry_after(wait)
+        return response
+
+    def honours_key():
+        view = app.view_functions.get(request.endpoint)
+        # flask_restful resources: the marker is on the method handler
+        view = getattr(getattr(view, "view_class", None), request.method.lower(), view)
+        return getattr(view, "idempotent", False)
+
+    @app.before_request
+    def _admit():
+        if request.endpoint in (None, "static"):
+            return None
+        # remote_addr is the client's once app.py wraps the app in ProxyFix
+        who = actor(session, request.remote_addr)
+        route = f"{request.method} {request.url_rule.rule}"
+        if not request.environ.get(ADMITTED_ENVIRON):
+            refused = guard.admit(who, route, request.method in WRITE_METHODS)
+            if refused:
+                return refuse(429, *refused)
+            g.admitted = True
+
+        client_key = request.headers.get("Idempotency-Key")
+        if client_key is None or not honours_key():
+            return None
+        if not client_key or len(client_key) > IDEMPOTENCY_KEY_MAX:
+            return jsonify({"error": f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX} characters"}), 400
+        key = keys.scope(who, route, client_key)
+        outcome, stored = keys.claim(key, keys.fingerprint(request.get_data()))
+        if outcome == CLAIMED:
+            g.idempotency_key = key
+            return None
+        if outcome == IN_PROGRESS:
+            return refuse(409, "A request with this Idempotency-Key is still in progress", 1)
+        if outcome == MISMATCH:
+            return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+        status, content_type, body = stored
+        response = app.response_class(body, status=status, content_type=content_type)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    @app.after_request
+    def _remember(response):
+        key = g.pop("idempotency_key", None)
+        if key is not None:
+            if response.status_code < 500 and not response.is_streamed:
+                keys.complete(key, response.status_code, response.content_type, response.get_data())
+            else:
+                keys.release(key)
+        return response
+
+    @app.teardown_request
+    def _leave(exc):
+        # after_request is skipped when the view raised
+        key = g.pop("idempotency_key", None)
+        if key is not None:
+            keys.release(key)
+        if g.pop("admitted", False):
+            guard.leave()
+
+    return guard
@@ -1,12 +1,27 @@
 import os
 import sqlite3
-import firebase_admin
 import json
-from firebase_admin import auth, credentials, firestore
-from flask import Flask, request, jsonify, session, redirect
+import threading
+from flask import Flask, Response, g, request, jsonify, session, redirect
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from mailer import Outbox, transport_from_env
+from doctor_directory import DoctorDirectory, FirestoreDoctorSource, LocalDoctorSource
+from patient_index import PatientIndex
+from scheduling import Scheduler, SlotConflict, InvalidSlot, normalize_time
+from bulk_import import AppointmentImporter, request_rows
+from migrations import migrate
+from role_cache import RoleCache, FOUND, NO_USER, NO_ROLE
+from change_feed import ChangeFeed, StaleCursor, parse_tables
+from archive import Archive
+from firestore_sync import FirestoreSync
+from reports import Reports, PERIODS, parse_range
+import admission
+import audit
+import http_cache
+import metrics
+from lazy import Lazy, Once
+from database import get_db, pool_stats, encode_cursor, decode_cursor, page_limit
 
 # --------------------------------------------------
 # LOAD ENV
@@ -15,8 +30,6 @@ load_dotenv()
 
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
-FROM_EMAIL = os.getenv("FROM_EMAIL")
 SECRET_KEY = os.getenv("SECRET_KEY", "hospital-management-secret-key")
 
 DB = "hospital.db"
@@ -26,62 +39,91 @@ DB = "hospital.db"
 # --------------------------------------------------
 app = Flask(__name__, static_folder="static", static_url_path="")
 app.secret_key = SECRET_KEY
+# 🌐 Client address from X-Forwarded-For behind Render's proxy (rate limits key on it)
+if admission.FORWARDED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=admission.FORWARDED_PROXIES)
+# 🗜️ gzip/brotli, list ETags from table versions, fingerprinted static assets.
+# Installed first so its after_request runs last, on the final response
+http_cache.install(app)
+# 📝 One queued audit record per request, written in batches off-thread
+auditor = audit.install(app)
+# ⏱️ Per-route latency, SQLite/Firestore/SendGrid segments, ?_profile=1
+metrics.install(app)
 
 # --------------------------------------------------
-# FIREBASE INIT (SAFE, ONCE)
+# FIREBASE INIT (LAZY, ONCE) — RENDER SAFE
 # --------------------------------------------------
-# FIREBASE INIT (SAFE, ONCE) — RENDER SAFE
-if not firebase_admin._apps:
-    firebase_json = os.getenv("FIREBASE_CREDENTIALS")
-    if not firebase_json:
-        raise RuntimeError("FIREBASE_CREDENTIALS not set")
-
-    cred = credentials.Certificate(json.loads(firebase_json))
-    firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+# firebase_admin and the Firestore client are imported and built on first
+# use, so workers start serving without paying for them up front.
+_firebase_lock = threading.Lock()
+
+def firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _firebase_lock:
+        if not firebase_admin._apps:
+            firebase_json = os.getenv("FIREBASE_CREDENTIALS")
+            if not firebase_json:
+                raise RuntimeError("FIREBASE_CREDENTIALS not set")
+
+            cred = credentials.Certificate(json.loads(firebase_json))
+            firebase_admin.initialize_app(cred)
+    return firebase_admin.get_app()
+
+def firestore_client():
+    from firebase_admin import firestore
+    return metrics.instrument_firestore(firestore.client(firebase_app()))
+
+db = Lazy(firestore_client)
+# 🔁 With SYNC_INTERVAL set, patients and doctors are read from and written to
+# SQLite, and a background pass keeps them in step with Firestore
+sync = FirestoreSync(db, DB)
+doctor_directory = DoctorDirectory(LocalDoctorSource(DB, sync) if sync.enabled else FirestoreDoctorSource(db))
+patient_index = PatientIndex(db, DB)
+outbox = Outbox(transport_from_env(), DB)
+scheduler = Scheduler(DB)
+feed = ChangeFeed(DB)
+# Synced doctor edits change the bookable slots
+sync.on_change("doctors", scheduler.load)
+# 🗄️ Appointments past ARCHIVE_HORIZON_DAYS move to per-month files
+archiver = Archive(DB)
+# 📊 Utilization reports from trigger-maintained daily rollups
+reports = Reports(DB, archiver)
 
 
 # --------------------------------------------------
-# SQLITE INIT (APPOINTMENTS ONLY)
+# SQLITE INIT (VERSIONED MIGRATIONS, FIRST REQUEST)
 # --------------------------------------------------
 def init_db():
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient TEXT NOT NULL,
-            doctor TEXT NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            status TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-init_db()
+    # Both the booking and the package/* resource schemas live in hospital.db
+    migrate(DB)
+    patient_index.init_schema()
+    outbox.init_schema()
+    scheduler.init_schema()
+    sync.init_schema()
+    admission.idempotency_keys.init_schema()
+    archiver.start()
+    sync.start()
+    # Emails left pending or retrying before a restart go out without waiting for a booking
+    outbox.start()
+
+ensure_schema = Once(init_db)
+
+@app.before_request
+def _ensure_schema():
+    ensure_schema()
+
+# 🚦 429 past MAX_IN_FLIGHT requests or a write rate limit; Idempotency-Key
+# replay on @admission.idempotent views. After the schema hook: keys live in SQLite
+guard = admission.install(app)
 
 # --------------------------------------------------
-# EMAIL (SENDGRID)
+# EMAIL (SENDGRID OUTBOX)
 # --------------------------------------------------
-def send_notification_email(to, subject, html):
-    if not SENDGRID_API_KEY or not FROM_EMAIL:
-        print("⚠️ Email not configured")
-        return
-
-    try:
-        message = Mail(
-            from_email=FROM_EMAIL,
-            to_emails=to,
-            subject=subject,
-            html_content=html
-        )
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        sg.send(message)
-    except Exception as e:
-        print("❌ Email error:", e)
+def send_notification_email(conn, to, subject, html):
+    """Queue an email in the caller's transaction; the outbox workers send it"""
+    outbox.enqueue(conn, to, subject, html)
 
 # --------------------------------------------------
 # AUTH HELPERS
@@ -89,6 +131,24 @@ def send_notification_email(to, subject, html):
 def is_logged_in():
     return session.get("logged_in") is True
 
+def lookup_role(email):
+    """Two remote calls: Firebase Auth for the uid, Firestore for the role"""
+    from firebase_admin import auth
+
+    firebase_app()
+    try:
+        with metrics.segment("auth"):
+            user = auth.get_user_by_email(email)
+    except auth.UserNotFoundError:
+        return NO_USER, None
+
+    user_doc = db.collection("users").document(user.uid).get()
+    if not user_doc.exists:
+        return NO_ROLE, None
+    return FOUND, user_doc.to_dict().get("role")
+
+role_cache = RoleCache(lookup_role)
+
 # --------------------------------------------------
 # ROUTES
 # --------------------------------------------------
@@ -107,21 +167,21 @@ def login():
         session["logged_in"] = True
         session["role"] = "admin"
         session["email"] = email
+        session["sid"] = admission.new_session_id()
         return jsonify({"success": True, "role": "admin"})
 
-    # ✅ Firebase user login (email existence + role check)
+    # ✅ Firebase user login (email existence + role check, cached)
     try:
-        user = auth.get_user_by_email(email)
-
-        user_doc = db.collection("users").document(user.uid).get()
-        if not user_doc.exists:
+        outcome, role = role_cache.get(email)
+        if outcome == NO_USER:
+            return jsonify({"error": "Invalid credentials"}), 401
+        if outcome == NO_ROLE:
             return jsonify({"error": "User role not found"}), 403
 
-        role = user_doc.to_dict().get("role")
-
         session["logged_in"] = True
         session["email"] = email
         session["role"] = role
+        session["sid"] = admission.new_session_id()
 
         return jsonify({"success": True, "role": role})
 
@@ -141,7 +201,10 @@ def signup():
     if not email or not password or not role:
         return jsonify({"error": "Missing fields"}), 400
 
+    from firebase_admin import auth, firestore
+
     try:
+        firebase_app()
         user = auth.create_user(email=email, password=password)
 
         db.collection("users").document(user.uid).set({
@@ -149,6 +212,8 @@ def signup():
             "role": role,
             "created_at": firestore.SERVER_TIMESTAMP
         })
+        # Drop any cached "unknown user" answer for this email
+        role_cache.invalidate(email)
 
         return jsonify({"success": True})
 
@@ -171,6 +236,7 @@ def home():
 # PATIENTS (FIREBASE)
 # --------------------------------------------------
 @app.route("/create_patient", methods=["POST"])
+@admission.idempotent
 def create_patient():
     if not is_logged_in():
         return jsonify({"error": "Unauthorized"}), 401
@@ -182,14 +248,38 @@ def create_patient():
     if not name or not email:
         return jsonify({"error": "Missing fields"}), 400
 
-    db.collection("patients").add({
+    from firebase_admin import firestore
+
+    if sync.enabled:
+        # Local first; the sync pass pushes it to Firestore
+        g.audit_entity = sync.write("patients", {"name": name, "email": email})
+        return jsonify({"message": "Patient registered successfully"})
+
+    _, ref = db.collection("patients").add({
         "name": name,
         "email": email,
-        "created_at": firestore.SERVER_TIMESTAMP
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "updated_at": firestore.SERVER_TIMESTAMP
     })
+    # Write-through so the next booking resolves locally
+    patient_index.upsert(ref.id, name, email)
+    g.audit_entity = ref.id
 
     return jsonify({"message": "Patient registered successfully"})
 
+@app.route("/patients/resolve", methods=["POST"])
+def resolve_patients():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    names = (request.json or {}).get("names")
+    if not isinstance(names, list):
+        return jsonify({"error": "Missing fields"}), 400
+    if not all(isinstance(name, str) for name in names):
+        return jsonify({"error": "names must be strings"}), 400
+
+    return jsonify(patient_index.resolve_many(names))
+
 # --------------------------------------------------
 # DOCTORS (FIREBASE) — FIXED UNDEFINED ISSUE
 # --------------------------------------------------
@@ -198,24 +288,19 @@ def get_doctors():
     if not is_logged_in():
         return jsonify([]), 401
 
-    doctors = []
-    docs = db.collection("doctors").stream()
+    doctors, etag, _ = doctor_directory.get()
 
-    for doc in docs:
-        d = doc.to_dict()
-
-        # 🔥 FIX: guarantee specialization always exists
-        doctors.append({
-            "name": d.get("name", "Unknown"),
-            "specialization": d.get("specialization", "General")
-        })
-
-    return jsonify(doctors)
+    response = jsonify(doctors)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    # 304 when the browser's If-None-Match still matches
+    return response.make_conditional(request)
 
 # --------------------------------------------------
 # CREATE APPOINTMENT
 # --------------------------------------------------
 @app.route("/create_appointment", methods=["POST"])
+@admission.idempotent
 def create_appointment():
     if not is_logged_in():
         return jsonify({"error": "Unauthorized"}), 401
@@ -228,71 +313,250 @@ def create_appointment():
 
     if not all([patient, doctor, date, time]):
         return jsonify({"error": "Missing fields"}), 400
+    if not all(isinstance(v, str) for v in (patient, doctor, date, time)):
+        return jsonify({"error": "patient, doctor, date and time must be strings"}), 400
 
-    # 🔥 Get patient email from Firebase
-    patient_docs = db.collection("patients").where("name", "==", patient).stream()
-    patient_email = None
+    # 🗓️ Reject invalid or already taken slots before any remote work
+    time = normalize_time(time)
+    try:
+        scheduler.check(doctor, date, time)
+    except InvalidSlot as e:
+        return jsonify({"error": str(e)}), 400
+    except SlotConflict as e:
+        return jsonify({"error": str(e)}), 409
 
-    for doc in patient_docs:
-        patient_email = doc.to_dict().get("email")
-        break
+    # 🔥 Get patient email from the local index (Firebase only on a miss)
+    found = patient_index.resolve(patient)
+    patient_email = found and found["email"]
 
     if not patient_email:
         return jsonify({"error": "Patient not found"}), 404
 
-    # ✅ Save appointment (SQLite)
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO appointments (patient, doctor, date, time, status)
-        VALUES (?, ?, ?, ?, ?)
-    """, (patient, doctor, date, time, "Booked"))
-    conn.commit()
-    conn.close()
-
-    # 📧 Email
-    send_notification_email(
-        patient_email,
-        "Appointment Confirmation",
-        f"""
-        <h3>Appointment Confirmed</h3>
-        <p><b>Patient:</b> {patient}</p>
-        <p><b>Doctor:</b> {doctor}</p>
-        <p><b>Date:</b> {date}</p>
-        <p><b>Time:</b> {time}</p>
-        """
-    )
+    # ✅ Save appointment + 📧 queue email (one SQLite transaction)
+    if not save_appointment(patient, doctor, date, time, patient_email):
+        return jsonify({"error": f"{doctor} is already booked at {date} {time}"}), 409
+    outbox.notify()
 
     return jsonify({"message": "Appointment booked successfully"})
 
+
+def save_appointment(patient, doctor, date, time, patient_email):
+    """Insert + queue the confirmation in one transaction; False if the slot was taken.
+
+    Shared with the ASGI mode, which runs it on its SQLite executor.
+    """
+    try:
+        with get_db(DB) as conn:
+            conn.execute("""
+                INSERT INTO appointments (patient, doctor, date, time, status)
+                VALUES (?, ?, ?, ?, ?)
+            """, (patient, doctor, date, time, "Booked"))
+
+            send_notification_email(
+                conn,
+                patient_email,
+                "Appointment Confirmation",
+                f"""
+                <h3>Appointment Confirmed</h3>
+                <p><b>Patient:</b> {patient}</p>
+                <p><b>Doctor:</b> {doctor}</p>
+                <p><b>Date:</b> {date}</p>
+                <p><b>Time:</b> {time}</p>
+                """
+            )
+    except sqlite3.IntegrityError:
+        # Another worker took the slot first; UNIQUE index is authoritative
+        scheduler.book(doctor, date, time)
+        return False
+    scheduler.book(doctor, date, time)
+    return True
+
 # --------------------------------------------------
 # APPOINTMENT HISTORY
 # --------------------------------------------------
+APPOINTMENT_FILTERS = ("doctor", "date", "status")
+APPOINTMENT_PAGE_SIZE = int(os.getenv("APPOINTMENT_PAGE_SIZE", "100"))
+STREAM_BATCH = 500
+
+
+def appointment_dict(r):
+    return {
+        "id": r[0],
+        "patient": r[1],
+        "doctor": r[2],
+        "date": r[3],
+        "time": r[4],
+        "status": r[5]
+    }
+
+
+def appointment_query(args, limit=None):
+    """Build the keyset query for /appointments: newest first, filtered, after cursor"""
+    clauses, params = [], []
+    for field in APPOINTMENT_FILTERS:
+        if args.get(field):
+            clauses.append(f"{field} = ?")
+            params.append(args[field])
+
+    cursor = decode_cursor(args.get("cursor"), 1)
+    if cursor:
+        clauses.append("id < ?")
+        params.append(cursor[0])
+
+    sql = "SELECT id, patient, doctor, date, time, status FROM appointments"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY id DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def appointment_history(args, limit):
+    """Rows for ?history=1: newest date first, across the hot table and the archives"""
+    clauses, params = [], []
+    for field in APPOINTMENT_FILTERS:
+        if args.get(field):
+            clauses.append(f"{field} = ?")
+            params.append(args[field])
+
+    newest = oldest = None
+    cursor = decode_cursor(args.get("cursor"), 2)
+    if cursor:
+        clauses.append("(date, id) < (?, ?)")
+        params.extend(cursor)
+        newest = str(cursor[0])[:7]
+    if args.get("date"):
+        newest = oldest = args["date"][:7]
+
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    with get_db(DB) as conn:
+        def query(schema):
+            return conn.execute(f"SELECT id, patient, doctor, date, time, status FROM {schema}.appointments{where} "
+                                "ORDER BY date DESC, id DESC LIMIT ?", params + [limit]).fetchall()
+
+        return archiver.history(conn, query, lambda r: (r[3], r[0]), limit, newest, oldest)
+
+
+def stream_appointments(sql, params, ndjson):
+    with get_db(DB) as conn:
+        cur = conn.execute(sql, params)
+        if not ndjson:
+            yield "["
+        first = True
+        while True:
+            rows = cur.fetchmany(STREAM_BATCH)
+            if not rows:
+                break
+            for r in rows:
+                line = json.dumps(appointment_dict(r))
+                if ndjson:
+                    yield line + "\n"
+                else:
+                    yield line if first else "," + line
+                first = False
+        if not ndjson:
+            yield "]"
+
+
 @app.route("/appointments")
+@http_cache.versioned("appointments", when=is_logged_in)
 def get_appointments():
     if not is_logged_in():
         return jsonify([]), 401
 
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, patient, doctor, date, time, status
-        FROM appointments
-        ORDER BY id DESC
-    """)
-    rows = cur.fetchall()
-    conn.close()
-
-    return jsonify([
-        {
-            "id": r[0],
-            "patient": r[1],
-            "doctor": r[2],
-            "date": r[3],
-            "time": r[4],
-            "status": r[5]
-        } for r in rows
-    ])
+    history = request.args.get("history") in ("1", "true")
+    try:
+        decode_cursor(request.args.get("cursor"), 2 if history else 1)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 🌊 Streamed modes never hold the whole result set in memory
+    mode = request.args.get("format")
+    if mode in ("ndjson", "stream"):
+        limit = request.args.get("limit")
+        sql, params = appointment_query(request.args, page_limit(limit) if limit else None)
+        return Response(
+            stream_appointments(sql, params, mode == "ndjson"),
+            mimetype="application/x-ndjson" if mode == "ndjson" else "application/json"
+        )
+
+    limit = page_limit(request.args.get("limit"), APPOINTMENT_PAGE_SIZE)
+    # 🗄️ ?history=1 also reads the archived months; the default stays on recent rows
+    if history:
+        rows = appointment_history(request.args, limit + 1)
+        response = jsonify([appointment_dict(r) for r in rows[:limit]])
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            response.headers["X-Next-Cursor"] = encode_cursor(last[3], last[0])
+        return response
+
+    sql, params = appointment_query(request.args, limit + 1)
+    with get_db(DB) as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    response = jsonify([appointment_dict(r) for r in rows[:limit]])
+    if len(rows) > limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[limit - 1][0])
+    return response
+
+@app.route("/appointments/stats")
+@http_cache.versioned("appointments", "report", when=is_logged_in)
+def appointment_stats():
+    """Dashboard totals from the trigger-kept rollups, archived months included"""
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    with get_db(DB) as conn:
+        by_status = dict(conn.execute("SELECT status, n FROM report_status").fetchall())
+        patients = conn.execute("SELECT COUNT(*) FROM report_patient").fetchone()[0]
+    return jsonify({
+        "appointments": sum(by_status.values()),
+        "patients": patients,
+        "by_status": by_status
+    })
+
+# --------------------------------------------------
+# CHANGE FEED (POLL ?since= OR SERVER-SENT EVENTS)
+# --------------------------------------------------
+@app.route("/changes")
+def get_changes():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        tables = parse_tables(request.args.get("tables"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # No ?since=: just the current position, to read before loading the lists
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"changes": [], "seq": feed.current()})
+
+    limit = page_limit(request.args.get("limit"), 500, 5000)
+    try:
+        changes, seq = feed.read(since, limit, tables)
+    except StaleCursor as e:
+        return jsonify({"error": str(e), "seq": feed.current()}), 410
+    return jsonify({"changes": changes, "seq": seq, "more": len(changes) == limit})
+
+@app.route("/changes/stream")
+def stream_changes():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        tables = parse_tables(request.args.get("tables"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # EventSource resends the last id it saw when it reconnects
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    return Response(feed.stream(since, tables), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # --------------------------------------------------
 # DELETE APPOINTMENT
@@ -303,14 +567,150 @@ def delete_appointment():
         return jsonify({"error": "Unauthorized"}), 401
 
     data = request.json
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM appointments WHERE id = ?", (data["id"],))
-    conn.commit()
-    conn.close()
+    with get_db(DB) as conn:
+        row = conn.execute(
+            "SELECT doctor, date, time, status FROM appointments WHERE id = ?", (data["id"],)
+        ).fetchone()
+        conn.execute("DELETE FROM appointments WHERE id = ?", (data["id"],))
+
+    if row and row["status"] == "Booked":
+        scheduler.release(row["doctor"], row["date"], row["time"])
 
     return jsonify({"message": "Appointment deleted"})
 
+# --------------------------------------------------
+# BULK IMPORT (CSV / NDJSON)
+# --------------------------------------------------
+@app.route("/appointments/import", methods=["POST"])
+def import_appointments():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    importer = AppointmentImporter(
+        patient_index, scheduler, DB,
+        doctor_names=lambda: [d["name"] for d in doctor_directory.get()[0]]
+    )
+    return jsonify(importer.run(request_rows(request)))
+
+# --------------------------------------------------
+# FREE SLOTS
+# --------------------------------------------------
+@app.route("/slots")
+def free_slots():
+    if not is_logged_in():
+        return jsonify([]), 401
+
+    return jsonify(scheduler.next_free(
+        doctor=request.args.get("doctor"),
+        specialization=request.args.get("specialization"),
+        n=page_limit(request.args.get("n"), 5, 100)
+    ))
+
+# --------------------------------------------------
+# REPORTS (?from=&to=, LAST 30 DAYS BY DEFAULT)
+# --------------------------------------------------
+def report_range():
+    return parse_range(request.args.get("from"), request.args.get("to"))
+
+@app.route("/reports/bookings")
+def report_bookings():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+    period = request.args.get("period", "day")
+    if period not in PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(PERIODS)}"}), 400
+    try:
+        start, end = report_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(reports.bookings(start, end, period, request.args.get("doctor")))
+
+@app.route("/reports/rates")
+def report_rates():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+    by = request.args.get("by", "doctor")
+    if by not in ("doctor", "specialization"):
+        return jsonify({"error": "by must be doctor or specialization"}), 400
+    try:
+        start, end = report_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(reports.rates(start, end, by))
+
+@app.route("/reports/slots")
+def report_slots():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        start, end = report_range()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(reports.busiest_slots(
+        start, end,
+        specialization=request.args.get("specialization"),
+        top=page_limit(request.args.get("top"), 5, 100)
+    ))
+
+# --------------------------------------------------
+# POOL & CACHE METRICS
+# --------------------------------------------------
+@app.route("/db_stats")
+def db_stats():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(pool_stats())
+
+@app.route("/cache_stats")
+def cache_stats():
+    if not is_logged_in():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({
+        "doctors": doctor_directory.stats(),
+        "patients": patient_index.stats(),
+        "email_outbox": outbox.stats(),
+        "roles": role_cache.stats(),
+        "audit": auditor.stats(),
+        "change_feed": feed.stats(),
+        "archive": archiver.stats(),
+        "firestore_sync": sync.stats(),
+        "http": http_cache.stats(),
+        "admission": dict(guard.stats(), idempotency=admission.idempotency_keys.stats())
+    })
+
+@app.route("/metrics")
+def prometheus_metrics():
+    # Scrapers cannot log in: they send METRICS_TOKEN as a bearer token. Without
+    # one configured only an admin session can read it
+    if not (metrics.authorized(request.headers.get("Authorization")) or session.get("role") == "admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    pools = {}
+    for stat in pool_stats():
+        for key in ("hits", "misses", "waits", "wait_time", "opened", "idle"):
+            pools[(stat["path"], key)] = stat[key]
+    outbox_counts = {(status,): n for status, n in outbox.stats().items() if status != "running"}
+    audit_counts = {(k,): v for k, v in auditor.stats().items() if k in ("queued", "written", "dropped", "errors")}
+    caches = {}
+    for name, cache in (("doctors", doctor_directory.cache), ("roles", role_cache.cache)):
+        for key, value in cache.stats().items():
+            if key in ("hits", "misses", "size", "evictions"):
+                caches[(name, key)] = value
+    guarded = guard.stats()
+    admission_counts = {("in_flight",): guarded["in_flight"], ("shed",): guarded["shed"],
+                        ("session_limited",): guarded["sessions"]["limited"],
+                        ("route_limited",): guarded["routes"]["limited"]}
+    admission_counts.update({(k,): v for k, v in admission.idempotency_keys.counts.items()})
+
+    extra = (
+        metrics.gauges("hms_db_pool", "SQLite pool counters", ("path", "stat"), pools)
+        + metrics.gauges("hms_email_outbox", "Outbox rows by status", ("status",), outbox_counts)
+        + metrics.gauges("hms_audit", "Audit queue counters", ("stat",), audit_counts)
+        + metrics.gauges("hms_cache", "Cache counters", ("cache", "stat"), caches)
+        + metrics.gauges("hms_admission", "Shed, rate limited and idempotent requests", ("stat",), admission_counts)
+    )
+    return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
+
 # --------------------------------------------------
 # RUN
 # --------------------------------------------------
@@ -0,0 +1,270 @@
+import argparse
+import datetime
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from database import get_db, DB_NAME
+
+# --------------------------------------------------
+# SETTINGS (ENV OVERRIDABLE)
+# --------------------------------------------------
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Appointments dated before today - horizon leave the hot tables
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Pause between batches so request writers get the lock in between
+ARCHIVE_PAUSE = float(os.getenv("ARCHIVE_PAUSE", "0.05"))
+# 0 = no in-process job; run `python archive.py` from cron instead
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "0"))
+
+SCHEMA = "arc"
+_MONTH_FILE = re.compile(r"^appointments-(\d{4}-\d{2})\.db$")
+
+# Archived tables: key, date column, columns, DDL for a month file.
+# No foreign keys: the patients and doctors stay in the main database.
+ARCHIVE_TABLES = {
+    "appointments": ("id", "date", "id, patient, doctor, date, time, status", [
+        """
+        CREATE TABLE IF NOT EXISTS {db}.appointments (
+            id INTEGER PRIMARY KEY,
+            patient TEXT NOT NULL,
+            doctor TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            status TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS {db}.idx_appointments_date ON appointments(date, id)",
+        "CREATE INDEX IF NOT EXISTS {db}.idx_appointments_doctor ON appointments(doctor, date, id)",
+    ]),
+    "appointment": ("app_id", "appointment_date", "app_id, pat_id, doc_id, appointment_date", [
+        """
+        CREATE TABLE IF NOT EXISTS {db}.appointment (
+            app_id INTEGER PRIMARY KEY,
+            pat_id INTEGER NOT NULL,
+            doc_id INTEGER NOT NULL,
+            appointment_date DATE NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS {db}.idx_appointment_date ON appointment(appointment_date, app_id)",
+    ]),
+}
+
+
+class Archive:
+    """Per-month SQLite files holding appointments older than the horizon.
+
+    The hot tables keep only recent rows, so listings, counts and indexes
+    stop growing with history. history() reads the hot table and then the
+    month files newest first, attaching one at a time.
+
+    Moving is batched and idempotent: rows are copied with INSERT OR IGNORE
+    and then deleted from the hot table, each batch committing on its own,
+    so an interrupted run picks up where it stopped.
+    """
+
+    def __init__(self, path=DB_NAME, directory=ARCHIVE_DIR, horizon_days=ARCHIVE_HORIZON_DAYS,
+                 batch_size=ARCHIVE_BATCH_SIZE, interval_hours=ARCHIVE_INTERVAL_HOURS):
+        self.path = path
+        self.directory = directory
+        self.horizon_days = horizon_days
+        self.batch_size = batch_size
+        self.interval_hours = interval_hours
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.moved = {table: 0 for table in ARCHIVE_TABLES}
+        self.runs = 0
+        self.last_run = None
+        self.last_error = None
+
+    # --------------------------------------------------
+    # MONTH FILES
+    # --------------------------------------------------
+    def month_path(self, month):
+        return os.path.join(self.directory, f"appointments-{month}.db")
+
+    def months(self, newest=None, oldest=None):
+        """Archived months ('YYYY-MM'), newest first, optionally within [oldest, newest]"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        months = sorted((m.group(1) for m in map(_MONTH_FILE.match, names) if m), reverse=True)
+        return [m for m in months if (newest is None or m <= newest) and (oldest is None or m >= oldest)]
+
+    @contextmanager
+    def attached(self, conn, month):
+        """Attach one month file to conn as SCHEMA; conn must not be in a transaction"""
+        conn.execute("ATTACH DATABASE ? AS " + SCHEMA, (self.month_path(month),))
+        try:
+            yield SCHEMA
+        finally:
+            conn.execute("DETACH DATABASE " + SCHEMA)
+
+    # --------------------------------------------------
+    # HISTORY READS
+    # --------------------------------------------------
+    def history(self, conn, query, key, limit, newest=None, oldest=None):
+        """Up to limit rows across the hot table and the archives, newest first.
+
+        query(schema) runs on conn and returns at most limit rows of
+        `{schema}.<table>`, ordered by key descending. Month files hold
+        disjoint date ranges, so they are read in order and only until
+        limit rows have come back.
+        """
+        hot = query("main")
+        cold = []
+        for month in self.months(newest, oldest):
+            with self.attached(conn, month) as schema:
+                cold.extend(query(schema))
+            if len(cold) >= limit:
+                break
+        return list(heapq.merge(hot, cold, key=key, reverse=True))[:limit]
+
+    # --------------------------------------------------
+    # MOVING ROWS
+    # --------------------------------------------------
+    def cutoff(self):
+        return (datetime.date.today() - datetime.timedelta(days=self.horizon_days)).isoformat()
+
+    def archive_batch(self, table, cutoff):
+        """Move up to batch_size of the oldest rows dated before cutoff; returns (seen, moved)"""
+        key, column, _, _ = ARCHIVE_TABLES[table]
+        with get_db(self.path) as conn:
+            rows = conn.execute(f"SELECT {key}, substr({column}, 1, 7) FROM {table} WHERE {column} < ? "
+                                f"ORDER BY {column} LIMIT ?", (cutoff, self.batch_size)).fetchall()
+        by_month = {}
+        for row_id, month in rows:
+            by_month.setdefault(month, []).append(row_id)
+        moved = sum(self._move(table, month, ids) for month, ids in sorted(by_month.items()))
+        return len(rows), moved
+
+    def _move(self, table, month, ids):
+        key, _, columns, ddl = ARCHIVE_TABLES[table]
+        marks = ", ".join("?" * len(ids))
+        os.makedirs(self.directory, exist_ok=True)
+        with get_db(self.path) as conn:
+            with self.attached(conn, month) as schema:
+                try:
+                    for statement in ddl:
+                        conn.execute(statement.format(db=schema))
+                    conn.execute(f"INSERT OR IGNORE INTO {schema}.{table} ({columns}) "
+                                 f"SELECT {columns} FROM main.{table} WHERE {key} IN ({marks})", ids)
+                    # The hot counters drop with the delete triggers; keep the total whole.
+                    # The report rollups keep these rows: their triggers skip while moving.
+                    conn.execute("UPDATE archive_state SET moving = 1")
+                    moved = conn.execute(f"DELETE FROM main.{table} WHERE {key} IN ({marks})", ids).rowcount
+                    conn.execute("UPDATE archive_state SET moving = 0")
+                    conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (moved, f"{table}_archived"))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        return moved
+
+    def run(self, max_batches=None):
+        """Archive everything past the horizon, batch by batch; returns rows moved per table"""
+        cutoff = self.cutoff()
+        totals = {table: 0 for table in ARCHIVE_TABLES}
+        batches = 0
+        for table in ARCHIVE_TABLES:
+            while not self._stop.is_set() and (max_batches is None or batches < max_batches):
+                seen, moved = self.archive_batch(table, cutoff)
+                batches += 1
+                totals[table] += moved
+                self.moved[table] += moved
+                if seen < self.batch_size:
+                    break
+                time.sleep(ARCHIVE_PAUSE)
+        self.runs += 1
+        self.last_run = time.time()
+        return totals
+
+    # --------------------------------------------------
+    # BACKGROUND JOB
+    # --------------------------------------------------
+    def start(self):
+        """Run every interval_hours in a daemon thread; a no-op when the interval is 0"""
+        if self.interval_hours <= 0:
+            return
+        # Re-start after fork: the thread does not survive into the child
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+        threading.Thread(target=self._run, name="archive", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid and not self._stop.is_set():
+            try:
+                totals = self.run()
+                if any(totals.values()):
+                    print("🗄️ Archived appointments:", totals)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print("❌ Archive error:", e)
+            self._stop.wait(self.interval_hours * 3600)
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "horizon_days": self.horizon_days,
+            "cutoff": self.cutoff(),
+            "months": len(self.months()),
+            "moved": dict(self.moved),
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+            "running": self._pid == os.getpid(),
+        }
+
+    def status(self):
+        """Rows per archived month and table, newest first"""
+        report = []
+        with get_db(self.path) as conn:
+            for month in self.months():
+                with self.attached(conn, month) as schema:
+                    counts = {}
+                    for table in ARCHIVE_TABLES:
+                        exists = conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                                              (table,)).fetchone()
+                        counts[table] = conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0] if exists else 0
+                report.append(dict(month=month, **counts))
+        return report
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+if __name__ == "__main__":
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Move old appointments into per-month archive databases")
+    parser.add_argument("db", nargs="?", default=DB_NAME)
+    parser.add_argument("--horizon-days", type=int, default=ARCHIVE_HORIZON_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, help="stop after this many; the next run resumes")
+    parser.add_argument("--status", action="store_true", help="list archived months and row counts")
+    args = parser.parse_args()
+
+    migrate(args.db)
+    archive = Archive(args.db, horizon_days=args.horizon_days, batch_size=args.batch_size)
+    if args.status:
+        print(json.dumps(archive.status(), indent=2))
+    else:
+        started = time.perf_counter()
+        totals = archive.run(args.max_batches)
+        print(f"✅ Archived {totals} before {archive.cutoff()} in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,597 @@
+"""Optional asyncio serving mode.
+
+    uvicorn --factory asgi_app:create_app --workers 4
+
+/login, /doctor, /create_patient and /create_appointment run natively on the
+event loop with the async Firestore client; SQLite work goes through a
+bounded thread pool. /changes/stream is served on the loop too, so an open
+dashboard holds no thread. Every other route is handed to the Flask app on
+the same pool, so both modes share sessions, caches and the database.
+"""
+import asyncio
+import contextvars
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from firebase_admin import auth, firestore, firestore_async
+from werkzeug.http import dump_cookie, parse_etags
+
+import metrics
+from admission import (ADMITTED_ENVIRON, CLAIMED, IN_PROGRESS, MISMATCH, IDEMPOTENCY_KEY_MAX, WRITE_METHODS,
+                       actor, client_addr, idempotent, new_session_id, retry_after)
+from change_feed import StaleCursor, RESET_FRAME, SSE_HEARTBEAT, SSE_MAX_PENDING, parse_tables
+from role_cache import FOUND, NO_USER, NO_ROLE
+from scheduling import SlotConflict, InvalidSlot, normalize_time
+
+ASYNC_DB_WORKERS = int(os.getenv("ASYNC_DB_WORKERS", "8"))
+ASYNC_REMOTE_WORKERS = int(os.getenv("ASYNC_REMOTE_WORKERS", "16"))
+# One event loop is not bounded by a thread count like a gthread worker
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "64"))
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.body = body
+        self.session = None
+        self.entity_id = None
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.args = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+
+    def json(self):
+        """Body as a dict, or None when Flask's request.json would not yield one"""
+        if not self.headers.get("content-type", "").split(";")[0].strip().endswith("json"):
+            return None
+        try:
+            data = json.loads(self.body or b"null")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def cookie(self, name):
+        morsel = SimpleCookie(self.headers.get("cookie", "")).get(name)
+        return morsel.value if morsel else None
+
+
+class AsyncApp:
+    """ASGI app in front of `flask_module` (the imported app.py)"""
+
+    def __init__(self, flask_module, adb, db_workers=ASYNC_DB_WORKERS,
+                 remote_workers=ASYNC_REMOTE_WORKERS, email_transport=None, max_in_flight=ASYNC_MAX_IN_FLIGHT):
+        self.wsgi = flask_module
+        self.flask = flask_module.app
+        flask_module.guard.max_in_flight = max_in_flight
+        self.adb = adb
+        self.email_transport = email_transport
+        self.db_pool = ThreadPoolExecutor(db_workers, thread_name_prefix="asgi-db")
+        # Firebase Auth has no async API; its calls get their own pool
+        self.remote_pool = ThreadPoolExecutor(remote_workers, thread_name_prefix="asgi-remote")
+        self.serializer = self.flask.session_interface.get_signing_serializer(self.flask)
+        self.routes = {
+            ("POST", "/login"): self.login,
+            ("GET", "/doctor"): self.get_doctors,
+            ("POST", "/create_patient"): self.create_patient,
+            ("POST", "/create_appointment"): self.create_appointment,
+        }
+        # Long-lived responses that write to `send` themselves
+        self.streams = {
+            ("GET", "/changes/stream"): self.stream_changes,
+        }
+        self._role_flights = {}
+        self._doctor_lock = None
+        self._outbox_wake = None
+        self._outbox_task = None
+
+    # --------------------------------------------------
+    # EXECUTORS
+    # --------------------------------------------------
+    async def db(self, fn, *args):
+        # Copy the context so SQLite time lands on this request's metrics
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.db_pool, context.run, fn, *args)
+
+    async def remote(self, fn, *args):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.remote_pool, context.run, fn, *args)
+
+    # --------------------------------------------------
+    # ASGI ENTRY
+    # --------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        self.wsgi.ensure_schema()
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        request = Request(scope, body)
+
+        stream = self.streams.get((request.method, request.path))
+        if stream and await stream(request, receive, send):
+            return
+
+        handler = self.routes.get((request.method, request.path))
+        response = None
+        if handler:
+            started = time.perf_counter()
+            token = metrics.begin()
+            try:
+                response = await self.guarded(handler, request)
+            except Exception:
+                traceback.print_exc()
+                response = (500, [("content-type", "text/plain")], b"Internal Server Error")
+            metrics.end(token, request.method, request.path, response[0] if response else 0,
+                        time.perf_counter() - started)
+        if response is None:
+            # A native handler that declined has already been admitted by guarded()
+            return await self.call_wsgi(scope, body, send, admitted=handler is not None)
+
+        status, headers, payload = response
+        # Flask's audit hook does not see natively served routes
+        session = request.session or {}
+        self.wsgi.auditor.record(
+            actor=session.get("email"), role=session.get("role"), method=request.method,
+            route=request.path, path=request.path, status=status, entity_id=request.entity_id,
+            latency_ms=round((time.perf_counter() - started) * 1000, 3),
+        )
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def guarded(self, handler, request):
+        """Load shedding, write rate limits and Idempotency-Key replay, as admission.install does for Flask"""
+        guard, keys = self.wsgi.guard, self.wsgi.admission.idempotency_keys
+        addr = client_addr((request.scope.get("client") or ("",))[0], request.headers.get("x-forwarded-for"))
+        who = actor(self.load_session(request), addr)
+        route = f"{request.method} {request.path}"
+        refused = guard.admit(who, route, request.method in WRITE_METHODS)
+        if refused:
+            error, wait = refused
+            return self.json_response({"error": error}, 429, headers=[("retry-after", retry_after(wait))])
+        claimed = None
+        try:
+            client_key = request.headers.get("idempotency-key")
+            if client_key is None or not getattr(handler, "idempotent", False):
+                return await handler(request)
+            if not client_key or len(client_key) > IDEMPOTENCY_KEY_MAX:
+                return None     # Flask answers with the 400
+            key = keys.scope(who, route, client_key)
+            outcome, stored = await self.db(keys.claim, key, keys.fingerprint(request.body))
+            if outcome == IN_PROGRESS:
+                return self.json_response({"error": "A request with this Idempotency-Key is still in progress"}, 409,
+                                          headers=[("retry-after", "1")])
+            if outcome == MISMATCH:
+                return self.json_response({"error": "Idempotency-Key was already used for a different request"}, 422)
+            if outcome != CLAIMED:
+                status, content_type, body = stored
+                return status, [("content-type", content_type), ("idempotent-replayed", "true")], body
+
+            claimed = key
+            response = await handler(request)
+            if response is not None and response[0] < 500:
+                content_type = dict(response[1]).get("content-type")
+                await self.db(keys.complete, key, response[0], content_type, response[2])
+                claimed = None
+            return response
+        finally:
+            if claimed is not None:
+                await self.db(keys.release, claimed)
+            guard.leave()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start_outbox()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._outbox_task:
+                    self.wsgi.outbox.waker = None
+                    self._outbox_task.cancel()
+                self.db_pool.shutdown(wait=False)
+                self.remote_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --------------------------------------------------
+    # RESPONSES & SESSIONS
+    # --------------------------------------------------
+    def json_response(self, obj, status=200, session=None, headers=()):
+        # Same bytes as Flask's jsonify outside debug mode
+        body = (self.flask.json.dumps(obj, separators=(",", ":")) + "\n").encode()
+        headers = [("content-type", "application/json"), ("vary", "Cookie"), *headers]
+        if session is not None:
+            headers.append(("set-cookie", self.session_cookie(session)))
+        return status, headers, body
+
+    def load_session(self, request):
+        request.session = {}
+        value = request.cookie(self.flask.config["SESSION_COOKIE_NAME"])
+        if value:
+            try:
+                max_age = int(self.flask.permanent_session_lifetime.total_seconds())
+                request.session = self.serializer.loads(value, max_age=max_age)
+            except Exception:
+                pass
+        return request.session
+
+    def session_cookie(self, session):
+        config = self.flask.config
+        return dump_cookie(
+            config["SESSION_COOKIE_NAME"],
+            self.serializer.dumps(dict(session)),
+            path=config["SESSION_COOKIE_PATH"] or config["APPLICATION_ROOT"],
+            domain=config["SESSION_COOKIE_DOMAIN"],
+            secure=config["SESSION_COOKIE_SECURE"],
+            httponly=config["SESSION_COOKIE_HTTPONLY"],
+            samesite=config["SESSION_COOKIE_SAMESITE"],
+        )
+
+    @staticmethod
+    def logged_in(session):
+        return session.get("logged_in") is True
+
+    # --------------------------------------------------
+    # WSGI FALLBACK
+    # --------------------------------------------------
+    def environ(self, scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for raw_name, raw_value in scope["headers"]:
+            name = raw_name.decode("latin-1").upper().replace("-", "_")
+            value = raw_value.decode("latin-1")
+            if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[name] = value
+                continue
+            key = "HTTP_" + name
+            environ[key] = environ[key] + "," + value if key in environ else value
+        return environ
+
+    async def call_wsgi(self, scope, body, send, admitted=False):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = headers
+
+        environ = self.environ(scope, body)
+        environ[ADMITTED_ENVIRON] = admitted
+        iterable = await self.db(self.flask, environ, start_response)
+        chunks = iter(iterable)
+        try:
+            # Pull chunks on the pool so streamed responses stay streamed
+            first = await self.db(next, chunks, b"")
+            await send({
+                "type": "http.response.start",
+                "status": started["status"],
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in started["headers"]],
+            })
+            chunk = first
+            while True:
+                following = await self.db(next, chunks, None)
+                await send({"type": "http.response.body", "body": chunk, "more_body": following is not None})
+                if following is None:
+                    break
+                chunk = following
+        finally:
+            if hasattr(iterable, "close"):
+                await self.db(iterable.close)
+
+    # --------------------------------------------------
+    # ROLE LOOKUP (async twin of app.lookup_role)
+    # --------------------------------------------------
+    async def lookup_role(self, email):
+        try:
+            with metrics.segment("auth"):
+                user = await self.remote(auth.get_user_by_email, email)
+        except auth.UserNotFoundError:
+            return NO_USER, None
+
+        with metrics.segment("firestore"):
+            user_doc = await self.adb.collection("users").document(user.uid).get()
+        metrics.count_documents(1)
+        if not user_doc.exists:
+            return NO_ROLE, None
+        return FOUND, user_doc.to_dict().get("role")
+
+    async def role(self, email):
+        role_cache = self.wsgi.role_cache
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        key = role_cache.key(email)
+        result = role_cache.cache.get(key)
+        kind = "hit"
+        if result is None:
+            kind = "miss"
+            flight = self._role_flights.get(key)
+            if flight is None:
+                flight = self._role_flights[key] = loop.create_task(self.load_role(key, email))
+                flight.add_done_callback(lambda _: self._role_flights.pop(key, None))
+            else:
+                role_cache.flight.coalesced += 1
+            result = await asyncio.shield(flight)
+        role_cache.observe(kind, loop.time() - started)
+        return result
+
+    async def load_role(self, key, email):
+        # Stored by the flight, so the time is when its lookup began
+        started = time.time()
+        result = await self.lookup_role(email)
+        self.wsgi.role_cache.store(key, result, started)
+        return result
+
+    # --------------------------------------------------
+    # ROUTES
+    # --------------------------------------------------
+    async def login(self, request):
+        data = request.json()
+        if data is None:
+            return None
+        email = data.get("email")
+        password = data.get("password")
+        session = self.load_session(request)
+
+        if email == self.wsgi.ADMIN_EMAIL and password == self.wsgi.ADMIN_PASSWORD:
+            session.update(logged_in=True, role="admin", email=email, sid=new_session_id())
+            return self.json_response({"success": True, "role": "admin"}, session=session)
+
+        try:
+            outcome, role = await self.role(email)
+            if outcome == NO_USER:
+                return self.json_response({"error": "Invalid credentials"}, 401)
+            if outcome == NO_ROLE:
+                return self.json_response({"error": "User role not found"}, 403)
+
+            session.update(logged_in=True, email=email, role=role, sid=new_session_id())
+            return self.json_response({"success": True, "role": role}, session=session)
+
+        except Exception as e:
+            print("LOGIN ERROR:", e)
+            return self.json_response({"error": "Invalid credentials"}, 401)
+
+    async def get_doctors(self, request):
+        if not self.logged_in(self.load_session(request)):
+            return self.json_response([], 401)
+
+        directory = self.wsgi.doctor_directory
+        entry = directory.cache.get(directory.KEY)
+        if entry is None and self.wsgi.sync.enabled:
+            # Synced to SQLite: no Firestore read on a miss
+            entry = await self.db(directory.get)
+        if entry is None:
+            if self._doctor_lock is None:
+                self._doctor_lock = asyncio.Lock()
+            async with self._doctor_lock:
+                entry = directory.cache.peek(directory.KEY)
+                if entry is None:
+                    directory.ensure_listener()
+                    seen = directory.invalidations
+                    with metrics.segment("firestore"):
+                        raw = [doc.to_dict() async for doc in self.adb.collection("doctors").stream()]
+                    metrics.count_documents(len(raw))
+                    entry = directory.fill(raw, seen)
+        doctors, etag, _ = entry
+
+        headers = [("etag", f'"{etag}"'), ("cache-control", "private, no-cache")]
+        if parse_etags(request.headers.get("if-none-match")).contains(etag):
+            return 304, headers, b""
+        return self.json_response(doctors, headers=headers)
+
+    @idempotent
+    async def create_patient(self, request):
+        if not self.logged_in(self.load_session(request)):
+            return self.json_response({"error": "Unauthorized"}, 401)
+
+        data = request.json()
+        if data is None:
+            return None
+        name = data.get("name")
+        email = data.get("email")
+
+        if not name or not email:
+            return self.json_response({"error": "Missing fields"}, 400)
+
+        if self.wsgi.sync.enabled:
+            request.entity_id = await self.db(self.wsgi.sync.write, "patients", {"name": name, "email": email})
+            return self.json_response({"message": "Patient registered successfully"})
+
+        with metrics.segment("firestore"):
+            _, ref = await self.adb.collection("patients").add({
+                "name": name,
+                "email": email,
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "updated_at": firestore.SERVER_TIMESTAMP
+            })
+        await self.db(self.wsgi.patient_index.upsert, ref.id, name, email)
+        request.entity_id = ref.id
+
+        return self.json_response({"message": "Patient registered successfully"})
+
+    async def resolve_patient(self, name):
+        index = self.wsgi.patient_index
+        found = await self.db(index.lookup, name)
+        if found:
+            return found
+
+        index.remote_fallbacks += 1
+        with metrics.segment("firestore"):
+            docs = [doc async for doc in self.adb.collection("patients").where("name", "==", name).limit(1).stream()]
+        metrics.count_documents(len(docs))
+        for doc in docs:
+            d = doc.to_dict()
+            await self.db(index.upsert, doc.id, d.get("name", name), d.get("email"))
+            return {"doc_id": doc.id, "name": d.get("name", name), "email": d.get("email")}
+        return None
+
+    @idempotent
+    async def create_appointment(self, request):
+        if not self.logged_in(self.load_session(request)):
+            return self.json_response({"error": "Unauthorized"}, 401)
+
+        data = request.json()
+        if data is None:
+            return None
+        patient = data.get("patient")
+        doctor = data.get("doctor")
+        date = data.get("date")
+        time = data.get("time")
+
+        if not all([patient, doctor, date, time]):
+            return self.json_response({"error": "Missing fields"}, 400)
+        if not all(isinstance(v, str) for v in (patient, doctor, date, time)):
+            return self.json_response({"error": "patient, doctor, date and time must be strings"}, 400)
+
+        time = normalize_time(time)
+        try:
+            await self.db(self.wsgi.scheduler.check, doctor, date, time)
+        except InvalidSlot as e:
+            return self.json_response({"error": str(e)}, 400)
+        except SlotConflict as e:
+            return self.json_response({"error": str(e)}, 409)
+
+        found = await self.resolve_patient(patient)
+        patient_email = found and found["email"]
+
+        if not patient_email:
+            return self.json_response({"error": "Patient not found"}, 404)
+
+        if not await self.db(self.wsgi.save_appointment, patient, doctor, date, time, patient_email):
+            return self.json_response({"error": f"{doctor} is already booked at {date} {time}"}, 409)
+        self.notify_outbox()
+
+        return self.json_response({"message": "Appointment booked successfully"})
+
+    # --------------------------------------------------
+    # CHANGE FEED (SERVER-SENT EVENTS)
+    # --------------------------------------------------
+    async def stream_changes(self, request, receive, send):
+        """Same stream as Flask's /changes/stream; False hands errors to Flask"""
+        if not self.logged_in(self.load_session(request)):
+            return False
+        try:
+            tables = parse_tables(request.args.get("tables"))
+        except ValueError:
+            return False
+        since = request.headers.get("last-event-id") or request.args.get("since")
+        since = int(since) if since and since.isdigit() else None
+
+        feed = self.wsgi.feed
+        loop = asyncio.get_running_loop()
+        inbox = asyncio.Queue()
+        token, head = await self.db(
+            feed.subscribe, lambda batch: loop.call_soon_threadsafe(inbox.put_nowait, batch), tables)
+        disconnect = loop.create_task(receive())
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                            (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")],
+            })
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+            live = True
+            if since is not None:
+                try:
+                    frames = await self.db(feed.backfill, since, head, tables)
+                except StaleCursor:
+                    frames, live = [RESET_FRAME], False
+                if frames:
+                    await send({"type": "http.response.body", "body": "".join(frames).encode(), "more_body": True})
+            while live and not disconnect.done():
+                getter = loop.create_task(inbox.get())
+                await asyncio.wait({getter, disconnect}, timeout=SSE_HEARTBEAT,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    if not disconnect.done():
+                        await send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True})
+                    continue
+                batch = getter.result()
+                if batch is None or inbox.qsize() > SSE_MAX_PENDING:
+                    await send({"type": "http.response.body", "body": RESET_FRAME.encode(), "more_body": True})
+                    break
+                frames = "".join(frame for seq, _, frame in batch if since is None or seq > since)
+                if frames:
+                    await send({"type": "http.response.body", "body": frames.encode(), "more_body": True})
+            if not disconnect.done():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnect.cancel()
+            feed.unsubscribe(token)
+        return True
+
+    # --------------------------------------------------
+    # OUTBOX ON THE EVENT LOOP
+    # --------------------------------------------------
+    def start_outbox(self):
+        if self.email_transport is None:
+            return
+        loop = asyncio.get_running_loop()
+        self._outbox_wake = asyncio.Event()
+        # The process's only drainer: Flask routes wake it instead of starting the thread poller
+        self.wsgi.outbox.waker = lambda: loop.call_soon_threadsafe(self._outbox_wake.set)
+        self._outbox_task = loop.create_task(self._drain_outbox())
+
+    def notify_outbox(self):
+        if self._outbox_wake is not None:
+            self._outbox_wake.set()
+        else:
+            self.wsgi.outbox.notify()
+
+    async def _drain_outbox(self):
+        outbox = self.wsgi.outbox
+        while True:
+            try:
+                sent = await outbox.drain_async(self.email_transport, self.db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("❌ Outbox error:", e)
+                sent = 0
+            if not sent:
+                try:
+                    await asyncio.wait_for(self._outbox_wake.wait(), outbox.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._outbox_wake.clear()
+
+
+def create_app():
+    import app as flask_module
+    from mailer import async_transport_from_env
+    return AsyncApp(flask_module, firestore_async.client(flask_module.firebase_app()),
+                    email_transport=async_transport_from_env())
@@ -1,15 +1,235 @@
-import sqlite3
+import json
+import os
+import queue
+import threading
+import time
+
+from database import get_db, DB_NAME
+
+AUDIT_SINK = os.getenv("AUDIT_SINK", "sqlite")              # sqlite | file
+AUDIT_FILE = os.getenv("AUDIT_FILE", "audit.jsonl")
+AUDIT_FILE_MAX_BYTES = int(os.getenv("AUDIT_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+AUDIT_FILE_BACKUPS = int(os.getenv("AUDIT_FILE_BACKUPS", "5"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+
+# Record layout, in audit_logs column order
+FIELDS = ("ts", "actor", "role", "method", "route", "path", "status", "entity_id", "latency_ms", "action")
+
+
+# --------------------------------------------------
+# SINKS
+# --------------------------------------------------
+class SQLiteSink:
+    """One executemany transaction per batch into audit_logs"""
+
+    def __init__(self, path=DB_NAME):
+        self.path = path
+
+    def write(self, records):
+        with get_db(self.path) as conn:
+            conn.executemany(
+                f"INSERT INTO audit_logs ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                records
+            )
+
+
+class FileSink:
+    """Append-only JSON lines, rotated to .1 .. .N when the file passes max_bytes"""
+
+    def __init__(self, path=AUDIT_FILE, max_bytes=AUDIT_FILE_MAX_BYTES, backups=AUDIT_FILE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def _rotate(self):
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{n}"):
+                os.replace(f"{self.path}.{n}", f"{self.path}.{n + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, records):
+        lines = "".join(json.dumps(dict(zip(FIELDS, r))) + "\n" for r in records)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(lines) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def sink_from_env(path=DB_NAME):
+    return FileSink() if AUDIT_SINK == "file" else SQLiteSink(path)
+
+
+# --------------------------------------------------
+# AUDITOR
+# --------------------------------------------------
+class Auditor:
+    """Bounded queue drained by one background writer in batches.
+
+    record() never blocks: when the queue is full the record is dropped and
+    counted, so a slow disk cannot slow requests down.
+    """
+
+    def __init__(self, sink, maxsize=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize)
+        self._pid = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+
+    def record(self, actor=None, role=None, method=None, route=None, path=None,
+               status=None, entity_id=None, latency_ms=None, action=None):
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self._queue.put_nowait((time.time(), actor, role, method, route, path, status,
+                                    None if entity_id is None else str(entity_id), latency_ms, action))
+        except queue.Full:
+            self.dropped += 1
+
+    # --------------------------------------------------
+    # WRITER
+    # --------------------------------------------------
+    def start(self):
+        # Re-start after fork: the writer thread does not survive into the child
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        try:
+            self.sink.write(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            print("❌ Audit write error:", e)
+
+    def flush(self):
+        """Write everything queued so far on the calling thread"""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        for i in range(0, len(batch), self.batch_size):
+            self._write(batch[i:i + self.batch_size])
+
+    def stop(self, timeout=5):
+        if self._thread and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._pid = None
+        self.flush()
+
+    def stats(self):
+        return {
+            "sink": type(self.sink).__name__,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "running": self._pid == os.getpid(),
+        }
+
+
+auditor = Auditor(sink_from_env())
 
-DB_NAME = "database.db"
 
 def log_action(action):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    """Free-form audit entry (kept for existing callers)"""
+    auditor.record(action=action)
+
+
+# --------------------------------------------------
+# FLASK HOOK
+# --------------------------------------------------
+def install(app, auditor=auditor):
+    """Audit every request served by `app`, flask_restful resources included.
+
+    Routes can name the entity they touched with `g.audit_entity`; otherwise
+    the `id` URL argument or JSON field is used.
+    """
+    from flask import g, request, session
+
+    @app.before_request
+    def _audit_start():
+        g.audit_started = time.perf_counter()
+
+    @app.after_request
+    def _audit_record(response):
+        _record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _audit_teardown(exc):
+        # after_request is skipped when the view raised
+        _record(500)
 
-    cursor.execute(
-        "INSERT INTO audit_logs (action) VALUES (?)",
-        (action,)
-    )
+    def _record(status):
+        if g.get("audit_done") or request.endpoint == "static":
+            return
+        g.audit_done = True
+        started = g.get("audit_started")
+        entity = g.get("audit_entity")
+        if entity is None and request.view_args:
+            entity = request.view_args.get("id")
+        if entity is None and request.is_json:
+            # Already parsed and cached by the view in the common case
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                entity = body.get("id")
+        rule = request.url_rule
+        auditor.record(
+            actor=session.get("email"),
+            role=session.get("role"),
+            method=request.method,
+            route=rule.rule if rule else None,
+            path=request.path,
+            status=status,
+            entity_id=entity,
+            latency_ms=round((time.perf_counter() - started) * 1000, 3) if started else None,
+        )
 
-    conn.commit()
-    conn.close()
+    return auditor
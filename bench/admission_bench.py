@@ -0,0 +1,127 @@
+"""Retry storm against a slow Firestore, with and without admission control.
+
+--clients logged-in users each register --creates patients one after the
+other through POST /create_patient, while every Firestore call takes
+--latency seconds. A client gives up on an attempt after --timeout seconds
+and sends it again, up to --attempts times, as browsers and proxies do; the
+abandoned attempt keeps running on the server. On 429 or 409 the client
+waits for Retry-After.
+
+"before" runs with no limits and no Idempotency-Key; "after" sends a key per
+patient and runs with the default rate limits and MAX_IN_FLIGHT at
+--max-in-flight. Each mode runs in its own process against
+bench/standins.py and reports Firestore writes, duplicate patients, statuses
+and peak requests in flight.
+
+    python bench/admission_bench.py --clients 32 --latency 0.3 --timeout 0.1
+"""
+import argparse
+import collections
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(args, use_keys):
+    import standins
+
+    os.chdir(tempfile.mkdtemp(prefix="hms-admission-"))
+    store, fake_auth = standins.install(args.latency)
+    import app as app_module
+
+    app_module.ensure_schema()
+    sessions = []
+    for i in range(args.clients):
+        fake_auth.add_user(f"user{i}@example.com", "reception")
+        client = app_module.app.test_client()
+        client.post("/login", json={"email": f"user{i}@example.com", "password": "x"})
+        sessions.append(client.get_cookie("session").value)
+
+    statuses = collections.Counter()
+    lock = threading.Lock()
+    pool = ThreadPoolExecutor(args.clients * args.attempts)
+
+    def attempt(cookie, body, key):
+        client = app_module.app.test_client()
+        client.set_cookie("session", cookie)
+        response = client.post("/create_patient", json=body, headers={"Idempotency-Key": key} if key else {})
+        with lock:
+            statuses[response.status_code] += 1
+        return response.status_code, response.headers.get("Retry-After")
+
+    def run_client(n):
+        done = 0
+        for i in range(args.creates):
+            body = {"name": f"Client {n} patient {i}", "email": f"c{n}p{i}@example.com"}
+            key = f"client{n}-patient{i}" if use_keys else None
+            for _ in range(args.attempts):
+                future = pool.submit(attempt, sessions[n], body, key)
+                try:
+                    status, wait = future.result(timeout=args.timeout)
+                except TimeoutError:
+                    continue
+                if status in (409, 429):
+                    time.sleep(float(wait or 1))
+                    continue
+                done += status == 200
+                break
+        return done
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as clients:
+        created = sum(clients.map(run_client, range(args.clients)))
+    seconds = time.perf_counter() - started
+    pool.shutdown(wait=True)
+
+    guard = app_module.guard.stats()
+    print(json.dumps({
+        "seconds": round(seconds, 2),
+        "confirmed": created,
+        "patients_written": len(store.rows("patients")),
+        "duplicates": len(store.rows("patients")) - len({d["name"] for d in store.rows("patients").values()}),
+        "server_requests": sum(statuses.values()),
+        "statuses": dict(sorted(statuses.items())),
+        "peak_in_flight": guard["peak"],
+        "shed": guard["shed"],
+        "rate_limited": guard["sessions"]["limited"] + guard["routes"]["limited"],
+        "idempotency": app_module.admission.idempotency_keys.counts,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--creates", type=int, default=3, help="patients per client")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per Firestore call")
+    parser.add_argument("--timeout", type=float, default=0.1, help="client timeout per attempt")
+    parser.add_argument("--attempts", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--child", choices=("before", "after"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args, args.child == "after")
+
+    modes = {
+        "before": {"RATE_LIMIT_SESSION": "0", "RATE_LIMIT_ROUTE": "0", "MAX_IN_FLIGHT": "0"},
+        "after": {"RATE_LIMIT_SESSION": "5/20", "RATE_LIMIT_ROUTE": "100/200", "MAX_IN_FLIGHT": str(args.max_in_flight)},
+    }
+    report = {"clients": args.clients, "patients_requested": args.clients * args.creates,
+              "latency_ms": args.latency * 1000, "timeout_ms": args.timeout * 1000}
+    for mode, env in modes.items():
+        out = subprocess.check_output([sys.executable, __file__, "--child", mode] + sys.argv[1:],
+                                      env=dict(os.environ, **env), stderr=subprocess.DEVNULL, text=True)
+        report[mode] = json.loads(out.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Sync (WSGI threads) vs async (ASGI) serving at equal worker counts.
+
+Both modes run in-process against bench/standins.py, where every Firestore
+and Auth call sleeps --latency seconds. The sync mode gets --workers threads,
+as a gthread worker would; the async mode gets --concurrency in-flight
+requests on one event loop with --workers SQLite threads.
+
+    python bench/async_load_bench.py --requests 2000 --workers 8 --latency 0.02
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standins
+
+SLOTS = ",".join(f"{h:02d}:{m:02d}" for h in range(8, 20) for m in (0, 15, 30, 45))
+ROUTES = ("login", "doctor", "create_patient", "create_appointment")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else None
+
+
+def summarize(latencies, seconds):
+    report = {"requests": sum(len(v) for v in latencies.values()), "seconds": round(seconds, 3)}
+    report["rps"] = round(report["requests"] / seconds, 1)
+    for route, values in latencies.items():
+        report[route] = {f"p{p}_ms": round(percentile(values, p) * 1000, 2) for p in (50, 95, 99)}
+    return report
+
+
+class Workload:
+    """Deterministic request i -> (route, method, path, body)"""
+
+    def __init__(self, fake_auth, doctors, patients, tag):
+        self.fake_auth = fake_auth
+        self.doctors = doctors
+        self.patients = patients
+        self.tag = tag
+        self.slots = SLOTS.split(",")
+        self.start = datetime.date.today() + datetime.timedelta(days=1)
+
+    def request(self, i):
+        route = ROUTES[i % len(ROUTES)]
+        if route == "login":
+            # Unique users so every login misses the role cache
+            email = f"{self.tag}-user{i}@example.com"
+            self.fake_auth.add_user(email, "reception")
+            return route, "POST", "/login", {"email": email, "password": "x"}
+        if route == "doctor":
+            return route, "GET", "/doctor", None
+        if route == "create_patient":
+            return route, "POST", "/create_patient", {"name": f"{self.tag} patient {i}", "email": f"p{i}@example.com"}
+        n = i // len(ROUTES)
+        day, rest = divmod(n, self.doctors * len(self.slots))
+        doctor, slot = divmod(rest, len(self.slots))
+        return route, "POST", "/create_appointment", {
+            "patient": f"Patient {n % self.patients}",
+            "doctor": f"Dr {doctor}",
+            "date": (self.start + datetime.timedelta(days=day + (0 if self.tag == "sync" else 30))).isoformat(),
+            "time": self.slots[slot],
+        }
+
+
+# --------------------------------------------------
+# SYNC MODE
+# --------------------------------------------------
+def run_sync(app_module, workload, n, workers):
+    local = threading.local()
+    latencies = {r: [] for r in ROUTES}
+    admin = {"email": app_module.ADMIN_EMAIL, "password": app_module.ADMIN_PASSWORD}
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = app_module.app.test_client()
+            local.client.post("/login", json=admin)
+        route, method, path, body = workload.request(i)
+        started = time.perf_counter()
+        response = local.client.open(path, method=method, json=body)
+        latencies[route].append(time.perf_counter() - started)
+        assert response.status_code < 500, response.data
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(one, range(n)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# --------------------------------------------------
+# ASYNC MODE
+# --------------------------------------------------
+async def asgi_call(app, method, path, body=None, cookie=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"content-type", b"application/json")]
+    if cookie:
+        headers.append((b"cookie", cookie.encode()))
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": headers, "server": ("bench", 80), "http_version": "1.1"}
+    sent = [{"type": "http.request", "body": payload, "more_body": False}]
+    response = {"body": b""}
+
+    async def receive():
+        return sent.pop() if sent else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message["headers"]
+        else:
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response
+
+
+async def run_async_mode(app, app_module, workload, n, concurrency):
+    latencies = {r: [] for r in ROUTES}
+    login = await asgi_call(app, "POST", "/login",
+                            {"email": app_module.ADMIN_EMAIL, "password": app_module.ADMIN_PASSWORD})
+    cookie = dict(login["headers"])[b"set-cookie"].decode().split(";")[0]
+    counter = iter(range(n))
+
+    async def client():
+        for i in counter:
+            route, method, path, body = workload.request(i)
+            started = time.perf_counter()
+            response = await asgi_call(app, method, path, body, cookie)
+            latencies[route].append(time.perf_counter() - started)
+            assert response["status"] < 500, response["body"]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per remote call")
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs("HMS")
+    with open("HMS/config.json", "w") as f:
+        json.dump({"database": "hospital.db"}, f)
+    store, fake_auth = standins.install(args.latency)
+    # Doctor list stays cached; the other three routes hit the stand-ins
+    store.rows("doctors").update({f"d{i}": {"name": f"Dr {i}", "specialization": "General"} for i in range(args.doctors)})
+
+    import app as app_module
+    from asgi_app import AsyncApp
+    from database import get_db
+    from mailer import FakeAsyncTransport
+
+    app_module.ensure_schema()
+    with get_db(app_module.DB) as conn:
+        conn.executemany("INSERT INTO doctors (name, specialization, slots) VALUES (?, ?, ?)",
+                         [(f"Dr {i}", "General", SLOTS) for i in range(args.doctors)])
+    app_module.patient_index.upsert_many(
+        [(f"idx{i}", f"Patient {i}", f"p{i}@example.com") for i in range(args.patients)])
+    app_module.scheduler.load()
+
+    report = {"workers": args.workers, "concurrency": args.concurrency, "latency_ms": args.latency * 1000}
+    report["sync"] = run_sync(app_module, Workload(fake_auth, args.doctors, args.patients, "sync"),
+                              args.requests, args.workers)
+
+    app = AsyncApp(app_module, standins.FakeAsyncFirestore(store), db_workers=args.workers,
+                   remote_workers=args.workers, email_transport=FakeAsyncTransport(delay=args.latency))
+    report["async"] = asyncio.run(run_async_mode(
+        app, app_module, Workload(fake_auth, args.doctors, args.patients, "async"),
+        args.requests, args.concurrency))
+    report["speedup"] = round(report["async"]["rps"] / report["sync"]["rps"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Throughput of the bulk importer against the single-row booking path.
+
+    python bench/bulk_import_bench.py --rows 20000
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db
+from migrations import migrate
+from patient_index import PatientIndex
+from scheduling import Scheduler
+from bulk_import import AppointmentImporter, INSERT_SQL
+
+SLOTS = ",".join(f"{h:02d}:{m:02d}" for h in range(8, 20) for m in (0, 15, 30, 45))
+
+
+def setup(path, doctors, patients):
+    migrate(path)
+    scheduler = Scheduler(path)
+    scheduler.init_schema()
+    with get_db(path) as conn:
+        conn.executemany("INSERT INTO doctors (name, specialization, slots) VALUES (?, ?, ?)",
+                         [(f"Dr {i}", "General", SLOTS) for i in range(doctors)])
+    index = PatientIndex(path=path, listen=False)
+    index.init_schema()
+    index.upsert_many([(str(i), f"Patient {i}", f"p{i}@example.com") for i in range(patients)])
+    scheduler.load()
+    return scheduler, index
+
+
+def generate(n, doctors, patients, offset_days):
+    slots = SLOTS.split(",")
+    start = datetime.date.today() + datetime.timedelta(days=offset_days)
+    per_day = doctors * len(slots)
+    for i in range(n):
+        day, rest = divmod(i, per_day)
+        doctor, slot = divmod(rest, len(slots))
+        yield {
+            "patient": f"Patient {i % patients}",
+            "doctor": f"Dr {doctor}",
+            "date": (start + datetime.timedelta(days=day)).isoformat(),
+            "time": slots[slot],
+        }
+
+
+def single_row(path, rows):
+    """One INSERT + commit per row, as create_appointment does"""
+    started = time.perf_counter()
+    for r in rows:
+        with get_db(path) as conn:
+            conn.execute(INSERT_SQL, (r["patient"], r["doctor"], r["date"], r["time"], "Booked"))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        scheduler, index = setup(path, args.doctors, args.patients)
+
+        single = single_row(path, generate(args.rows, args.doctors, args.patients, 1000))
+        importer = AppointmentImporter(index, scheduler, path, args.chunk_size)
+        report = importer.run(generate(args.rows, args.doctors, args.patients, 0))
+
+    print(json.dumps({
+        "rows": args.rows,
+        "single_row_per_sec": round(args.rows / single, 1),
+        "bulk_per_sec": report["rows_per_sec"],
+        "bulk_failed": report["failed"],
+        "speedup": round(report["rows_per_sec"] / (args.rows / single), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""N open dashboards: full list reloads vs the change feed.
+
+Seeds --appointments rows, then for each round writes --changes rows and
+brings --dashboards clients up to date two ways: every client re-fetching
+/appointments (the old refresh), and one feed poll fanned out to that many
+SSE subscribers. Reports server CPU time and bytes per round.
+
+    python bench/change_feed_bench.py --appointments 5000 --dashboards 200
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standins
+
+
+def write_changes(app_module, n, round_no):
+    from database import get_db
+    with get_db(app_module.DB) as conn:
+        conn.executemany(
+            "INSERT INTO appointments (patient, doctor, date, time, status) VALUES (?, ?, ?, ?, ?)",
+            [(f"Patient {i}", "Dr 0", f"2030-01-{1 + round_no % 28:02d}", f"{i % 24:02d}:00", "Completed")
+             for i in range(n)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--dashboards", type=int, default=200)
+    parser.add_argument("--changes", type=int, default=5, help="rows written per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="hms-feed-"))
+    standins.install(0)
+    import app as app_module
+    from database import get_db
+
+    app_module.ensure_schema()
+    with get_db(app_module.DB) as conn:
+        conn.executemany("INSERT INTO appointments (patient, doctor, date, time, status) VALUES (?, ?, ?, ?, ?)",
+                         [(f"Patient {i}", f"Dr {i % 50}", "2020-01-01", "09:00", "Completed")
+                          for i in range(args.appointments)])
+
+    client = app_module.app.test_client()
+    client.post("/login", json={"email": app_module.ADMIN_EMAIL, "password": app_module.ADMIN_PASSWORD})
+    limit = args.appointments + args.changes * args.rounds
+
+    # Old refresh: every dashboard reloads the whole list
+    reload_cpu, reload_bytes = 0.0, 0
+    for r in range(args.rounds):
+        write_changes(app_module, args.changes, r)
+        started = time.process_time()
+        for _ in range(args.dashboards):
+            reload_bytes += len(client.get(f"/appointments?limit={min(limit, 1000)}").get_data())
+        reload_cpu += time.process_time() - started
+
+    # Feed: one poll per round, the same frames handed to every subscriber
+    feed = app_module.feed
+    feed.poll_interval = 3600  # polled by hand below
+    inboxes = [queue.Queue() for _ in range(args.dashboards)]
+    tokens = [feed.subscribe(inbox.put, ("appointments",))[0] for inbox in inboxes]
+    feed_cpu, feed_bytes = 0.0, 0
+    for r in range(args.rounds):
+        write_changes(app_module, args.changes, r)
+        started = time.process_time()
+        feed.poll()
+        for inbox in inboxes:
+            while not inbox.empty():
+                feed_bytes += sum(len(frame.encode()) for _, _, frame in inbox.get_nowait())
+        feed_cpu += time.process_time() - started
+    for token in tokens:
+        feed.unsubscribe(token)
+
+    print(json.dumps({
+        "appointments": args.appointments,
+        "dashboards": args.dashboards,
+        "changes_per_round": args.changes,
+        "reload": {"cpu_ms_per_round": round(reload_cpu * 1000 / args.rounds, 2),
+                   "bytes_per_round": reload_bytes // args.rounds},
+        "feed": {"cpu_ms_per_round": round(feed_cpu * 1000 / args.rounds, 2),
+                 "bytes_per_round": feed_bytes // args.rounds},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Firestore <-> SQLite sync against the in-process fake Firestore.
+
+Seeds --patients and --doctors documents in bench/standins.py's store,
+where every remote call costs --latency seconds, then runs the sync
+engine through a full snapshot (interrupted and resumed), an incremental
+pull, pushed local writes, conflicts and remote deletes. Each stage is
+checked and reported with its remote call count and time.
+
+    python bench/firestore_sync_bench.py --patients 20000 --latency 0.02
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standins
+
+
+class Interrupted(Exception):
+    pass
+
+
+def stage(store, fn):
+    calls, commits = store.calls, getattr(store, "commits", 0)
+    started = time.perf_counter()
+    result = fn()
+    return result, {"seconds": round(time.perf_counter() - started, 3), "remote_calls": store.calls - calls,
+                    "batch_commits": getattr(store, "commits", 0) - commits}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per remote call")
+    parser.add_argument("--page-size", type=int, default=500)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="hms-sync-"))
+    store, _ = standins.install(args.latency)
+    from database import get_db
+    from firestore_sync import FirestoreSync
+    from migrations import migrate
+    from patient_index import PatientIndex
+    from scheduling import Scheduler
+
+    migrate("hospital.db")
+    PatientIndex(None, "hospital.db").init_schema()
+    Scheduler("hospital.db").init_schema()
+    client = standins.FakeFirestore(store)
+    sync = FirestoreSync(client, "hospital.db", page_size=args.page_size)
+    sync.init_schema()
+
+    # Existing data last changed an hour ago, outside the incremental overlap window
+    def old():
+        return store.now() - datetime.timedelta(hours=1)
+
+    for i in range(args.patients):
+        store.write("patients", f"p{i:07d}", {"name": f"Patient {i}", "email": f"p{i}@example.com", "updated_at": old()})
+    for i in range(args.doctors):
+        store.write("doctors", f"d{i:05d}", {"name": f"Dr {i}", "specialization": "General",
+                                             "slots": ["09:00", "10:00"], "updated_at": old()})
+
+    def local(table, where="1"):
+        with get_db("hospital.db") as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchone()[0]
+
+    report = {"patients": args.patients, "doctors": args.doctors, "latency_ms": args.latency * 1000}
+
+    # Full snapshot, killed halfway through and resumed from its checkpoint
+    pages = args.patients // args.page_size
+    original = standins.FakeQuery._matches
+    served = {"n": 0}
+
+    def flaky(self):
+        served["n"] += 1
+        if served["n"] == pages // 2 + 1:
+            raise Interrupted()
+        return original(self)
+
+    standins.FakeQuery._matches = flaky
+    try:
+        sync.pull("patients")
+    except Interrupted:
+        pass
+    standins.FakeQuery._matches = original
+    interrupted_at = local("patient_index")
+    _, report["snapshot_resumed"] = stage(store, lambda: sync.pull("patients"))
+    report["snapshot_resumed"]["rows_before_resume"] = interrupted_at
+    assert local("patient_index") == args.patients
+    _, report["snapshot_doctors"] = stage(store, lambda: sync.pull("doctors"))
+    assert local("doctors", "doc_id IS NOT NULL") == args.doctors
+
+    # Incremental: only what changed since the checkpoint is read
+    for i in range(0, args.patients, 20):
+        store.write("patients", f"p{i:07d}", {"email": f"new{i}@example.com", "updated_at": store.now()}, merge=True)
+    applied, report["incremental"] = stage(store, lambda: sync.pull("patients"))
+    report["incremental"]["applied"] = applied
+    assert applied == len(range(0, args.patients, 20)), applied
+
+    # Local writes pushed in batched writes of at most 500
+    ids, report["local_writes"] = stage(store, lambda: [sync.write("patients", {"name": f"Walk-in {i}", "email": None})
+                                                        for i in range(1200)])
+    pushed, report["push"] = stage(store, sync.push)
+    assert pushed == 1200 and report["push"]["batch_commits"] == 3
+    assert all(store.rows("patients")[doc_id]["name"].startswith("Walk-in") for doc_id in ids)
+    # Our own writes come back on the next pull and change nothing
+    sync.pull("patients")
+
+    # Conflict: edited locally and in Firestore at the same time; Firestore wins by default
+    sync.write("patients", {"name": "Local Edit"}, doc_id="p0000001")
+    store.write("patients", "p0000001", {"name": "Remote Edit", "updated_at": store.now()}, merge=True)
+    sync.sync_once()
+    with get_db("hospital.db") as conn:
+        name = conn.execute("SELECT name FROM patient_index WHERE doc_id = 'p0000001'").fetchone()[0]
+    assert name == "Remote Edit" and store.rows("patients")["p0000001"]["name"] == "Remote Edit"
+    # An edit based on the current version is not a conflict and reaches Firestore
+    sync.write("patients", {"name": "Second Edit"}, doc_id="p0000001")
+    sync.sync_once()
+    assert store.rows("patients")["p0000001"]["name"] == "Second Edit"
+    report["conflicts"] = sync.counts["conflicts"]
+
+    # Deleted in Firestore: removed locally by the next snapshot
+    for i in range(0, 100):
+        store.rows("patients").pop(f"p{i + 1000:07d}", None)
+    with get_db("hospital.db") as conn:
+        conn.execute("UPDATE sync_checkpoints SET phase = 'restart' WHERE collection = 'patients'")
+        conn.execute("UPDATE patient_index SET updated_at = 0")
+    _, report["resnapshot"] = stage(store, lambda: sync.pull("patients"))
+    assert local("patient_index") == len(store.rows("patients")), (local("patient_index"), len(store.rows("patients")))
+    report["resnapshot"]["deleted"] = sync.counts["deleted"]
+
+    # Reads served locally vs a remote query per lookup
+    names = [f"Patient {i}" for i in range(2000, 2200)]
+    index = PatientIndex(client, "hospital.db", listen=False)
+    _, local_reads = stage(store, lambda: [index.lookup(n) for n in names])
+    _, remote_reads = stage(store, lambda: [list(client.collection("patients").where("name", "==", n).limit(1).stream())
+                                            for n in names])
+    report["lookup_ms"] = {"local": round(local_reads["seconds"] * 1000 / len(names), 3),
+                           "remote": round(remote_reads["seconds"] * 1000 / len(names), 3)}
+    report["checkpoints"] = sync.stats()["checkpoints"]
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Bytes per request and TTFB with and without the http_cache.py layer.
+
+Runs the app twice over real HTTP on loopback, with HTTP_CACHE=0 and =1,
+each in its own process with the same seeded data (bench/route_bench.py's
+seeding, stand-ins for Firestore). For each list endpoint it reports the
+bytes on the wire and time to first byte of a fresh GET and of a revalidating
+GET, and for a page it counts what a repeat visit re-fetches. Transfer time
+at --mbps is added to show what the bytes cost off loopback.
+
+    python bench/http_cache_bench.py --appointments 10000 --patients 2000
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+LISTS = ["/appointments?limit=100", "/appointments?limit=1000", "/api/patient", "/api/doctor",
+         "/api/appointment?limit=100", "/api/common", "/doctor"]
+PAGE = "/patient.html"
+BROWSER = {"Accept-Encoding": "gzip, deflate, br"}
+
+
+def fetch(port, path, headers):
+    """(status, headers, wire bytes, ttfb seconds, total seconds)"""
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    started = time.perf_counter()
+    conn.request("GET", path, headers=headers)
+    response = conn.getresponse()
+    ttfb = time.perf_counter() - started
+    body = response.read()
+    total = time.perf_counter() - started
+    conn.close()
+    head = sum(len(k) + len(v) + 4 for k, v in response.getheaders()) + 17
+    return response.status, dict(response.getheaders()), head + len(body), ttfb, total
+
+
+def measure(port, path, headers, repeat):
+    samples = [fetch(port, path, headers) for _ in range(repeat)]
+    status, got, size, _, _ = samples[-1]
+    return got, {"status": status, "bytes": size, "encoding": got.get("Content-Encoding"),
+                 "ttfb_ms": round(statistics.median(s[3] for s in samples) * 1000, 3),
+                 "total_ms": round(statistics.median(s[4] for s in samples) * 1000, 3)}
+
+
+def page_visits(port, cookie):
+    """First and repeat visit of PAGE with a browser-like cache"""
+    headers = dict(BROWSER, Cookie=cookie)
+    status, got, size, _, _ = fetch(port, PAGE, headers)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("GET", PAGE, headers={"Cookie": cookie})
+    html = conn.getresponse().read().decode()
+    conn.close()
+    assets = [r for r in re.findall(r'(?:src|href)="([^"]+)"', html) if not re.match(r"[a-z]+:|//|#|/$", r)]
+    first = {"requests": 1, "bytes": size}
+    cached = {PAGE: got}
+    for ref in assets:
+        status, got, size, _, _ = fetch(port, "/" + ref.lstrip("/"), headers)
+        first["requests"] += 1
+        first["bytes"] += size
+        if status == 200:
+            cached[ref] = got
+    repeat = {"requests": 0, "bytes": 0, "not_modified": 0}
+    for ref, got in cached.items():
+        if "immutable" in got.get("Cache-Control", "") or "max-age=0" not in got.get("Cache-Control", "max-age=0") \
+                and "no-cache" not in got.get("Cache-Control", ""):
+            continue
+        conditional = dict(headers)
+        if got.get("ETag"):
+            conditional["If-None-Match"] = got["ETag"]
+        status, _, size, _, _ = fetch(port, "/" + ref.lstrip("/") if ref != PAGE else PAGE, conditional)
+        repeat["requests"] += 1
+        repeat["bytes"] += size
+        repeat["not_modified"] += status == 304
+    return {"assets": len(assets), "first_visit": first, "repeat_visit": repeat}
+
+
+def child(args):
+    import standins
+    from route_bench import seed
+    from werkzeug.serving import make_server
+
+    os.chdir(tempfile.mkdtemp(prefix="hms-http-"))
+    store, fake_auth = standins.install(0)
+    import app as app_module
+    from package.api import register
+    register(app_module.app)
+    seed(app_module, store, fake_auth, args)
+
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("POST", "/login", json.dumps({"email": app_module.ADMIN_EMAIL, "password": app_module.ADMIN_PASSWORD}),
+                 {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader("Set-Cookie").split(";")[0]
+
+    result = {"lists": {}}
+    for path in LISTS:
+        headers = dict(BROWSER, Cookie=cookie)
+        measure(port, path, headers, 3)  # warm-up
+        got, fresh = measure(port, path, headers, args.requests)
+        entry = {"fresh": fresh}
+        if got.get("ETag"):
+            _, entry["revalidate"] = measure(port, path, dict(headers, **{"If-None-Match": got["ETag"]}), args.requests)
+        result["lists"][path] = entry
+    result["page"] = page_visits(port, cookie)
+    server.shutdown()
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--appointments", type=int, default=10000)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=30, help="per URL, median reported")
+    parser.add_argument("--mbps", type=float, default=10.0, help="link speed for the transfer estimate")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    runs = {}
+    for label, flag in (("before", "0"), ("after", "1")):
+        out = subprocess.check_output([sys.executable, __file__, "--child"] + sys.argv[1:],
+                                      env=dict(os.environ, HTTP_CACHE=flag), text=True)
+        runs[label] = json.loads(out.strip().splitlines()[-1])
+
+    def transfer_ms(size):
+        return round(size * 8 / (args.mbps * 1e6) * 1000, 2)
+
+    report = {"mbps": args.mbps, "lists": {}, "page": {}}
+    for path, before in runs["before"]["lists"].items():
+        after = runs["after"]["lists"][path]
+        row = {"before": before["fresh"], "after": after["fresh"]}
+        if "revalidate" in after:
+            row["after_revalidate"] = after["revalidate"]
+        for entry in row.values():
+            entry["transfer_ms"] = transfer_ms(entry["bytes"])
+        report["lists"][path] = row
+    report["page"] = {label: runs[label]["page"] for label in runs}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Mixed read/write throughput of the /api resource queries, shared pool vs read/write split.
+
+Seeds the resource tables, then for each --threads count runs --seconds of
+a mixed workload: --write-ratio of operations update a patient and insert a
+--write-batch of appointments (POST /api/appointment with a list), the rest run
+the Appointments page, Doctors list, Patient detail and Common queries the
+resources issue. "shared" runs everything through get_db as the resources
+did before; "split" sends reads to get_read_db's `mode=ro` pool and writes
+through get_write_db. Every write is read back at once by the same thread
+to check read-your-writes.
+
+    python bench/read_replica_bench.py --threads 1,2,4,8,16
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+APPOINTMENTS_PAGE = ("SELECT json_object('app_id', a.app_id, 'appointment_date', a.appointment_date, "
+                     "'pat_first_name', p.pat_first_name, 'pat_last_name', p.pat_last_name, "
+                     "'doc_first_name', d.doc_first_name, 'doc_last_name', d.doc_last_name) "
+                     "FROM appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id LEFT JOIN doctor d ON a.doc_id = d.doc_id "
+                     "WHERE (a.appointment_date, a.app_id) < (?, ?) ORDER BY a.appointment_date DESC, a.app_id DESC LIMIT 101")
+READS = [
+    lambda conn, r: conn.execute(APPOINTMENTS_PAGE, (f"2026-01-{r.randrange(2, 29):02d}", 1 << 40)).fetchall(),
+    lambda conn, r: conn.execute("SELECT json_object('doc_id', doc_id, 'doc_first_name', doc_first_name) FROM doctor ORDER BY doc_date DESC").fetchall(),
+    lambda conn, r: conn.execute("SELECT * FROM patient WHERE pat_id = ?", (r.randrange(1, 5000),)).fetchall(),
+    lambda conn, r: conn.execute("SELECT name, value FROM counters WHERE name IN ('patient', 'doctor', 'appointment')").fetchall(),
+]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else None
+
+
+def run(path, mode, threads, args):
+    from database import get_db, get_read_db, get_write_db
+
+    read_db = get_read_db if mode == "split" else get_db
+    write_db = get_write_db if mode == "split" else get_db
+    stop = threading.Event()
+    latencies = {"read": [], "write": []}
+    stale = []
+    lock = threading.Lock()
+
+    def worker(n):
+        rng = random.Random(n)
+        mine = {"read": [], "write": []}
+        # Each thread writes its own patients, so a read-back can only see its own write
+        own = list(range(n + 1, args.patients + 1, threads))
+        while not stop.is_set():
+            started = time.perf_counter()
+            if rng.random() < args.write_ratio:
+                kind = "write"
+                pat_id, name = rng.choice(own), f"Renamed {rng.random()}"
+                with write_db(path) as conn:
+                    conn.execute("UPDATE patient SET pat_first_name = ? WHERE pat_id = ?", (name, pat_id))
+                    conn.executemany("INSERT INTO appointment (pat_id, doc_id, appointment_date) VALUES (?, ?, ?)",
+                                     [(pat_id, rng.randrange(args.doctors) + 1, "2026-02-01 09:00")] * args.write_batch)
+                with read_db(path) as conn:
+                    if conn.execute("SELECT pat_first_name FROM patient WHERE pat_id = ?", (pat_id,)).fetchone()[0] != name:
+                        stale.append(pat_id)
+            else:
+                kind = "read"
+                with read_db(path) as conn:
+                    rng.choice(READS)(conn, rng)
+            mine[kind].append(time.perf_counter() - started)
+        with lock:
+            for kind, values in mine.items():
+                latencies[kind].extend(values)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for w in workers:
+        w.join()
+
+    total = sum(len(v) for v in latencies.values())
+    result = {"threads": threads, "ops_per_s": round(total / args.seconds, 1), "stale_reads": len(stale)}
+    for kind, values in latencies.items():
+        result[f"{kind}_p50_ms"] = round(statistics.median(values) * 1000, 3) if values else None
+        result[f"{kind}_p99_ms"] = round(percentile(values, 99) * 1000, 3) if values else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--threads", default="1,2,4,8,16")
+    parser.add_argument("--seconds", type=float, default=3.0, help="per run")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--write-batch", type=int, default=200, help="appointments inserted per write")
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--appointments", type=int, default=100000)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="hms-replica-"))
+    from database import get_db, POOL_SIZE, READ_POOL_SIZE
+    from migrations import migrate
+
+    path = "hospital.db"
+    migrate(path)
+    rng = random.Random(1)
+    with get_db(path) as conn:
+        conn.executemany("INSERT INTO patient (pat_first_name, pat_last_name, pat_insurance_no, pat_ph_no, pat_address) VALUES (?, ?, ?, ?, ?)",
+                         [("Patient", str(i), f"INS{i}", "555", "Street") for i in range(args.patients)])
+        conn.executemany("INSERT INTO doctor (doc_first_name, doc_last_name, doc_ph_no, doc_address) VALUES (?, ?, ?, ?)",
+                         [("Dr", str(i), "555", "Street") for i in range(args.doctors)])
+        conn.executemany("INSERT INTO appointment (pat_id, doc_id, appointment_date) VALUES (?, ?, ?)",
+                         [(rng.randrange(args.patients) + 1, rng.randrange(args.doctors) + 1,
+                           f"2026-01-{rng.randrange(1, 29):02d} {rng.randrange(8, 18):02d}:00") for _ in range(args.appointments)])
+        conn.execute("ANALYZE")
+
+    report = {"write_ratio": args.write_ratio, "pool_size": POOL_SIZE, "read_pool_size": READ_POOL_SIZE, "runs": {}}
+    for mode in ("shared", "split"):
+        report["runs"][mode] = []
+        for threads in [int(t) for t in args.threads.split(",")]:
+            result = run(path, mode, threads, args)
+            report["runs"][mode].append(result)
+            print(mode, json.dumps(result), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
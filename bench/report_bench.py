@@ -0,0 +1,143 @@
+"""Utilization reports from the rollups vs scanning appointments.
+
+Seeds --appointments bookings over --days days for --doctors doctors,
+rebuilds the rollups, then times each report against the same answer
+computed straight from the appointments table and checks they agree.
+Also reports the insert cost the rollup triggers add, and that the
+reports still agree after old rows are archived.
+
+    python bench/report_bench.py --appointments 1000000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Past dates only, so no "Booked" rows to collide on the open-slot UNIQUE index
+STATUSES = ["Completed"] * 17 + ["Cancelled"] * 2 + ["No-show"]
+SPECIALIZATIONS = ["Cardiology", "Dermatology", "General", "Neurology", "Pediatrics"]
+SLOTS = [f"{h:02d}:{m:02d}" for h in range(8, 20) for m in (0, 30)]
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return result, round(statistics.median(samples) * 1000, 2)
+
+
+def raw_bookings(conn, start, end):
+    rows = conn.execute("""
+        SELECT date, doctor, COUNT(*), SUM(status = 'Cancelled'), SUM(status = 'No-show') FROM appointments
+        WHERE date BETWEEN ? AND ? GROUP BY 1, 2 ORDER BY 1, 2
+    """, (start, end)).fetchall()
+    return [{"period": p, "doctor": d, "bookings": n, "cancelled": c, "no_show": x} for p, d, n, c, x in rows]
+
+
+def raw_rates(conn, start, end):
+    rows = conn.execute("""
+        SELECT COALESCE(s.specialization, ''), COUNT(*), SUM(a.status = 'Cancelled'), SUM(a.status = 'No-show')
+        FROM appointments a LEFT JOIN (SELECT name, MAX(specialization) AS specialization FROM doctors GROUP BY name) s
+        ON s.name = a.doctor WHERE a.date BETWEEN ? AND ? GROUP BY 1
+    """, (start, end)).fetchall()
+    return {sp: (n, c, x) for sp, n, c, x in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--appointments", type=int, default=1000000)
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="hms-reports-"))
+    from archive import Archive
+    from database import get_db
+    from migrations import migrate
+    from reports import Reports
+    from scheduling import Scheduler
+
+    migrate("hospital.db")
+    Scheduler("hospital.db").init_schema()
+    rng = random.Random(args.seed)
+    today = datetime.date.today()
+    doctors = [f"Dr {i}" for i in range(args.doctors)]
+
+    def rows(n):
+        for _ in range(n):
+            yield (f"Patient {rng.randrange(50000)}", rng.choice(doctors),
+                   (today - datetime.timedelta(days=rng.randrange(args.days))).isoformat(),
+                   rng.choice(SLOTS), rng.choice(STATUSES))
+
+    insert = "INSERT INTO appointments (patient, doctor, date, time, status) VALUES (?, ?, ?, ?, ?)"
+    with get_db("hospital.db") as conn:
+        conn.executemany("INSERT INTO doctors (name, specialization, slots) VALUES (?, ?, ?)",
+                         [(d, SPECIALIZATIONS[i % len(SPECIALIZATIONS)], ",".join(SLOTS)) for i, d in enumerate(doctors)])
+        # Seed without the rollup triggers, then rebuild in one pass
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE name LIKE 'trg_reports_%'").fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        sample = list(rows(20000))
+        started = time.perf_counter()
+        conn.executemany(insert, sample)
+        plain_insert = time.perf_counter() - started
+        for i in range(0, args.appointments - len(sample), 50000):
+            conn.executemany(insert, rows(min(50000, args.appointments - len(sample) - i)))
+        for _, sql in triggers:
+            conn.execute(sql)
+
+    reports = Reports("hospital.db", Archive("hospital.db", directory="archive"))
+    _, backfill_ms = timed(reports.backfill, repeat=1)
+
+    with get_db("hospital.db") as conn:
+        started = time.perf_counter()
+        conn.executemany(insert, list(rows(20000)))
+        trigger_insert = time.perf_counter() - started
+        rollup_rows = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                       for t in ("report_doctor_day", "report_slot_month")}
+
+    month = ((today - datetime.timedelta(days=29)).isoformat(), today.isoformat())
+    year = ((today - datetime.timedelta(days=364)).isoformat(), today.isoformat())
+    result = {"appointments": args.appointments, "rollup_rows": rollup_rows, "backfill_ms": backfill_ms,
+              "insert_us_per_row": {"without_rollups": round(plain_insert / 20000 * 1e6, 2),
+                                    "with_rollups": round(trigger_insert / 20000 * 1e6, 2)},
+              "reports": {}}
+
+    with get_db("hospital.db") as conn:
+        for label, (start, end) in (("30d", month), ("365d", year)):
+            rolled, rollup_ms = timed(lambda: reports.bookings(start, end))
+            scanned, scan_ms = timed(lambda: raw_bookings(conn, start, end), repeat=3)
+            assert rolled == scanned, "bookings report differs from the scan"
+            result["reports"][f"bookings_{label}"] = {"rollup_ms": rollup_ms, "scan_ms": scan_ms}
+
+            rolled, rollup_ms = timed(lambda: reports.rates(start, end, "specialization"))
+            scanned, scan_ms = timed(lambda: raw_rates(conn, start, end), repeat=3)
+            assert {r["specialization"]: (r["bookings"], r["cancelled"], r["no_show"]) for r in rolled} == scanned
+            result["reports"][f"rates_{label}"] = {"rollup_ms": rollup_ms, "scan_ms": scan_ms}
+
+            _, rollup_ms = timed(lambda: reports.busiest_slots(start, end))
+            result["reports"][f"slots_{label}"] = {"rollup_ms": rollup_ms}
+
+    # Archiving moves rows out of appointments but not out of the reports
+    before = reports.rates(*year, "specialization")
+    archive = Archive("hospital.db", directory="archive", horizon_days=180, batch_size=5000)
+    started = time.perf_counter()
+    moved = archive.run()
+    result["archive"] = {"moved": moved, "seconds": round(time.perf_counter() - started, 2),
+                         "reports_unchanged": reports.rates(*year, "specialization") == before}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Throughput and latency for every HMS route against local stand-ins.
+
+Boots app.py with bench/standins.py in place of Firestore/Auth and the fake
+email transport, seeds SQLite at --appointments scale, mounts the
+flask_restful resources under /api and drives each route at --concurrency.
+Results are JSON; pass an earlier result to --compare to see the deltas.
+
+    python bench/route_bench.py --appointments 100000 --out before.json
+    python bench/route_bench.py --appointments 100000 --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standins
+
+SLOTS = [f"{h:02d}:{m:02d}" for h in range(8, 20) for m in (0, 15, 30, 45)]
+USERS = 100
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else None
+
+
+# --------------------------------------------------
+# SEEDING
+# --------------------------------------------------
+def seed(app_module, store, fake_auth, args):
+    from database import get_db
+
+    rng = random.Random(args.seed)
+    today = datetime.date.today()
+    doctor_names = [f"Dr {i}" for i in range(args.doctors)]
+    per_day = args.doctors * len(SLOTS)
+
+    def past_bookings():
+        # Distinct (doctor, date, time) so the partial UNIQUE index holds
+        for i in range(args.appointments):
+            day, rest = divmod(i, per_day)
+            doctor, slot = divmod(rest, len(SLOTS))
+            yield (f"Patient {rng.randrange(args.patients)}", doctor_names[doctor],
+                   (today - datetime.timedelta(days=day + 1)).isoformat(), SLOTS[slot], "Booked")
+
+    def resource_appointments():
+        for i in range(args.appointments):
+            when = today - datetime.timedelta(minutes=15 * i)
+            yield (rng.randrange(args.patients) + 1, rng.randrange(args.doctors) + 1, when.isoformat() + " 09:00")
+
+    app_module.ensure_schema()
+    with get_db(app_module.DB) as conn:
+        conn.executemany("INSERT INTO doctors (name, specialization, slots) VALUES (?, ?, ?)",
+                         [(name, "General", ",".join(SLOTS)) for name in doctor_names])
+        conn.executemany("INSERT INTO appointments (patient, doctor, date, time, status) VALUES (?, ?, ?, ?, ?)",
+                         past_bookings())
+        conn.executemany("INSERT INTO patient (pat_first_name, pat_last_name, pat_insurance_no, pat_ph_no, pat_address) VALUES (?, ?, ?, ?, ?)",
+                         [(f"Patient", str(i), f"INS{i}", "555", "Street") for i in range(args.patients)])
+        conn.executemany("INSERT INTO doctor (doc_first_name, doc_last_name, doc_ph_no, doc_address) VALUES (?, ?, ?, ?)",
+                         [("Dr", str(i), "555", "Street") for i in range(args.doctors)])
+        conn.executemany("INSERT INTO appointment (pat_id, doc_id, appointment_date) VALUES (?, ?, ?)",
+                         resource_appointments())
+        conn.execute("ANALYZE")
+
+    app_module.patient_index.upsert_many(
+        [(f"idx{i}", f"Patient {i}", f"p{i}@example.com") for i in range(args.patients)])
+    store.rows("doctors").update({f"d{i}": {"name": n, "specialization": "General"} for i, n in enumerate(doctor_names)})
+    for i in range(USERS):
+        fake_auth.add_user(f"user{i}@example.com", "reception")
+    app_module.scheduler.load()
+
+
+# --------------------------------------------------
+# WORKLOADS: i -> (method, path, json body)
+# --------------------------------------------------
+def workloads(args, first_booking_id):
+    start = datetime.date.today() + datetime.timedelta(days=1)
+    per_day = args.doctors * len(SLOTS)
+
+    def create_appointment(i):
+        day, rest = divmod(i, per_day)
+        doctor, slot = divmod(rest, len(SLOTS))
+        return "POST", "/create_appointment", {
+            "patient": f"Patient {i % args.patients}",
+            "doctor": f"Dr {doctor}",
+            "date": (start + datetime.timedelta(days=day)).isoformat(),
+            "time": SLOTS[slot],
+        }
+
+    return {
+        "login": lambda i: ("POST", "/login", {"email": f"user{i % USERS}@example.com", "password": "x"}),
+        "doctor": lambda i: ("GET", "/doctor", None),
+        "create_appointment": create_appointment,
+        "appointments": lambda i: ("GET", "/appointments?limit=100", None),
+        "appointments_filtered": lambda i: ("GET", f"/appointments?doctor=Dr%20{i % args.doctors}&limit=100", None),
+        "delete_appointment": lambda i: ("POST", "/delete_appointment", {"id": first_booking_id + i}),
+        "api_patients": lambda i: ("GET", "/api/patient", None),
+        "api_patient_search": lambda i: ("GET", f"/api/patient/search?q={i % args.patients}", None),
+        "api_doctors": lambda i: ("GET", "/api/doctor", None),
+        "api_appointments": lambda i: ("GET", "/api/appointment?limit=100", None),
+        "api_common": lambda i: ("GET", "/api/common", None),
+    }
+
+
+def run_route(app_module, name, request_for, n, concurrency):
+    local = threading.local()
+    admin = {"email": app_module.ADMIN_EMAIL, "password": app_module.ADMIN_PASSWORD}
+    latencies, errors = [], []
+
+    def one(i):
+        if not hasattr(local, "client"):
+            local.client = app_module.app.test_client()
+            local.client.post("/login", json=admin)
+        method, path, body = request_for(i)
+        started = time.perf_counter()
+        response = local.client.open(path, method=method, json=body)
+        response.get_data()
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(n)))
+    seconds = time.perf_counter() - started
+    result = {"requests": n, "errors": len(errors), "rps": round(n / seconds, 1)}
+    for p in (50, 95, 99):
+        result[f"p{p}_ms"] = round(percentile(latencies, p) * 1000, 3)
+    return result
+
+
+# --------------------------------------------------
+# COMPARISON
+# --------------------------------------------------
+def compare(current, baseline, threshold):
+    """Print per-route ratios; True when any p95 regressed past threshold"""
+    regressed = False
+    print(f"{'route':24} {'rps':>10} {'p95 ms':>10} {'p95 x':>8}", file=sys.stderr)
+    for name, result in current["routes"].items():
+        before = baseline.get("routes", {}).get(name)
+        if not before:
+            continue
+        ratio = result["p95_ms"] / before["p95_ms"] if before["p95_ms"] else 1.0
+        flag = " REGRESSED" if ratio > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{name:24} {before['rps']:>5}->{result['rps']:<6} {result['p95_ms']:>10} {ratio:>8.2f}{flag}", file=sys.stderr)
+    return regressed
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--appointments", type=int, default=10000, help="seeded rows per appointment table")
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=300, help="per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per stand-in remote call")
+    parser.add_argument("--routes", help="comma separated subset")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write results here as well as stdout")
+    parser.add_argument("--compare", help="earlier results JSON")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p95 ratio counted as a regression")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="hms-bench-")
+    os.chdir(workdir)
+    store, fake_auth = standins.install(args.latency)
+
+    import app as app_module
+    from package.api import register
+    register(app_module.app)
+
+    started = time.perf_counter()
+    seed(app_module, store, fake_auth, args)
+    seed_seconds = time.perf_counter() - started
+
+    routes = workloads(args, first_booking_id=1)
+    selected = args.routes.split(",") if args.routes else list(routes)
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "appointments": args.appointments,
+            "patients": args.patients,
+            "doctors": args.doctors,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency * 1000,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "routes": {},
+    }
+    for name in selected:
+        request_for = routes[name]
+        run_route(app_module, name, request_for, min(20, args.requests), args.concurrency)  # warm-up
+        results["routes"][name] = run_route(
+            app_module, name, lambda i, f=request_for: f(i + 20), args.requests, args.concurrency)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Rows/sec for the package/* list endpoints: dict_factory + json.dumps (before)
+against SQLite-side json_object rows (after), on 100k-row tables.
+
+    python bench/row_pipeline_bench.py --rows 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # HMS/config.json names a relative database file, so run from a scratch directory
+    os.chdir(tempfile.mkdtemp())
+    from package.model import connection, json_object_sql, plain_rows, json_list
+
+    n = args.rows
+    with connection() as conn:
+        conn.executemany("INSERT INTO patient(pat_first_name,pat_last_name,pat_insurance_no,pat_ph_no,pat_address) VALUES (?,?,?,?,?)",
+                         [("First%d" % i, "Last", "INS%08d" % i, "555-%04d" % (i % 10000), "12 Main St") for i in range(n)])
+        conn.executemany("INSERT INTO doctor(doc_first_name,doc_last_name,doc_ph_no,doc_address) VALUES (?,?,?,?)",
+                         [("Doc%d" % i, "Last", "555", "Clinic") for i in range(1000)])
+        conn.executemany("INSERT INTO appointment(pat_id,doc_id,appointment_date) VALUES (?,?,?)",
+                         [(1 + i % n, 1 + i % 1000, "2026-%02d-%02d" % (1 + i % 12, 1 + i % 28)) for i in range(n)])
+
+    queries = {
+        "patients": ("SELECT * FROM patient ORDER BY pat_date DESC",
+                     lambda conn: "SELECT %s FROM patient p ORDER BY pat_date DESC" % json_object_sql(conn, ('p', 'patient'))),
+        "appointments_join": ("SELECT p.*,d.*,a.* from appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id LEFT JOIN doctor d ON a.doc_id = d.doc_id ORDER BY a.appointment_date DESC, a.app_id DESC",
+                              lambda conn: "SELECT %s from appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id LEFT JOIN doctor d ON a.doc_id = d.doc_id ORDER BY a.appointment_date DESC, a.app_id DESC"
+                              % json_object_sql(conn, ('p', 'patient'), ('d', 'doctor'), ('a', 'appointment'))),
+    }
+
+    results = {}
+    with connection() as conn:
+        for name, (before_sql, after_sql) in queries.items():
+            before, old_body = best_of(lambda: json.dumps(conn.execute(before_sql).fetchall()), args.repeat)
+            sql = after_sql(conn)
+            after, new_body = best_of(lambda: json_list(plain_rows(conn, sql)).get_data(as_text=True), args.repeat)
+            assert json.loads(old_body) == json.loads(new_body)
+            results[name] = {
+                "rows": n,
+                "before_rows_per_sec": round(n / before),
+                "after_rows_per_sec": round(n / after),
+                "speedup": round(before / after, 2),
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
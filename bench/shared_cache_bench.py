@@ -0,0 +1,139 @@
+"""Hit rate, remote calls and cache memory per worker count, per-process vs shared caches.
+
+Imports app.py once with bench/standins.py in place of Firestore/Auth (as
+gunicorn --preload does), then for each --workers count forks that many
+worker processes which each serve --requests logins (--users distinct
+emails) and GET /doctor through the Flask test client. Every remote call
+costs --latency seconds. The run is repeated with SHARED_CACHE=0 (a
+TTLCache per process) and SHARED_CACHE=1 (one cache.db for all workers);
+caches start cold for every worker count.
+
+Memory is reported as the bytes of cached values each worker holds (summed
+over workers for per-process caches, counted once for the shared file) and
+as each worker's private dirty memory from /proc.
+
+    python bench/shared_cache_bench.py --workers 1,2,4,8 --latency 0.02
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def private_kb():
+    """Private dirty memory of this process in KiB, None off Linux"""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            return sum(int(line.split()[1]) for line in f if line.startswith("Private_Dirty:"))
+    except OSError:
+        return None
+
+
+def value_bytes(cache):
+    """Bytes of the values a cache holds, serialized as the shared cache stores them"""
+    if hasattr(cache, "_data"):
+        return sum(len(v[0]) if isinstance(v[0], bytes) else len(json.dumps(v[0])) for v in list(cache._data.values()))
+    return cache.stats()["bytes"]
+
+
+def worker(app_module, store, n, args):
+    rng = random.Random(n)
+    client = app_module.app.test_client()
+    calls = store.calls
+    started = time.perf_counter()
+    for i in range(args.requests):
+        if i % 2:
+            client.get("/doctor")
+        else:
+            client.post("/login", json={"email": f"user{rng.randrange(args.users)}@example.com", "password": "x"})
+    roles, doctors = app_module.role_cache.cache, app_module.doctor_directory.cache
+    return {
+        "seconds": round(time.perf_counter() - started, 3),
+        "remote_calls": store.calls - calls,
+        "roles_hit_rate": roles.stats()["hit_rate"],
+        "doctors_hit_rate": doctors.stats()["hit_rate"],
+        "cache_bytes": value_bytes(roles) + value_bytes(doctors),
+        "private_kb": private_kb(),
+    }
+
+
+def child(args):
+    import standins
+
+    os.chdir(tempfile.mkdtemp(prefix="hms-shared-"))
+    store, fake_auth = standins.install(args.latency)
+    import app as app_module
+    import cache
+
+    app_module.ensure_schema()
+    store.rows("doctors").update({f"d{i}": {"name": f"Dr {i}", "specialization": "General"} for i in range(args.doctors)})
+    for i in range(args.users):
+        fake_auth.add_user(f"user{i}@example.com", "reception")
+
+    runs = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        app_module.role_cache.cache.clear()
+        app_module.doctor_directory.cache.clear()
+        pipes = []
+        for n in range(workers):
+            read, write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read)
+                with os.fdopen(write, "w") as out:
+                    out.write(json.dumps(worker(app_module, store, n, args)))
+                os._exit(0)
+            os.close(write)
+            pipes.append((pid, read))
+        per_worker = []
+        for pid, read in pipes:
+            with os.fdopen(read) as f:
+                per_worker.append(json.loads(f.read()))
+            os.waitpid(pid, 0)
+
+        shared_bytes = app_module.role_cache.cache.stats()["bytes"] + app_module.doctor_directory.cache.stats()["bytes"] \
+            if cache.SHARED_CACHE else 0
+        runs.append({
+            "workers": workers,
+            "remote_calls": sum(w["remote_calls"] for w in per_worker),
+            "roles_hit_rate": [w["roles_hit_rate"] for w in per_worker],
+            "doctors_hit_rate": [w["doctors_hit_rate"] for w in per_worker],
+            "cache_bytes": shared_bytes if cache.SHARED_CACHE else sum(w["cache_bytes"] for w in per_worker),
+            "cache_file_bytes": sum(os.path.getsize(p) for p in (cache.SHARED_CACHE_PATH, cache.SHARED_CACHE_PATH + "-wal")
+                                    if os.path.exists(p)) if cache.SHARED_CACHE else 0,
+            "private_kb_per_worker": max(w["private_kb"] or 0 for w in per_worker),
+            "slowest_worker_s": max(w["seconds"] for w in per_worker),
+        })
+    print(json.dumps(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--requests", type=int, default=400, help="per worker, half logins and half /doctor")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per remote call")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    report = {"requests_per_worker": args.requests, "users": args.users, "latency_ms": args.latency * 1000}
+    for label, flag in (("per_process", "0"), ("shared", "1")):
+        out = subprocess.check_output([sys.executable, __file__, "--child"] + sys.argv[1:],
+                                      env=dict(os.environ, SHARED_CACHE=flag), stderr=subprocess.DEVNULL, text=True)
+        report[label] = json.loads(out.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""Local stand-ins for Firestore and Firebase Auth with simulated latency.
+
+`install()` patches firebase_admin so `import app` works without credentials
+and every remote call costs `latency` seconds, sync or async.
+"""
+import asyncio
+import datetime
+import itertools
+import operator
+import os
+import threading
+import time
+import types
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeStore:
+    """Collections shared by the sync and async clients"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.collections = {}
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def rows(self, name):
+        return self.collections.setdefault(name, {})
+
+    def new_id(self):
+        return f"doc{next(self._ids)}"
+
+    def now(self):
+        """Commit time: UTC, strictly increasing like Firestore's"""
+        with self._lock:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            last = getattr(self, "_last_commit", None)
+            if last is not None and now <= last:
+                now = last + datetime.timedelta(microseconds=1)
+            self._last_commit = now
+            return now
+
+    def write(self, name, doc_id, data, merge=False, at=None):
+        """Store data, replacing SERVER_TIMESTAMP sentinels with the commit time"""
+        from firebase_admin import firestore
+
+        at = at or self.now()
+        data = {k: at if v is firestore.SERVER_TIMESTAMP else v for k, v in data.items()}
+        rows = self.rows(name)
+        rows[doc_id] = dict(rows.get(doc_id) or {}, **data) if merge else data
+        return at
+
+
+OPERATORS = {"==": operator.eq, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+class FakeQuery:
+    def __init__(self, store, name, filters=(), orders=(), cursor=None, max_results=None):
+        self.store = store
+        self.name = name
+        self.filters = list(filters)
+        self.orders = list(orders)
+        self.cursor = cursor
+        self.max_results = max_results
+
+    def _copy(self, **changes):
+        fields = dict(filters=self.filters, orders=self.orders, cursor=self.cursor, max_results=self.max_results)
+        fields.update(changes)
+        return type(self)(self.store, self.name, **fields)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + [(field, op, value)])
+
+    def order_by(self, field):
+        return self._copy(orders=self.orders + [field])
+
+    def start_after(self, values):
+        if isinstance(values, FakeSnapshot):
+            values = dict(values.to_dict(), __name__=values.id)
+        return self._copy(cursor=values)
+
+    def limit(self, n):
+        return self._copy(max_results=n)
+
+    def _matches(self):
+        self.store.calls += 1
+
+        def value(doc_id, data, field):
+            return doc_id if field == "__name__" else data.get(field)
+
+        docs = []
+        for doc_id, data in list(self.store.rows(self.name).items()):
+            # Like Firestore, a document missing a filtered or ordered field never matches
+            if all(data.get(f) is not None and OPERATORS[op](data[f], v) if op != "==" else data.get(f) == v
+                   for f, op, v in self.filters) \
+                    and all(value(doc_id, data, f) is not None for f in self.orders):
+                docs.append((tuple(value(doc_id, data, f) for f in self.orders), doc_id, data))
+        if self.orders:
+            docs.sort(key=lambda d: d[0])
+            if self.cursor is not None:
+                after = tuple(self.cursor[f] for f in self.orders)
+                docs = [d for d in docs if d[0] > after]
+        for key, doc_id, data in docs[:self.max_results]:
+            yield FakeSnapshot(doc_id, data)
+
+
+# --------------------------------------------------
+# SYNC CLIENT
+# --------------------------------------------------
+class FakeDocument:
+    def __init__(self, store, name, doc_id):
+        self.store, self.name, self.id = store, name, doc_id
+
+    def get(self):
+        time.sleep(self.store.latency)
+        self.store.calls += 1
+        return FakeSnapshot(self.id, self.store.rows(self.name).get(self.id))
+
+    def set(self, data, merge=False):
+        time.sleep(self.store.latency)
+        self.store.write(self.name, self.id, data, merge)
+
+    def delete(self):
+        time.sleep(self.store.latency)
+        self.store.rows(self.name).pop(self.id, None)
+
+
+class FakeBatch:
+    """WriteBatch: up to 500 operations committed together at one time"""
+
+    def __init__(self, store):
+        self.store = store
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append((ref, data, merge))
+
+    def delete(self, ref):
+        self.ops.append((ref, None, False))
+
+    def commit(self):
+        if len(self.ops) > 500:
+            raise ValueError("maximum 500 writes allowed per request")
+        time.sleep(self.store.latency)
+        self.store.calls += 1
+        self.store.commits = getattr(self.store, "commits", 0) + 1
+        at = self.store.now()
+        for ref, data, merge in self.ops:
+            if data is None:
+                self.store.rows(ref.name).pop(ref.id, None)
+            else:
+                self.store.write(ref.name, ref.id, data, merge, at)
+        return [types.SimpleNamespace(update_time=at) for _ in self.ops]
+
+
+class FakeCollection(FakeQuery):
+    def stream(self):
+        time.sleep(self.store.latency)
+        return iter(list(self._matches()))
+
+    def document(self, doc_id):
+        return FakeDocument(self.store, self.name, doc_id)
+
+    def add(self, data):
+        time.sleep(self.store.latency)
+        doc_id = self.store.new_id()
+        self.store.write(self.name, doc_id, data)
+        return None, types.SimpleNamespace(id=doc_id)
+
+    def on_snapshot(self, callback):
+        raise RuntimeError("listeners are not simulated")
+
+
+class FakeFirestore:
+    def __init__(self, store):
+        self.store = store
+
+    def collection(self, name):
+        return FakeCollection(self.store, name)
+
+    def batch(self):
+        return FakeBatch(self.store)
+
+
+# --------------------------------------------------
+# ASYNC CLIENT
+# --------------------------------------------------
+class FakeAsyncDocument(FakeDocument):
+    async def get(self):
+        await asyncio.sleep(self.store.latency)
+        self.store.calls += 1
+        return FakeSnapshot(self.id, self.store.rows(self.name).get(self.id))
+
+    async def set(self, data, merge=False):
+        await asyncio.sleep(self.store.latency)
+        self.store.write(self.name, self.id, data, merge)
+
+
+class FakeAsyncCollection(FakeQuery):
+    async def stream(self):
+        await asyncio.sleep(self.store.latency)
+        for snapshot in list(self._matches()):
+            yield snapshot
+
+    def document(self, doc_id):
+        return FakeAsyncDocument(self.store, self.name, doc_id)
+
+    async def add(self, data):
+        await asyncio.sleep(self.store.latency)
+        doc_id = self.store.new_id()
+        self.store.write(self.name, doc_id, data)
+        return None, types.SimpleNamespace(id=doc_id)
+
+
+class FakeAsyncFirestore(FakeFirestore):
+    def collection(self, name):
+        return FakeAsyncCollection(self.store, name)
+
+
+# --------------------------------------------------
+# AUTH + INSTALL
+# --------------------------------------------------
+class FakeAuth:
+    """get_user_by_email / create_user over the `users` collection"""
+
+    def __init__(self, store, not_found):
+        self.store = store
+        self.not_found = not_found
+        self.by_email = {}
+
+    def get_user_by_email(self, email):
+        time.sleep(self.store.latency)
+        uid = self.by_email.get(email)
+        if uid is None:
+            raise self.not_found(f"No user record found for the provided email: {email}")
+        return types.SimpleNamespace(uid=uid, email=email)
+
+    def create_user(self, email, password):
+        time.sleep(self.store.latency)
+        uid = self.by_email[email] = self.store.new_id()
+        return types.SimpleNamespace(uid=uid, email=email)
+
+    def add_user(self, email, role):
+        uid = self.by_email[email] = self.store.new_id()
+        self.store.rows("users")[uid] = {"email": email, "role": role}
+
+
+def install(latency=0.0):
+    """Patch firebase_admin; returns (store, fake_auth)"""
+    import firebase_admin
+    from firebase_admin import auth, firestore, firestore_async
+
+    store = FakeStore(latency)
+    fake_auth = FakeAuth(store, auth.UserNotFoundError)
+    firebase_admin._apps.setdefault("[DEFAULT]", object())
+    firestore.client = lambda *a, **k: FakeFirestore(store)
+    firestore_async.client = lambda *a, **k: FakeAsyncFirestore(store)
+    auth.get_user_by_email = fake_auth.get_user_by_email
+    auth.create_user = fake_auth.create_user
+    os.environ.setdefault("ADMIN_EMAIL", "admin@example.com")
+    os.environ.setdefault("ADMIN_PASSWORD", "admin")
+    os.environ.setdefault("EMAIL_TRANSPORT", "fake")
+    # The route benches drive one session far past production admission limits
+    for name in ("RATE_LIMIT_SESSION", "RATE_LIMIT_ROUTE", "MAX_IN_FLIGHT"):
+        os.environ.setdefault(name, "0")
+    return store, fake_auth
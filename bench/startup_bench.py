@@ -0,0 +1,96 @@
+"""Cold-start cost of `import app` in a fresh interpreter.
+
+Generates a throwaway service-account key so firebase_admin initializes
+exactly as on Render (no network is touched at import), then reports the
+median wall time over --runs and the slowest imports from -X importtime.
+
+    python bench/startup_bench.py --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+client = app.app.test_client()
+started = time.perf_counter()
+client.get("/appointments")
+print(imported, time.perf_counter() - started)
+"""
+
+
+def fake_credentials():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode()
+    return json.dumps({
+        "type": "service_account",
+        "project_id": "hms-startup-bench",
+        "private_key_id": "0",
+        "private_key": pem,
+        "client_email": "bench@hms-startup-bench.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": "https://oauth2.googleapis.com/token",
+    })
+
+
+def run(env, cwd, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE.format(root=ROOT)]
+    out = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise SystemExit(out.stderr)
+    return out
+
+
+def slowest_imports(stderr, n):
+    """Modules by cumulative import time (microseconds), nested ones included"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        totals[name] = max(totals.get(name, 0), int(cumulative))
+    return sorted(totals.items(), key=lambda item: -item[1])[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ, FIREBASE_CREDENTIALS=fake_credentials(), PYTHONDONTWRITEBYTECODE="0")
+    cwd = tempfile.mkdtemp(prefix="hms-startup-")
+    run(env, cwd)  # warm the bytecode cache and create the schema once
+
+    imports, first_requests = [], []
+    for _ in range(args.runs):
+        imported, first = map(float, run(env, cwd).stdout.split()[-2:])
+        imports.append(imported)
+        first_requests.append(first)
+
+    report = {
+        "runs": args.runs,
+        "import_app_ms": round(statistics.median(imports) * 1000, 1),
+        "first_request_ms": round(statistics.median(first_requests) * 1000, 1),
+        "slowest_imports_ms": {name: round(us / 1000, 1)
+                               for name, us in slowest_imports(run(env, cwd, importtime=True).stderr, args.top)},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
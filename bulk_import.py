@@ -0,0 +1,172 @@
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+import time
+
+from database import get_db, DB_NAME
+from scheduling import SlotConflict, InvalidSlot, normalize_time
+
+FIELDS = ("patient", "doctor", "date", "time")
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+INSERT_SQL = """
+    INSERT INTO appointments (patient, doctor, date, time, status)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def read_rows(stream, fmt):
+    """Yield dicts from a text stream of CSV (with header) or NDJSON"""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield {"_error": f"Bad JSON: {e}"}
+
+
+def request_rows(request):
+    """Rows from a Flask request body, streamed rather than read whole"""
+    fmt = "csv" if "csv" in (request.mimetype or "") else "ndjson"
+    return read_rows(io.TextIOWrapper(request.stream, encoding="utf-8", newline=""), fmt)
+
+
+class AppointmentImporter:
+    """Validates and inserts appointment rows in chunked transactions.
+
+    Patients are resolved in batch against the local patient index and
+    slots against the scheduler, so no row costs a remote call. Imported
+    rows do not queue confirmation emails.
+    """
+
+    def __init__(self, patient_index, scheduler, path=DB_NAME, chunk_size=CHUNK_SIZE,
+                 doctor_names=None, status="Booked"):
+        self.patient_index = patient_index
+        self.scheduler = scheduler
+        self.path = path
+        self.chunk_size = chunk_size
+        self.doctor_names = doctor_names
+        self.status = status
+
+    def _validate(self, chunk, start, errors):
+        known_doctors = set(self.doctor_names() if self.doctor_names else ()) | set(self.scheduler.doctors)
+        # Stripped, as the rows are looked up below
+        names = [str(r.get("patient") or "").strip() for r in chunk if "_error" not in r]
+        patients = self.patient_index.resolve_many(names)
+
+        valid, seen = [], set()
+        for n, row in enumerate(chunk, start):
+            if "_error" in row:
+                errors.append({"row": n, "error": row["_error"]})
+                continue
+            values = [str(row.get(f) or "").strip() for f in FIELDS]
+            if not all(values):
+                errors.append({"row": n, "error": "Missing fields"})
+                continue
+            patient, doctor, date, slot = values
+            slot = normalize_time(slot)
+            if not patients.get(patient):
+                errors.append({"row": n, "error": "Patient not found"})
+                continue
+            if known_doctors and doctor not in known_doctors:
+                errors.append({"row": n, "error": "Doctor not found"})
+                continue
+            try:
+                self.scheduler.check(doctor, date, slot)
+            except (InvalidSlot, SlotConflict) as e:
+                errors.append({"row": n, "error": str(e)})
+                continue
+            if (doctor, date, slot) in seen:
+                errors.append({"row": n, "error": f"{doctor} is already booked at {date} {slot}"})
+                continue
+            seen.add((doctor, date, slot))
+            valid.append((n, (patient, doctor, date, slot, self.status)))
+        return valid
+
+    def _insert(self, valid, errors):
+        """executemany the chunk; on a constraint error retry row by row to report it"""
+        with get_db(self.path) as conn:
+            try:
+                conn.execute("SAVEPOINT bulk_chunk")
+                conn.executemany(INSERT_SQL, [v for _, v in valid])
+                conn.execute("RELEASE bulk_chunk")
+                inserted = valid
+            except sqlite3.IntegrityError:
+                conn.execute("ROLLBACK TO bulk_chunk")
+                conn.execute("RELEASE bulk_chunk")
+                inserted = []
+                for n, v in valid:
+                    try:
+                        conn.execute(INSERT_SQL, v)
+                        inserted.append((n, v))
+                    except sqlite3.IntegrityError as e:
+                        errors.append({"row": n, "error": str(e)})
+        for _, (_, doctor, date, slot, status) in inserted:
+            if status == "Booked":
+                self.scheduler.book(doctor, date, slot)
+        return len(inserted)
+
+    def run(self, rows):
+        started = time.perf_counter()
+        errors, chunk, total, inserted = [], [], 0, 0
+        for row in rows:
+            chunk.append(row if isinstance(row, dict) else {"_error": "Row is not an object"})
+            if len(chunk) >= self.chunk_size:
+                inserted += self._insert(self._validate(chunk, total + 1, errors), errors)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            inserted += self._insert(self._validate(chunk, total + 1, errors), errors)
+            total += len(chunk)
+
+        seconds = time.perf_counter() - started
+        errors.sort(key=lambda e: e["row"])
+        return {
+            "rows": total,
+            "inserted": inserted,
+            "failed": len(errors),
+            "errors": errors[:MAX_REPORTED_ERRORS],
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(total / seconds, 1) if seconds else None,
+        }
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+def main(argv=None):
+    from patient_index import PatientIndex
+    from scheduling import Scheduler
+
+    parser = argparse.ArgumentParser(description="Bulk import appointments from CSV or NDJSON")
+    parser.add_argument("file", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="defaults to the file extension")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.file.endswith(".csv") else "ndjson")
+    scheduler = Scheduler(args.db)
+    scheduler.init_schema()
+    patients = PatientIndex(path=args.db, listen=False)
+    patients.init_schema()
+    importer = AppointmentImporter(patients, scheduler, args.db, args.chunk_size)
+
+    stream = sys.stdin if args.file == "-" else open(args.file, newline="", encoding="utf-8")
+    with stream:
+        report = importer.run(read_rows(stream, fmt))
+    print(json.dumps(report, indent=2))
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_db
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, ttl=300, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is not MISSING and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """Like get, but without touching LRU order or hit counters"""
+        entry = self._data.get(key, MISSING)
+        if entry is MISSING or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["value"]
+
+        try:
+            call["value"] = fn()
+            return call["value"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+# --------------------------------------------------
+# SHARED ACROSS WORKER PROCESSES
+# --------------------------------------------------
+SHARED_CACHE = os.getenv("SHARED_CACHE", "1") != "0"
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "cache.db")
+# Expired and over-size rows are trimmed on every Nth set
+SHARED_CACHE_PURGE_EVERY = int(os.getenv("SHARED_CACHE_PURGE_EVERY", "64"))
+
+_schemas = set()
+_schemas_lock = threading.Lock()
+
+
+def _init_shared(path):
+    if path in _schemas:
+        return
+    with _schemas_lock, get_db(path) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_cache (
+                ns TEXT NOT NULL,
+                key TEXT NOT NULL,
+                generation INTEGER NOT NULL,
+                value BLOB,
+                is_json INTEGER NOT NULL,
+                expires REAL NOT NULL,
+                stored REAL NOT NULL,
+                PRIMARY KEY (ns, key)
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS shared_cache_ns (ns TEXT PRIMARY KEY, generation INTEGER NOT NULL) WITHOUT ROWID")
+        _schemas.add(path)
+
+
+class SharedCache:
+    """TTLCache's interface over a SQLite file every worker process opens.
+
+    One fill serves all workers, and a delete or clear is seen by all of
+    them on their next read. clear() bumps the namespace generation rather
+    than deleting rows; rows of older generations stop matching at once and
+    are purged later. Values round-trip through JSON (tuples come back as
+    lists); bytes are stored as they are. Hit counters are per process.
+    """
+
+    def __init__(self, namespace, ttl=300, maxsize=1024, path=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path or SHARED_CACHE_PATH
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sets = 0
+
+    @staticmethod
+    def _key(key):
+        return key if isinstance(key, str) else json.dumps(key)
+
+    def _read(self, key):
+        _init_shared(self.path)
+        with get_db(self.path) as conn:
+            row = conn.execute("""
+                SELECT c.value, c.is_json FROM shared_cache c
+                JOIN shared_cache_ns n ON n.ns = c.ns AND n.generation = c.generation
+                WHERE c.ns = ? AND c.key = ? AND c.expires > ?
+            """, (self.namespace, self._key(key), time.time())).fetchone()
+        if row is None:
+            return MISSING
+        return json.loads(row[0]) if row[1] else bytes(row[0])
+
+    def get(self, key, default=None):
+        value = self._read(key)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """Like get, but without touching hit counters"""
+        value = self._read(key)
+        return default if value is MISSING else value
+
+    def set(self, key, value, ttl=None):
+        _init_shared(self.path)
+        now = time.time()
+        is_json = not isinstance(value, (bytes, bytearray))
+        stored = json.dumps(value) if is_json else bytes(value)
+        with get_db(self.path) as conn:
+            conn.execute("INSERT OR IGNORE INTO shared_cache_ns (ns, generation) VALUES (?, 0)", (self.namespace,))
+            conn.execute("""
+                INSERT OR REPLACE INTO shared_cache (ns, key, generation, value, is_json, expires, stored)
+                VALUES (?, ?, (SELECT generation FROM shared_cache_ns WHERE ns = ?), ?, ?, ?, ?)
+            """, (self.namespace, self._key(key), self.namespace, stored, int(is_json),
+                  now + (self.ttl if ttl is None else ttl), now))
+            self._sets += 1
+            if self._sets % SHARED_CACHE_PURGE_EVERY == 0:
+                self._purge(conn, now)
+
+    def _purge(self, conn, now):
+        """Drop expired and invalidated rows, then the oldest past maxsize"""
+        ns = self.namespace
+        self.evictions += conn.execute("""
+            DELETE FROM shared_cache WHERE ns = ? AND (expires <= ?
+                OR generation != (SELECT generation FROM shared_cache_ns WHERE ns = ?))
+        """, (ns, now, ns)).rowcount
+        self.evictions += conn.execute("""
+            DELETE FROM shared_cache WHERE ns = ? AND key IN (
+                SELECT key FROM shared_cache WHERE ns = ? ORDER BY stored DESC LIMIT -1 OFFSET ?)
+        """, (ns, ns, self.maxsize)).rowcount
+
+    def delete(self, key):
+        _init_shared(self.path)
+        with get_db(self.path) as conn:
+            conn.execute("DELETE FROM shared_cache WHERE ns = ? AND key = ?", (self.namespace, self._key(key)))
+
+    def clear(self):
+        _init_shared(self.path)
+        with get_db(self.path) as conn:
+            conn.execute("INSERT OR IGNORE INTO shared_cache_ns (ns, generation) VALUES (?, 0)", (self.namespace,))
+            conn.execute("UPDATE shared_cache_ns SET generation = generation + 1 WHERE ns = ?", (self.namespace,))
+
+    def stats(self):
+        _init_shared(self.path)
+        with get_db(self.path) as conn:
+            size, size_bytes = conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(length(CAST(c.value AS BLOB))), 0) FROM shared_cache c
+                JOIN shared_cache_ns n ON n.ns = c.ns AND n.generation = c.generation
+                WHERE c.ns = ? AND c.expires > ?
+            """, (self.namespace, time.time())).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "bytes": size_bytes,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "shared": self.path,
+        }
+
+
+def make_cache(namespace, ttl=300, maxsize=1024):
+    """The cache components should use: shared across workers unless SHARED_CACHE=0"""
+    if SHARED_CACHE:
+        return SharedCache(namespace, ttl=ttl, maxsize=maxsize)
+    return TTLCache(ttl=ttl, maxsize=maxsize)
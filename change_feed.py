@@ -0,0 +1,305 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from database import get_db, DB_NAME
+from migrations import CHANGE_TABLES
+
+CHANGE_POLL_INTERVAL = float(os.getenv("CHANGE_POLL_INTERVAL", "0.5"))
+CHANGE_BATCH_SIZE = int(os.getenv("CHANGE_BATCH_SIZE", "500"))
+CHANGE_RETENTION_HOURS = float(os.getenv("CHANGE_RETENTION_HOURS", "72"))
+CHANGE_PRUNE_INTERVAL = float(os.getenv("CHANGE_PRUNE_INTERVAL", "600"))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+# Batches a stream may fall behind before it is told to resync
+SSE_MAX_PENDING = int(os.getenv("SSE_MAX_PENDING", "100"))
+# A WSGI stream holds a worker thread: each one ends after this long (the
+# browser reconnects with Last-Event-ID), and past SSE_MAX_STREAMS per process
+# new ones are told to poll ?since= instead. Default: half a gunicorn worker's threads
+SSE_MAX_SECONDS = float(os.getenv("SSE_MAX_SECONDS", "25"))
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", str(max(1, int(os.getenv("GUNICORN_THREADS", "4")) // 2))))
+
+# Sent when a client's position is gone; it should reload and reconnect
+RESET_FRAME = "event: reset\ndata: {}\n\n"
+# Sent instead of a stream when this process has no thread to spare; poll /changes?since=
+POLL_FRAME = "event: poll\ndata: {}\n\n"
+
+# How a changed row is read back: (FROM clause, key column, (alias, table) pairs).
+# Rows have the same keys as the list endpoints that serve them.
+FEED_ROWS = {
+    "appointments": ("appointments a", "a.id", (("a", "appointments"),)),
+    "patient": ("patient p", "p.pat_id", (("p", "patient"),)),
+    "doctor": ("doctor d", "d.doc_id", (("d", "doctor"),)),
+    "appointment": ("appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id "
+                    "LEFT JOIN doctor d ON a.doc_id = d.doc_id",
+                    "a.app_id", (("p", "patient"), ("d", "doctor"), ("a", "appointment"))),
+}
+
+
+class StaleCursor(Exception):
+    """The requested position is older than the retained changes"""
+
+
+def parse_tables(raw):
+    """?tables=a,b -> tuple, None for all; ValueError on unknown names"""
+    if not raw:
+        return None
+    tables = tuple(t.strip() for t in raw.split(",") if t.strip())
+    unknown = [t for t in tables if t not in CHANGE_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+    return tables
+
+
+def sse_frame(change):
+    return f"id: {change['seq']}\nevent: change\ndata: {json.dumps(change)}\n\n"
+
+
+class ChangeFeed:
+    """Deltas from the `changes` log, by position or pushed to subscribers.
+
+    One poller per process reads each new batch of changes once and hands the
+    rendered frames to every open stream, so N dashboards cost O(changes).
+    """
+
+    def __init__(self, path=DB_NAME, poll_interval=CHANGE_POLL_INTERVAL, batch_size=CHANGE_BATCH_SIZE,
+                 retention_hours=CHANGE_RETENTION_HOURS):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.retention_hours = retention_hours
+        self.head = 0
+        self._row_sql = {}
+        self._subscribers = {}
+        self._ids = 0
+        self.streams = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_prune = 0.0
+        self.polls = 0
+        self.delivered = 0
+        self.resets = 0
+        self.pruned = 0
+        self.refused = 0
+
+    # --------------------------------------------------
+    # READS
+    # --------------------------------------------------
+    def current(self):
+        with get_db(self.path) as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def _row_json(self, conn, table):
+        if table not in self._row_sql:
+            source, key, tables = FEED_ROWS[table]
+            columns = {}
+            for alias, name in tables:
+                for col in conn.execute(f"PRAGMA table_info({name})").fetchall():
+                    columns[col["name"]] = f"{alias}.{col['name']}"
+            row = "json_object(%s)" % ", ".join(f"'{k}', {v}" for k, v in columns.items())
+            self._row_sql[table] = f"SELECT {key}, {row} FROM {source} WHERE {key} IN "
+        return self._row_sql[table]
+
+    def read(self, since, limit, tables=None, upto=None):
+        """(changes after `since`, position to ask from next).
+
+        Only a row's latest change in the window is returned; a null row
+        means the row is gone and clients should drop it.
+        """
+        with get_db(self.path) as conn:
+            floor = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            if floor is not None and since < floor - 1:
+                raise StaleCursor(f"Changes before {floor} have been pruned")
+            if upto is None:
+                upto = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            where, params = "", []
+            if tables:
+                where = f"AND c.tbl IN ({', '.join('?' * len(tables))})"
+                params = list(tables)
+            log = conn.execute(f"""
+                SELECT c.seq, c.tbl, c.row_id, c.op FROM changes c
+                WHERE c.seq > ? AND c.seq <= ? {where}
+                  AND NOT EXISTS (SELECT 1 FROM changes l WHERE l.tbl = c.tbl AND l.row_id = c.row_id
+                                  AND l.seq > c.seq AND l.seq <= ?)
+                ORDER BY c.seq LIMIT ?
+            """, [since, upto] + params + [upto, limit]).fetchall()
+
+            wanted = {}
+            for seq, table, row_id, op in log:
+                if op != "delete":
+                    wanted.setdefault(table, []).append(row_id)
+            rows = {}
+            for table, ids in wanted.items():
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    sql = self._row_json(conn, table) + f"({', '.join('?' * len(chunk))})"
+                    for key, row in conn.execute(sql, chunk):
+                        rows[(table, key)] = json.loads(row)
+
+        changes = [{"seq": seq, "table": table, "op": op, "id": row_id, "row": rows.get((table, row_id))}
+                   for seq, table, row_id, op in log]
+        following = changes[-1]["seq"] if len(changes) == limit else upto
+        return changes, following
+
+    def prune(self):
+        """Drop changes older than the retention window, keeping the newest"""
+        cutoff = time.time() - self.retention_hours * 3600
+        with get_db(self.path) as conn:
+            # seq and ts rise together, so this walks only the rows it deletes
+            deleted = conn.execute("""
+                DELETE FROM changes WHERE seq < COALESCE(
+                    (SELECT seq FROM changes WHERE ts >= ? ORDER BY seq LIMIT 1),
+                    (SELECT MAX(seq) FROM changes))
+            """, (cutoff,)).rowcount
+        self.pruned += deleted
+        return deleted
+
+    # --------------------------------------------------
+    # SUBSCRIBERS
+    # --------------------------------------------------
+    def subscribe(self, deliver, tables=None):
+        """Register deliver(batch) for every new batch of (seq, table, frame);
+        returns (token, head): changes up to head are not delivered"""
+        self.start()
+        with self._lock:
+            self._ids += 1
+            self._subscribers[self._ids] = (deliver, tables)
+            return self._ids, self.head
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def start(self):
+        # Re-start after fork: the poller thread does not survive into the child
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.head = self.current()
+            self._subscribers = {}
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="change-feed", daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+                if time.time() - self._last_prune > CHANGE_PRUNE_INTERVAL:
+                    self._last_prune = time.time()
+                    self.prune()
+            except Exception as e:
+                print("❌ Change feed error:", e)
+
+    def poll(self):
+        """Read changes past head once and hand them to every subscriber"""
+        if not self._subscribers:
+            # Nobody to tell; keep up so the next subscriber starts from now
+            with self._lock:
+                if not self._subscribers:
+                    self.head = self.current()
+                    return
+        self.polls += 1
+        while True:
+            try:
+                changes, following = self.read(self.head, self.batch_size)
+            except StaleCursor:
+                self.resets += 1
+                with self._lock:
+                    self.head = self.current()
+                    subscribers = list(self._subscribers.items())
+                self._deliver(subscribers, None)
+                return
+            if following == self.head:
+                return
+            batch = [(c["seq"], c["table"], sse_frame(c)) for c in changes]
+            with self._lock:
+                self.head = following
+                subscribers = list(self._subscribers.items())
+            self._deliver(subscribers, batch)
+            self.delivered += len(batch)
+            if len(changes) < self.batch_size:
+                return
+
+    def _deliver(self, subscribers, batch):
+        for token, (deliver, tables) in subscribers:
+            mine = batch
+            if batch is not None and tables is not None:
+                mine = [item for item in batch if item[1] in tables]
+                if not mine:
+                    continue
+            try:
+                deliver(mine)
+            except Exception:
+                # e.g. its event loop has closed; the others still get the batch
+                self.unsubscribe(token)
+
+    def backfill(self, since, head, tables=None):
+        """SSE frames for changes in (since, head]; raises StaleCursor"""
+        frames = []
+        while since < head:
+            changes, since = self.read(since, self.batch_size, tables, upto=head)
+            frames.extend(sse_frame(c) for c in changes)
+        return frames
+
+    def stream(self, since=None, tables=None, heartbeat=SSE_HEARTBEAT, max_seconds=SSE_MAX_SECONDS,
+               max_streams=SSE_MAX_STREAMS):
+        """text/event-stream body for a WSGI response: backlog after `since`, then live.
+
+        Ends after max_seconds; past max_streams open streams it only sends POLL_FRAME.
+        """
+        with self._lock:
+            full = bool(max_streams) and self.streams >= max_streams
+            if not full:
+                self.streams += 1
+        if full:
+            self.refused += 1
+            yield POLL_FRAME
+            return
+
+        inbox = queue.Queue()
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        token, head = self.subscribe(inbox.put, tables)
+        try:
+            yield "retry: 3000\n\n"
+            if since is not None:
+                try:
+                    for frame in self.backfill(since, head, tables):
+                        yield frame
+                except StaleCursor:
+                    yield RESET_FRAME
+                    return
+            while True:
+                wait = heartbeat if deadline is None else min(heartbeat, deadline - time.monotonic())
+                if wait <= 0:
+                    return
+                try:
+                    batch = inbox.get(timeout=wait)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if batch is None or inbox.qsize() > SSE_MAX_PENDING:
+                    yield RESET_FRAME
+                    return
+                for seq, _, frame in batch:
+                    if since is None or seq > since:
+                        yield frame
+        finally:
+            self.unsubscribe(token)
+            with self._lock:
+                self.streams -= 1
+
+    def stats(self):
+        return {
+            "head": self.head,
+            "subscribers": len(self._subscribers),
+            "streams": self.streams,
+            "refused": self.refused,
+            "polls": self.polls,
+            "delivered": self.delivered,
+            "resets": self.resets,
+            "pruned": self.pruned,
+            "running": self._pid == os.getpid(),
+        }
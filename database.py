@@ -1,8 +1,276 @@
+import base64
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import connection_factory
 
 DB_NAME = "hospital.db"
 
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
+# --------------------------------------------------
+# POOL SETTINGS (ENV OVERRIDABLE)
+# --------------------------------------------------
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+# Read-only connections for get_read_db; 0 sends reads through the read-write pool
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+
+
+def _open(path, readonly=False):
+    conn = sqlite3.connect(
+        f"file:{path}?mode=ro" if readonly else path,
+        timeout=BUSY_TIMEOUT_MS / 1000.0,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE,
+        factory=connection_factory(),
+        uri=readonly,
+    )
+    if not readonly:
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    # negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA foreign_keys=ON")
     return conn
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections, pinned to a thread while borrowed"""
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT, readonly=False):
+        self.path = path
+        self.size = size
+        self.readonly = readonly
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "wait_time": 0.0}
+        self._pid = os.getpid()
+        self._abandoned = []
+
+    def _after_fork(self):
+        """Drop connections inherited from the parent without closing them.
+
+        SQLite connections must not be used across fork, and closing them in
+        the child can release locks the parent still relies on.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            while True:
+                try:
+                    self._abandoned.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            self._opened = 0
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+    def _checkout(self):
+        try:
+            conn = self._idle.get_nowait()
+            self._count(hits=1)
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            reserved = self._opened < self.size
+            if reserved:
+                self._opened += 1
+                self._stats["misses"] += 1
+        if reserved:
+            try:
+                return _open(self.path, self.readonly)
+            except BaseException:
+                # A failed open (missing or locked file) gives its slot back
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(f"DB pool exhausted for {self.path}")
+        self._count(waits=1, wait_time=time.perf_counter() - start)
+        return conn
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    @contextmanager
+    def connection(self, row_factory=sqlite3.Row):
+        """Borrow a connection; commit on success, roll back on error.
+
+        Nested use on the same thread reuses the outer connection and
+        leaves the transaction to the outermost block.
+        """
+        if self._pid != os.getpid():
+            self._after_fork()
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            previous = held.row_factory
+            held.row_factory = row_factory
+            try:
+                yield held
+            finally:
+                held.row_factory = previous
+            return
+
+        conn = self._checkout()
+        conn.row_factory = row_factory
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def held(self):
+        """The connection this thread is inside a `with` block of, if any"""
+        if self._pid != os.getpid():
+            return None
+        return getattr(self._local, "conn", None)
+
+    def stats(self):
+        with self._lock:
+            opened = self._opened
+            counts = dict(self._stats)
+        return dict(
+            counts,
+            path=f"{self.path}?mode=ro" if self.readonly else self.path,
+            size=self.size,
+            opened=opened,
+            idle=self._idle.qsize(),
+        )
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DB_NAME, readonly=False):
+    key = (path, "ro") if readonly else path
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(path, READ_POOL_SIZE, readonly=True) if readonly
+                                     else ConnectionPool(path))
+    return pool
+
+
+def get_db(path=DB_NAME, row_factory=sqlite3.Row):
+    """Pooled connection context manager for the given database file"""
+    return get_pool(path).connection(row_factory)
+
+
+_write_locks = {}
+
+
+@contextmanager
+def get_write_db(path=DB_NAME, row_factory=sqlite3.Row):
+    """Like get_db, for a write: BEGIN IMMEDIATE, one writer per process at a time.
+
+    SQLite has a single write lock and its busy handler sleeps and retries;
+    queueing here instead hands the lock over the moment the last writer
+    commits. Nested use joins the outer block's transaction.
+    """
+    pool = get_pool(path)
+    if pool.held() is not None:
+        with pool.connection(row_factory) as conn:
+            yield conn
+        return
+    # Keyed by pid: a lock held at fork time would stay held in the child
+    lock = _write_locks.get((path, os.getpid()))
+    if lock is None:
+        with _pools_lock:
+            lock = _write_locks.setdefault((path, os.getpid()), threading.Lock())
+    with lock, pool.connection(row_factory) as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+
+
+def get_read_db(path=DB_NAME, row_factory=sqlite3.Row):
+    """Like get_db, for reads only, from a pool of `mode=ro` connections.
+
+    They open the same WAL file, so every read starts at the latest commit
+    and sees a session's earlier writes. A read inside an open write block
+    on the same thread uses that block's connection, uncommitted rows and all.
+    """
+    primary = get_pool(path)
+    held = primary.held()
+    if held is not None or READ_POOL_SIZE <= 0:
+        return primary.connection(row_factory)
+    return get_pool(path, readonly=True).connection(row_factory)
+
+
+def pool_stats():
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+# --------------------------------------------------
+# KEYSET PAGINATION HELPERS
+# --------------------------------------------------
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, size=None):
+    """Inverse of encode_cursor; returns None for a missing or mangled token.
+
+    With `size`, a token that is not a list of `size` strings or numbers
+    raises ValueError instead, for the caller to answer 400.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        values = None
+    if size is None:
+        return values
+    if not isinstance(values, list) or len(values) != size \
+            or not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def page_limit(raw, default=100, maximum=1000):
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
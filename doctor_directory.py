@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from cache import make_cache
+from database import get_db
+
+DOCTOR_CACHE_TTL = float(os.getenv("DOCTOR_CACHE_TTL", "300"))
+DOCTOR_CACHE_SIZE = int(os.getenv("DOCTOR_CACHE_SIZE", "16"))
+
+
+def doctor_entry(d):
+    # 🔥 FIX: guarantee specialization always exists
+    return {
+        "name": d.get("name", "Unknown"),
+        "specialization": d.get("specialization", "General")
+    }
+
+
+# --------------------------------------------------
+# SOURCES
+# --------------------------------------------------
+class FirestoreDoctorSource:
+    """Reads the Firestore `doctors` collection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def load(self):
+        return [doc.to_dict() for doc in self.db.collection("doctors").stream()]
+
+    def watch(self, callback):
+        # Snapshot listener runs on a Firestore background thread
+        return self.db.collection("doctors").on_snapshot(
+            lambda docs, changes, read_time: callback()
+        )
+
+
+class LocalDoctorSource:
+    """Doctors the Firestore sync has copied into SQLite; no remote reads"""
+
+    def __init__(self, path, sync):
+        self.path = path
+        self.sync = sync
+
+    def load(self):
+        with get_db(self.path) as conn:
+            return [dict(r) for r in conn.execute(
+                "SELECT name, specialization FROM doctors WHERE doc_id IS NOT NULL ORDER BY doc_id")]
+
+    def watch(self, callback):
+        self.sync.on_change("doctors", callback)
+
+
+class StaticDoctorSource:
+    """Local stand-in backend for tests and offline runs"""
+
+    def __init__(self, doctors=()):
+        self.doctors = list(doctors)
+        self.loads = 0
+        self._callbacks = []
+
+    def load(self):
+        self.loads += 1
+        return list(self.doctors)
+
+    def watch(self, callback):
+        self._callbacks.append(callback)
+
+    def replace(self, doctors):
+        self.doctors = list(doctors)
+        for callback in self._callbacks:
+            callback()
+
+
+# --------------------------------------------------
+# DIRECTORY
+# --------------------------------------------------
+class DoctorDirectory:
+    """Cached doctor list with an ETag, refreshed on expiry or invalidation"""
+
+    KEY = "doctors"
+
+    def __init__(self, source, ttl=DOCTOR_CACHE_TTL, maxsize=DOCTOR_CACHE_SIZE, listen=True):
+        self.source = source
+        self.cache = make_cache("doctors", ttl=ttl, maxsize=maxsize)
+        self.listen = listen
+        self.invalidations = 0
+        self._watching = None     # pid that owns the listener; none survives fork
+        self._load_lock = threading.Lock()
+
+    def _start_listener(self):
+        self._watching = os.getpid()
+        try:
+            self.source.watch(self.invalidate)
+        except Exception as e:
+            print("⚠️ Doctor listener not started:", e)
+
+    def get(self):
+        """Return (doctors, etag, loaded_at)"""
+        entry = self.cache.get(self.KEY)
+        if entry is not None:
+            return entry
+
+        with self._load_lock:
+            # Another thread may have refilled it while we waited
+            entry = self.cache.peek(self.KEY)
+            if entry is not None:
+                return entry
+            self.ensure_listener()
+            seen = self.invalidations
+            return self.fill(self.source.load(), seen)
+
+    def ensure_listener(self):
+        if self.listen and self._watching != os.getpid():
+            self._start_listener()
+
+    def fill(self, raw_doctors, seen=None):
+        """Cache an entry built from raw Firestore dicts (shared with the async loader).
+
+        `seen` is self.invalidations read before the load started; if the
+        listener invalidated since, the list may predate that change, so it
+        is returned but not cached.
+        """
+        doctors = [doctor_entry(d) for d in raw_doctors]
+        body = json.dumps(doctors, sort_keys=True).encode()
+        etag = hashlib.sha1(body).hexdigest()
+        entry = (doctors, etag, time.time())
+        if seen is None or seen == self.invalidations:
+            self.cache.set(self.KEY, entry)
+        return entry
+
+    def invalidate(self):
+        self.invalidations += 1
+        self.cache.delete(self.KEY)
+
+    def stats(self):
+        stats = self.cache.stats()
+        entry = self.cache.peek(self.KEY)
+        stats["invalidations"] = self.invalidations
+        stats["listening"] = self._watching == os.getpid()
+        stats["staleness"] = round(time.time() - entry[2], 3) if entry else None
+        return stats
@@ -0,0 +1,531 @@
+import argparse
+import datetime
+import json
+import os
+import secrets
+import string
+import threading
+import time
+
+from database import get_db, DB_NAME
+from patient_index import normalize_name
+
+# --------------------------------------------------
+# SETTINGS (ENV OVERRIDABLE)
+# --------------------------------------------------
+# Seconds between background passes; 0 = off, reads and writes go to Firestore
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "0"))
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+# Firestore rejects batched writes of more than 500 operations
+MAX_BATCH_OPS = 500
+SYNC_BATCH_SIZE = min(MAX_BATCH_OPS, int(os.getenv("SYNC_BATCH_SIZE", "500")))
+# Incremental pulls after a snapshot start this many seconds before it began,
+# allowing for skew between this host's clock and Firestore's
+SYNC_OVERLAP = float(os.getenv("SYNC_OVERLAP", "60"))
+# Full snapshots also catch documents deleted outside the app
+SYNC_SNAPSHOT_HOURS = float(os.getenv("SYNC_SNAPSHOT_HOURS", "24"))
+# "remote": a document changed in Firestore since a pending local edit was made
+# drops that edit; "local": the edit is kept and overwrites it on push
+SYNC_CONFLICT_POLICY = os.getenv("SYNC_CONFLICT_POLICY", "remote")
+# Every worker runs the loop, but one pass at a time holds this lease; a
+# holder that dies is replaced once it expires. Each page extends it
+SYNC_LEASE_SECONDS = float(os.getenv("SYNC_LEASE_SECONDS", "300"))
+
+VERSION_FIELD = "updated_at"
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def new_doc_id():
+    """20 character id like Firestore's own auto ids"""
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+
+def _ts(value):
+    """Firestore timestamp (or epoch seconds) -> float seconds; None when absent"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return None
+
+
+def _dt(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+
+
+# --------------------------------------------------
+# COLLECTION -> TABLE BINDINGS
+# --------------------------------------------------
+class Binding:
+    """How one Firestore collection maps onto a local table keyed by document id.
+
+    to_row(data) gives the values for columns, or None when the document is
+    not usable locally. None values leave the local column as it was.
+    """
+
+    def __init__(self, collection, table, columns, to_row, scope="1", fresh=None):
+        self.collection = collection
+        self.table = table
+        self.columns = columns
+        self.to_row = to_row
+        self.scope = scope      # rows this binding owns, for snapshot deletes
+        self.fresh = fresh      # local write time column: newer rows survive a snapshot
+        marks = ", ".join("?" * (len(columns) + 2))
+        updates = ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in columns + ("remote_version",))
+        # A scoped table has a partial unique index on doc_id, so the upsert names the same WHERE
+        target = "(doc_id)" if scope == "1" else f"(doc_id) WHERE {scope}"
+        self.upsert_sql = (f"INSERT INTO {table} (doc_id, {', '.join(columns)}, remote_version) VALUES ({marks}) "
+                           f"ON CONFLICT{target} DO UPDATE SET {updates}")
+
+
+def _patient_row(data):
+    if not data.get("name"):
+        return None
+    return (normalize_name(data["name"]), data["name"], data.get("email"), time.time())
+
+
+def _doctor_row(data):
+    if not data.get("name"):
+        return None
+    slots = data.get("slots")
+    if isinstance(slots, (list, tuple)):
+        slots = ",".join(slots)
+    return (data["name"], data.get("specialization", "General"), slots)
+
+
+BINDINGS = {
+    "patients": Binding("patients", "patient_index", ("name_key", "name", "email", "updated_at"),
+                        _patient_row, fresh="updated_at"),
+    # Doctors seeded locally (seed_doctors.py) have no doc_id and are left alone
+    "doctors": Binding("doctors", "doctors", ("name", "specialization", "slots"),
+                       _doctor_row, scope="doc_id IS NOT NULL"),
+}
+
+
+class LeaseLost(Exception):
+    """Another process took the sync lease while this pass was running"""
+
+
+# --------------------------------------------------
+# SYNC ENGINE
+# --------------------------------------------------
+class FirestoreSync:
+    """Two-way sync between Firestore collections and their SQLite tables.
+
+    Pull: a full snapshot paged by document id, then incremental pages
+    ordered by `updated_at`. Each page is applied in one transaction together
+    with its checkpoint, so an interrupted pass resumes at the next page.
+
+    Push: write() updates the local row and queues the document in
+    sync_outbox in one transaction; push() sends the queue as Firestore
+    batched writes of up to 500 operations, stamping `updated_at` with the
+    server time.
+
+    Conflicts are settled by SYNC_CONFLICT_POLICY. Pending local edits and
+    remote versions are compared, never clocks.
+
+    sync_once() runs only while holding the sync_lease row, so workers
+    sharing the database never interleave passes over sync_seen and the
+    outbox; every page commits only if the lease is still ours.
+    """
+
+    def __init__(self, db, path=DB_NAME, bindings=BINDINGS, interval=SYNC_INTERVAL, page_size=SYNC_PAGE_SIZE,
+                 batch_size=SYNC_BATCH_SIZE, policy=SYNC_CONFLICT_POLICY, lease_seconds=SYNC_LEASE_SECONDS):
+        if policy not in ("remote", "local"):
+            raise ValueError(f"Unknown conflict policy: {policy}")
+        self.db = db
+        self.path = path
+        self.bindings = bindings
+        self.interval = interval
+        self.page_size = page_size
+        self.batch_size = min(MAX_BATCH_OPS, batch_size)
+        self.policy = policy
+        self.lease_seconds = lease_seconds
+        self._holding = None      # lease holder id while a pass runs
+        self._callbacks = {}
+        self._wake = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pass_lock = threading.Lock()
+        self.counts = {"pages": 0, "applied": 0, "deleted": 0, "pushed": 0, "batches": 0, "conflicts": 0,
+                       "skipped": 0}
+        self.last_sync = None
+        self.last_error = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def init_schema(self):
+        """Sync tables, plus doc_id/remote_version on the bound tables (run after their own init_schema)"""
+        with get_db(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_checkpoints (
+                    collection TEXT PRIMARY KEY,
+                    phase TEXT NOT NULL,
+                    cursor_ts REAL,
+                    cursor_id TEXT,
+                    snapshot_started REAL,
+                    snapshot_done REAL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_seen (
+                    collection TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    PRIMARY KEY (collection, doc_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    collection TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    op TEXT NOT NULL,
+                    data TEXT,
+                    base_version REAL,
+                    rev INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_sync_outbox_doc ON sync_outbox(collection, doc_id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_lease (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    holder TEXT,
+                    expires REAL NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO sync_lease (id, holder, expires) VALUES (1, NULL, 0)")
+            for binding in self.bindings.values():
+                columns = {r["name"] for r in conn.execute(f"PRAGMA table_info({binding.table})")}
+                if "doc_id" not in columns:
+                    conn.execute(f"ALTER TABLE {binding.table} ADD COLUMN doc_id TEXT")
+                if "remote_version" not in columns:
+                    conn.execute(f"ALTER TABLE {binding.table} ADD COLUMN remote_version REAL")
+                if binding.scope != "1":
+                    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{binding.table}_doc_id "
+                                 f"ON {binding.table}(doc_id) WHERE doc_id IS NOT NULL")
+
+    def on_change(self, collection, callback):
+        """callback() after pulled or written changes to collection commit"""
+        self._callbacks.setdefault(collection, []).append(callback)
+
+    def _changed(self, collection):
+        for callback in self._callbacks.get(collection, ()):
+            try:
+                callback()
+            except Exception as e:
+                print("⚠️ Sync callback failed:", e)
+
+    # --------------------------------------------------
+    # LOCAL WRITES (QUEUED FOR PUSH)
+    # --------------------------------------------------
+    def write(self, collection, data, doc_id=None):
+        """Create or merge a document locally and queue it for Firestore; returns its id"""
+        binding = self.bindings[collection]
+        doc_id = doc_id or new_doc_id()
+        row = binding.to_row(data)
+        if row is None:
+            raise ValueError(f"Incomplete {collection} document")
+        with get_db(self.path) as conn:
+            conn.execute(binding.upsert_sql, (doc_id,) + row + (None,))
+            self._enqueue(conn, collection, doc_id, "set", data)
+        self._changed(collection)
+        self._wake.set()
+        return doc_id
+
+    def delete(self, collection, doc_id):
+        binding = self.bindings[collection]
+        with get_db(self.path) as conn:
+            conn.execute(f"DELETE FROM {binding.table} WHERE doc_id = ?", (doc_id,))
+            self._enqueue(conn, collection, doc_id, "delete", None)
+        self._changed(collection)
+        self._wake.set()
+
+    def _enqueue(self, conn, collection, doc_id, op, data):
+        # One pending op per document, so a batch never writes a document twice
+        pending = conn.execute("SELECT op, data FROM sync_outbox WHERE collection = ? AND doc_id = ?",
+                               (collection, doc_id)).fetchone()
+        if pending is not None and op == "set" and pending["op"] == "set":
+            data = dict(json.loads(pending["data"]), **data)
+        if pending is not None:
+            conn.execute("UPDATE sync_outbox SET op = ?, data = ?, rev = rev + 1 WHERE collection = ? AND doc_id = ?",
+                         (op, json.dumps(data) if data is not None else None, collection, doc_id))
+            return
+        binding = self.bindings[collection]
+        base = conn.execute(f"SELECT remote_version FROM {binding.table} WHERE doc_id = ?", (doc_id,)).fetchone()
+        conn.execute("""
+            INSERT INTO sync_outbox (collection, doc_id, op, data, base_version, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (collection, doc_id, op, json.dumps(data) if data is not None else None,
+              base[0] if base else None, time.time()))
+
+    # --------------------------------------------------
+    # PUSH (FIRESTORE BATCHED WRITES)
+    # --------------------------------------------------
+    def push(self):
+        """Send queued writes in batches of up to batch_size; returns documents written"""
+        from firebase_admin import firestore
+
+        written = 0
+        while True:
+            with get_db(self.path) as conn:
+                ops = conn.execute("SELECT id, collection, doc_id, op, data, rev FROM sync_outbox ORDER BY id LIMIT ?",
+                                   (self.batch_size,)).fetchall()
+            if not ops:
+                return written
+            with get_db(self.path) as conn:
+                self._fence(conn)
+            batch = self.db.batch()
+            for op in ops:
+                ref = self.db.collection(op["collection"]).document(op["doc_id"])
+                if op["op"] == "delete":
+                    batch.delete(ref)
+                else:
+                    batch.set(ref, dict(json.loads(op["data"]), **{VERSION_FIELD: firestore.SERVER_TIMESTAMP}), merge=True)
+            results = batch.commit()
+            with get_db(self.path) as conn:
+                self._fence(conn)
+                for op, result in zip(ops, results):
+                    version = _ts(getattr(result, "update_time", None))
+                    binding = self.bindings[op["collection"]]
+                    if op["op"] == "set" and version is not None:
+                        conn.execute(f"UPDATE {binding.table} SET remote_version = ? WHERE doc_id = ?",
+                                     (version, op["doc_id"]))
+                    # Edited again while in flight: keep it queued, based on what was just written
+                    if conn.execute("DELETE FROM sync_outbox WHERE id = ? AND rev = ?", (op["id"], op["rev"])).rowcount == 0:
+                        conn.execute("UPDATE sync_outbox SET base_version = ? WHERE id = ?", (version, op["id"]))
+            self.counts["batches"] += 1
+            self.counts["pushed"] += len(ops)
+            written += len(ops)
+
+    # --------------------------------------------------
+    # PULL (SNAPSHOT, THEN INCREMENTAL)
+    # --------------------------------------------------
+    def checkpoint(self, collection):
+        with get_db(self.path) as conn:
+            row = conn.execute("SELECT * FROM sync_checkpoints WHERE collection = ?", (collection,)).fetchone()
+        return dict(row) if row else None
+
+    def _save_checkpoint(self, conn, collection, **fields):
+        row = conn.execute("SELECT * FROM sync_checkpoints WHERE collection = ?", (collection,)).fetchone()
+        values = dict(row) if row else dict(collection=collection, phase="snapshot", cursor_ts=None, cursor_id=None,
+                                            snapshot_started=None, snapshot_done=None)
+        values.update(fields, updated_at=time.time())
+        conn.execute(f"INSERT OR REPLACE INTO sync_checkpoints ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                     list(values.values()))
+
+    def pull(self, collection):
+        """Bring one table up to date; returns documents applied"""
+        checkpoint = self.checkpoint(collection)
+        snapshot_due = checkpoint is None or checkpoint["phase"] != "incremental" or (
+            SYNC_SNAPSHOT_HOURS > 0 and time.time() - (checkpoint["snapshot_done"] or 0) > SYNC_SNAPSHOT_HOURS * 3600)
+        if snapshot_due:
+            return self._snapshot(collection, checkpoint)
+        return self._incremental(collection, checkpoint)
+
+    def _snapshot(self, collection, checkpoint):
+        binding = self.bindings[collection]
+        if checkpoint is None or checkpoint["phase"] != "snapshot":
+            with get_db(self.path) as conn:
+                self._fence(conn)
+                conn.execute("DELETE FROM sync_seen WHERE collection = ?", (collection,))
+                self._save_checkpoint(conn, collection, phase="snapshot", cursor_id=None, snapshot_started=time.time())
+            checkpoint = self.checkpoint(collection)
+        applied, cursor_id = 0, checkpoint["cursor_id"]
+        while True:
+            query = self.db.collection(collection).order_by("__name__").limit(self.page_size)
+            if cursor_id is not None:
+                query = query.start_after({"__name__": cursor_id})
+            docs = list(query.stream())
+            if docs:
+                cursor_id = docs[-1].id
+                with get_db(self.path) as conn:
+                    self._fence(conn)
+                    applied += self._apply(conn, binding, docs)
+                    conn.executemany("INSERT OR IGNORE INTO sync_seen (collection, doc_id) VALUES (?, ?)",
+                                     [(collection, d.id) for d in docs])
+                    self._save_checkpoint(conn, collection, phase="snapshot", cursor_id=cursor_id)
+            if len(docs) < self.page_size:
+                break
+
+        # Whatever was not seen is gone from Firestore, unless it is still waiting to be pushed
+        started = checkpoint["snapshot_started"]
+        fresh = f"AND {binding.fresh} < ?" if binding.fresh else ""
+        with get_db(self.path) as conn:
+            self._fence(conn)
+            deleted = conn.execute(f"""
+                DELETE FROM {binding.table} WHERE {binding.scope} {fresh}
+                AND doc_id NOT IN (SELECT doc_id FROM sync_seen WHERE collection = ?)
+                AND doc_id NOT IN (SELECT doc_id FROM sync_outbox WHERE collection = ?)
+            """, ([started] if binding.fresh else []) + [collection, collection]).rowcount
+            conn.execute("DELETE FROM sync_seen WHERE collection = ?", (collection,))
+            # Changes made while the snapshot was paging are picked up incrementally
+            self._save_checkpoint(conn, collection, phase="incremental", cursor_ts=started - SYNC_OVERLAP,
+                                  cursor_id=None, snapshot_done=time.time())
+        self.counts["deleted"] += deleted
+        if applied or deleted:
+            self._changed(collection)
+        return applied
+
+    def _incremental(self, collection, checkpoint):
+        binding = self.bindings[collection]
+        applied = 0
+        cursor_ts, cursor_id = checkpoint["cursor_ts"], checkpoint["cursor_id"]
+        since = _dt(cursor_ts)
+        while True:
+            query = (self.db.collection(collection).where(VERSION_FIELD, ">=", since)
+                     .order_by(VERSION_FIELD).order_by("__name__").limit(self.page_size))
+            if cursor_id is not None:
+                query = query.start_after({VERSION_FIELD: _dt(cursor_ts), "__name__": cursor_id})
+            docs = list(query.stream())
+            if docs:
+                last = docs[-1]
+                cursor_ts, cursor_id = _ts(last.to_dict().get(VERSION_FIELD)), last.id
+                with get_db(self.path) as conn:
+                    self._fence(conn)
+                    applied += self._apply(conn, binding, docs)
+                    self._save_checkpoint(conn, collection, cursor_ts=cursor_ts, cursor_id=cursor_id)
+            if len(docs) < self.page_size:
+                break
+        if applied:
+            self._changed(collection)
+        return applied
+
+    def _apply(self, conn, binding, docs):
+        """Upsert a page of documents in the caller's transaction; returns how many changed"""
+        ids = [d.id for d in docs]
+        marks = ", ".join("?" * len(ids))
+        versions = dict(conn.execute(f"SELECT doc_id, remote_version FROM {binding.table} WHERE doc_id IN ({marks})", ids))
+        pending = {r["doc_id"]: r["base_version"] for r in conn.execute(
+            f"SELECT doc_id, base_version FROM sync_outbox WHERE collection = ? AND doc_id IN ({marks})",
+            [binding.collection] + ids)}
+        applied = 0
+        for doc in docs:
+            data = doc.to_dict()
+            version = _ts(data.get(VERSION_FIELD) or data.get("created_at"))
+            if doc.id in pending:
+                base = pending[doc.id]
+                if base is not None and version is not None and version <= base:
+                    continue  # the edit is based on this version; push will send it
+                self.counts["conflicts"] += 1
+                if self.policy == "local":
+                    continue
+                conn.execute("DELETE FROM sync_outbox WHERE collection = ? AND doc_id = ?", (binding.collection, doc.id))
+            elif version is not None and versions.get(doc.id) is not None and version <= versions[doc.id]:
+                continue  # already have it
+            row = binding.to_row(data)
+            if row is None:
+                conn.execute(f"DELETE FROM {binding.table} WHERE doc_id = ?", (doc.id,))
+            else:
+                conn.execute(binding.upsert_sql, (doc.id,) + row + (version,))
+            applied += 1
+        self.counts["pages"] += 1
+        self.counts["applied"] += applied
+        return applied
+
+    # --------------------------------------------------
+    # BACKGROUND PASSES
+    # --------------------------------------------------
+    def sync_once(self):
+        """Pull every collection, then push; returns {collection: applied, 'pushed': n},
+        or None when another process's pass holds the lease"""
+        with self._pass_lock:
+            if not self.acquire():
+                self.counts["skipped"] += 1
+                return None
+            try:
+                result = {collection: self.pull(collection) for collection in self.bindings}
+                result["pushed"] = self.push()
+            finally:
+                self.release()
+            self.last_sync = time.time()
+            return result
+
+    # --------------------------------------------------
+    # CROSS-PROCESS LEASE
+    # --------------------------------------------------
+    def _holder_id(self):
+        return f"{os.getpid()}:{id(self)}"
+
+    def acquire(self):
+        """Take the sync lease if it is free, expired or already ours"""
+        holder, now = self._holder_id(), time.time()
+        with get_db(self.path) as conn:
+            taken = conn.execute("""
+                UPDATE sync_lease SET holder = ?, expires = ?
+                WHERE id = 1 AND (holder IS NULL OR holder = ? OR expires <= ?)
+            """, (holder, now + self.lease_seconds, holder, now)).rowcount
+        self._holding = holder if taken else None
+        return bool(taken)
+
+    def release(self):
+        holder, self._holding = self._holding, None
+        if holder is not None:
+            with get_db(self.path) as conn:
+                conn.execute("UPDATE sync_lease SET holder = NULL, expires = 0 WHERE id = 1 AND holder = ?", (holder,))
+
+    def _fence(self, conn):
+        """During a pass, extend the lease in the caller's transaction; raise LeaseLost if it is gone"""
+        if self._holding is None:
+            return
+        if conn.execute("UPDATE sync_lease SET expires = ? WHERE id = 1 AND holder = ?",
+                        (time.time() + self.lease_seconds, self._holding)).rowcount == 0:
+            raise LeaseLost("Sync lease was taken over by another process")
+
+    def start(self):
+        if not self.enabled:
+            return
+        # Re-start after fork: the thread does not survive into the child
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="firestore-sync", daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            try:
+                self.sync_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print("❌ Firestore sync error:", e)
+            # Local writes wake the loop early so they reach Firestore promptly
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def stats(self):
+        with get_db(self.path) as conn:
+            queued = conn.execute("SELECT COUNT(*) FROM sync_outbox").fetchone()[0]
+            checkpoints = {r["collection"]: {"phase": r["phase"], "cursor_ts": r["cursor_ts"]}
+                           for r in conn.execute("SELECT collection, phase, cursor_ts FROM sync_checkpoints")}
+            lease = conn.execute("SELECT holder FROM sync_lease WHERE id = 1 AND expires > ?", (time.time(),)).fetchone()
+        return dict(self.counts, queued=queued, checkpoints=checkpoints, policy=self.policy,
+                    lease_holder=lease["holder"] if lease else None,
+                    last_sync=self.last_sync, last_error=self.last_error, running=self._pid == os.getpid())
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync Firestore patients and doctors with SQLite")
+    parser.add_argument("--snapshot", action="store_true", help="start a full snapshot instead of resuming")
+    args = parser.parse_args()
+
+    import app as app_module
+
+    app_module.ensure_schema()
+    if args.snapshot:
+        with get_db(app_module.DB) as conn:
+            conn.execute("UPDATE sync_checkpoints SET phase = 'restart'")
+    started = time.perf_counter()
+    result = app_module.sync.sync_once()
+    if result is None:
+        print("⏳ Another process is syncing; try again once its pass ends")
+    else:
+        print(f"✅ Synced {result} in {time.perf_counter() - started:.2f}s")
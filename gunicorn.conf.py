@@ -0,0 +1,12 @@
+# gunicorn picks this file up from the working directory.
+#
+# Preloading imports app.py once in the master and forks workers from it.
+# Nothing remote or on disk is opened at import: Firebase, the SendGrid
+# client and the schema check are all built on first use in each worker,
+# and the SQLite pool, outbox and audit writer reset themselves after fork.
+import os
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:" + os.getenv("PORT", "10000"))
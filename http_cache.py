@@ -0,0 +1,241 @@
+import functools
+import gzip
+import hashlib
+import os
+import re
+import stat
+import threading
+
+from cache import make_cache
+from database import get_db
+
+try:
+    import brotli
+except ImportError:     # optional: gzip only without it
+    brotli = None
+
+HTTP_CACHE = os.getenv("HTTP_CACHE", "1") != "0"
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# Fingerprinted asset URLs never change content, so browsers may keep them this long
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 86400)))
+
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "application/x-javascript",
+                "application/xml", "image/svg+xml", "application/vnd.ms-fontobject", "font/ttf", "font/otf")
+# Appended inside the quotes: a compressed body is a different representation
+ETAG_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
+_SUFFIX = re.compile(r'-(gzip|br)"')
+# Local src/href references in static HTML pages
+_ASSET_REF = re.compile(r'\b(src|href)="(?![a-z]+:|//|#)([^"?#]+)"')
+
+_stats = {"not_modified": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0, "fingerprinted": 0}
+# Compressed static files by (file ETag, encoding), compressed once for all workers
+_static_bodies = make_cache("static_bodies", ttl=86400, maxsize=512)
+_fingerprints = {}
+_lock = threading.Lock()
+
+
+# --------------------------------------------------
+# TABLE VERSIONS -> LIST ETAGS
+# --------------------------------------------------
+def table_versions(conn, tables):
+    """{table: version} from the trigger-kept counters, plus the database's epoch"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    names = ("epoch",) + tuple(tables)
+    return dict(cursor.execute(
+        f"SELECT tbl, version FROM table_versions WHERE tbl IN ({', '.join('?' * len(names))})", names
+    ).fetchall())
+
+
+def versioned(*tables, connect=get_db, when=None):
+    """Strong ETag for a GET built from the versions of `tables` and the full URL.
+
+    A matching If-None-Match is answered 304 before the view runs, so an
+    unchanged list costs one primary key read. Versions are read before the
+    view's query: a write in between only makes the tag stale, never wrong.
+    `when` (e.g. a login check) must hold for the shortcut to apply.
+    """
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import Response, g, request
+
+            if not HTTP_CACHE or request.method not in ("GET", "HEAD") or (when is not None and not when()):
+                return view(*args, **kwargs)
+            with connect() as conn:
+                versions = table_versions(conn, tables)
+            key = "|".join([request.full_path] + [f"{t}={versions.get(t)}" for t in sorted(versions)])
+            etag = hashlib.sha1(key.encode()).hexdigest()[:24]
+            if request.if_none_match.contains_weak(etag):
+                _stats["not_modified"] += 1
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = "private, no-cache"
+                return response
+            g.version_etag = etag
+            return view(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --------------------------------------------------
+# STATIC ASSETS
+# --------------------------------------------------
+def fingerprint(path):
+    """Short content hash of a file, recomputed only when its size or mtime changes"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _fingerprints.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    with _lock:
+        _fingerprints[path] = (key, digest)
+    return digest
+
+
+def fingerprint_html(html, static_folder, base=""):
+    """Append ?v=<content hash> to every src/href naming a file under static_folder"""
+    def replace(match):
+        attr, ref = match.groups()
+        target = ref.lstrip("/") if ref.startswith("/") else os.path.join(base, ref)
+        path = os.path.normpath(os.path.join(static_folder, target))
+        digest = fingerprint(path) if path.startswith(static_folder + os.sep) else None
+        if digest is None:
+            return match.group(0)
+        _stats["fingerprinted"] += 1
+        return f'{attr}="{ref}?v={digest}"'
+    return _ASSET_REF.sub(replace, html)
+
+
+# --------------------------------------------------
+# COMPRESSION
+# --------------------------------------------------
+def compress(data, encoding, level=None):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def negotiate(request):
+    """Best encoding the client accepts, or None"""
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered) if request.accept_encodings else None
+
+
+def compressible(response):
+    mimetype = response.mimetype or ""
+    return mimetype.startswith(COMPRESSIBLE) and "Content-Encoding" not in response.headers
+
+
+def stats():
+    counts = dict(_stats)
+    counts["brotli"] = brotli is not None
+    counts["ratio"] = round(_stats["bytes_out"] / _stats["bytes_in"], 4) if _stats["bytes_in"] else None
+    counts["static_bodies"] = _static_bodies.stats()
+    return counts
+
+
+# --------------------------------------------------
+# FLASK HOOK
+# --------------------------------------------------
+def install(app):
+    """Compression, list ETags and static cache headers on every response `app` serves.
+
+    Install before the other after_request hooks so it runs last and
+    compresses what they return.
+    """
+    from flask import g, request
+
+    if not HTTP_CACHE:
+        return
+
+    @app.before_request
+    def _etag_suffix():
+        # Validators we sent with a compressed body carry its suffix; compare on the base tag
+        raw = request.environ.get("HTTP_IF_NONE_MATCH")
+        match = _SUFFIX.search(raw) if raw else None
+        if match:
+            g.etag_encoding = match.group(1)
+            request.environ["HTTP_IF_NONE_MATCH"] = _SUFFIX.sub('"', raw)
+
+    def _static(response):
+        """Fingerprint HTML pages; give assets requested by their fingerprint a year's lifetime"""
+        response.direct_passthrough = False
+        if response.mimetype == "text/html":
+            filename = (request.view_args or {}).get("filename", "") if request.endpoint == "static" else ""
+            html = fingerprint_html(response.get_data(as_text=True), app.static_folder, os.path.dirname(filename))
+            response.set_data(html)
+            # The page changes whenever an asset it names does, so tag what is sent
+            response.set_etag(hashlib.sha1(html.encode()).hexdigest()[:24])
+            response.headers.pop("Last-Modified", None)
+            response.headers["Cache-Control"] = "no-cache"
+            return response.make_conditional(request)
+
+        if request.endpoint == "static":
+            version = request.args.get("v")
+            path = os.path.join(app.static_folder, request.view_args["filename"])
+            if version and version == fingerprint(path):
+                response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+            else:
+                response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    @app.after_request
+    def _cache_and_compress(response):
+        etag = g.pop("version_etag", None)
+        if etag is not None and response.status_code == 200 and not response.get_etag()[0]:
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+
+        static = response.direct_passthrough and response.status_code == 200
+        if static:
+            response = _static(response)
+
+        if response.status_code == 304:
+            encoding = g.get("etag_encoding")
+            tag = response.get_etag()[0]
+            if tag and encoding and encoding == negotiate(request):
+                response.set_etag(tag + ETAG_SUFFIXES[encoding])
+            return response
+
+        if response.status_code != 200 or response.is_streamed and not static or not compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(request)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+
+        tag = response.get_etag()[0]
+        if static and tag:
+            # Files are compressed once, at the highest level
+            key = (tag, encoding)
+            body = _static_bodies.get(key)
+            if body is None:
+                body = compress(data, encoding, 11 if encoding == "br" else 9)
+                _static_bodies.set(key, body)
+        else:
+            body = compress(data, encoding)
+        if len(body) >= len(data):
+            return response
+
+        _stats["compressed"] += 1
+        _stats["bytes_in"] += len(data)
+        _stats["bytes_out"] += len(body)
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        response.headers.pop("Accept-Ranges", None)
+        if tag:
+            response.set_etag(tag + ETAG_SUFFIXES[encoding])
+        return response
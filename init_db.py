@@ -38,3 +38,7 @@ conn.commit()
 conn.close()
 
 print("✅ Database initialized")
+
+# Versioned migrations: indexes, resource tables, counters, unified view
+from migrations import migrate
+migrate("hospital.db", verbose=True)
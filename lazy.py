@@ -0,0 +1,44 @@
+import os
+import threading
+
+
+class Lazy:
+    """Proxy that builds its target on first attribute access.
+
+    The target is rebuilt in a forked child (gunicorn --preload), since
+    gRPC channels and background threads do not survive fork.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._target = self._factory()
+                    self._pid = os.getpid()
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+class Once:
+    """Run `fn` once per process, on first call; later calls are a flag check"""
+
+    def __init__(self, fn):
+        self._fn = fn
+        self._done_pid = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._done_pid == os.getpid():
+            return
+        with self._lock:
+            if self._done_pid != os.getpid():
+                self._fn()
+                self._done_pid = os.getpid()
@@ -1,25 +1,342 @@
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from database import get_db, DB_NAME
+from metrics import segment
+
+# --------------------------------------------------
+# TRANSPORTS
+# --------------------------------------------------
+class SendGridTransport:
+    """Sends through one shared SendGridAPIClient, built on the first send"""
+
+    def __init__(self, api_key, sender):
+        self.api_key = api_key
+        self.sender = sender
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from sendgrid import SendGridAPIClient
+            self._client = SendGridAPIClient(self.api_key)
+        return self._client
+
+    def send(self, to, subject, html=None, text=None):
+        from sendgrid.helpers.mail import Mail
+
+        message = Mail(
+            from_email=self.sender,
+            to_emails=to,
+            subject=subject,
+            html_content=html,
+            plain_text_content=text
+        )
+        self.client.send(message)
+
+
+class FakeTransport:
+    """Local stand-in that records messages instead of sending them"""
+
+    def __init__(self, fail_first=0):
+        self.sent = []
+        self.fail_first = fail_first
+        self._lock = threading.Lock()
+
+    def send(self, to, subject, html=None, text=None):
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                raise RuntimeError("fake transport failure")
+            self.sent.append({"to": to, "subject": subject, "html": html, "text": text})
+
+
+class AsyncSendGridTransport:
+    """SendGrid v3 mail/send over a shared httpx.AsyncClient, for the ASGI mode"""
+
+    URL = "https://api.sendgrid.com/v3/mail/send"
+
+    def __init__(self, api_key, sender, timeout=10.0):
+        import httpx
+        self.sender = sender
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            headers={"Authorization": f"Bearer {api_key}"}
+        )
+
+    async def send(self, to, subject, html=None, text=None):
+        content = []
+        if text:
+            content.append({"type": "text/plain", "value": text})
+        if html:
+            content.append({"type": "text/html", "value": html})
+        response = await self.client.post(self.URL, json={
+            "personalizations": [{"to": [{"email": to}]}],
+            "from": {"email": self.sender},
+            "subject": subject,
+            "content": content,
+        })
+        response.raise_for_status()
+
+
+class FakeAsyncTransport(FakeTransport):
+    """Async stand-in; `delay` simulates the SendGrid round trip"""
+
+    def __init__(self, fail_first=0, delay=0.0):
+        super().__init__(fail_first)
+        self.delay = delay
+
+    async def send(self, to, subject, html=None, text=None):
+        import asyncio
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        FakeTransport.send(self, to, subject, html, text)
+
+
+def transport_from_env(sender_var="FROM_EMAIL"):
+    """Transport named by EMAIL_TRANSPORT, or None if email is not configured"""
+    if os.getenv("EMAIL_TRANSPORT") == "fake":
+        return FakeTransport()
 
-def send_email(to, subject, body):
     sg_key = os.getenv("SENDGRID_API_KEY")
-    sender = os.getenv("SENDER_EMAIL")
+    sender = os.getenv(sender_var)
+    if not sg_key or not sender:
+        return None
+    return SendGridTransport(sg_key, sender)
+
 
+def async_transport_from_env(sender_var="FROM_EMAIL"):
+    if os.getenv("EMAIL_TRANSPORT") == "fake":
+        return FakeAsyncTransport()
+
+    sg_key = os.getenv("SENDGRID_API_KEY")
+    sender = os.getenv(sender_var)
     if not sg_key or not sender:
+        return None
+    return AsyncSendGridTransport(sg_key, sender)
+
+
+_plain_transport = None
+
+
+def send_email(to, subject, body):
+    global _plain_transport
+    if _plain_transport is None:
+        _plain_transport = transport_from_env("SENDER_EMAIL")
+
+    if _plain_transport is None:
         print("SendGrid not configured")
         return
 
-    message = Mail(
-        from_email=sender,
-        to_emails=to,
-        subject=subject,
-        plain_text_content=body
-    )
-
     try:
-        sg = SendGridAPIClient(sg_key)
-        sg.send(message)
+        with segment("sendgrid"):
+            _plain_transport.send(to, subject, text=body)
         print("Email sent successfully")
     except Exception as e:
         print("SendGrid error:", e)
+
+
+# --------------------------------------------------
+# OUTBOX
+# --------------------------------------------------
+class Outbox:
+    """Durable email queue in SQLite, drained by background sender threads.
+
+    enqueue() takes the caller's connection so the email row commits or
+    rolls back together with the business write that triggered it.
+    """
+
+    def __init__(self, transport, path=DB_NAME, workers=4, batch_size=20,
+                 max_attempts=5, base_delay=2.0, poll_interval=1.0, stale_after=300):
+        self.transport = transport
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pid = None
+        self._thread = None
+        self._pool = None
+        self._start_lock = threading.Lock()
+        # Set by a drainer running elsewhere in this process (the ASGI event
+        # loop): notify() wakes it and the thread poller is never started
+        self.waker = None
+
+    def init_schema(self):
+        with get_db(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS email_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipient TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    html TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    claim TEXT,
+                    claimed_at REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    sent_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(status, next_attempt_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_claim ON email_outbox(claim) WHERE claim IS NOT NULL")
+
+    def enqueue(self, conn, to, subject, html):
+        if self.transport is None:
+            print("⚠️ Email not configured")
+            return None
+        now = time.time()
+        return conn.execute("""
+            INSERT INTO email_outbox (recipient, subject, html, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (to, subject, html, now, now)).lastrowid
+
+    def notify(self):
+        """Call after the enqueueing transaction commits"""
+        if self.transport is None:
+            return
+        if self.waker is not None:
+            self.waker()
+            return
+        self.start()
+        self._wake.set()
+
+    # --------------------------------------------------
+    # WORKER
+    # --------------------------------------------------
+    def start(self):
+        # Re-start after fork: threads do not survive into the child
+        if self.transport is None or self.waker is not None or self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="outbox")
+            self._thread = threading.Thread(target=self._run, name="outbox-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._pool:
+            self._pool.shutdown(wait=True)
+        self._pid = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.drain_once()
+            except Exception as e:
+                print("❌ Outbox error:", e)
+                sent = 0
+            if not sent:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self):
+        claim = uuid.uuid4().hex
+        now = time.time()
+        with get_db(self.path) as conn:
+            # Requeue rows whose sender died mid-batch
+            conn.execute("""
+                UPDATE email_outbox SET status = 'pending', claim = NULL
+                WHERE status = 'sending' AND claimed_at < ?
+            """, (now - self.stale_after,))
+            conn.execute("""
+                UPDATE email_outbox SET status = 'sending', claim = ?, claimed_at = ?
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at LIMIT ?
+                )
+            """, (claim, now, now, self.batch_size))
+            return conn.execute("""
+                SELECT id, recipient, subject, html, attempts FROM email_outbox WHERE claim = ?
+            """, (claim,)).fetchall()
+
+    def _deliver(self, row):
+        try:
+            with segment("sendgrid"):
+                self.transport.send(row["recipient"], row["subject"], html=row["html"])
+            return row["id"], row["attempts"] + 1, None
+        except Exception as e:
+            return row["id"], row["attempts"] + 1, str(e)
+
+    def drain_once(self):
+        """Claim one batch, send it in parallel and record the outcome"""
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        results = list(self._pool.map(self._deliver, rows)) if self._pool else [self._deliver(r) for r in rows]
+        return self._record(results)
+
+    async def drain_async(self, transport, run):
+        """drain_once for the event loop: `run` moves the SQLite work off the loop"""
+        import asyncio
+
+        async def deliver(row):
+            try:
+                with segment("sendgrid"):
+                    await transport.send(row["recipient"], row["subject"], html=row["html"])
+                return row["id"], row["attempts"] + 1, None
+            except Exception as e:
+                return row["id"], row["attempts"] + 1, str(e)
+
+        rows = await run(self._claim)
+        if not rows:
+            return 0
+        results = await asyncio.gather(*(deliver(r) for r in rows))
+        return await run(self._record, results)
+
+    def _record(self, results):
+        now = time.time()
+        sent, retry, failed = [], [], []
+        for row_id, attempts, error in results:
+            if error is None:
+                sent.append((attempts, now, row_id))
+            elif attempts >= self.max_attempts:
+                failed.append((attempts, error, row_id))
+            else:
+                delay = min(self.base_delay * 2 ** (attempts - 1), 3600)
+                retry.append((attempts, now + delay, error, row_id))
+
+        with get_db(self.path) as conn:
+            conn.executemany("""
+                UPDATE email_outbox SET status = 'sent', attempts = ?, sent_at = ?, claim = NULL, last_error = NULL
+                WHERE id = ?
+            """, sent)
+            conn.executemany("""
+                UPDATE email_outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?, claim = NULL
+                WHERE id = ?
+            """, retry)
+            conn.executemany("""
+                UPDATE email_outbox SET status = 'failed', attempts = ?, last_error = ?, claim = NULL
+                WHERE id = ?
+            """, failed)
+        for _, _, error, _ in retry:
+            print("❌ Email error (will retry):", error)
+        for _, error, _ in failed:
+            print("❌ Email error (giving up):", error)
+        return len(sent)
+
+    def stats(self):
+        with get_db(self.path) as conn:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM email_outbox GROUP BY status"
+            ).fetchall())
+        counts["running"] = self._pid == os.getpid()
+        return counts
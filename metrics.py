@@ -0,0 +1,380 @@
+import contextvars
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# Anyone may profile when set; otherwise only admin sessions
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# --------------------------------------------------
+# PRIMITIVES
+# --------------------------------------------------
+class Histogram:
+    """Cumulative-bucket histogram per label tuple, Prometheus style"""
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            base = _labels(self.labels, labels)
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {running}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{base}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, labels)}}} {_number(value)}")
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for n, v in zip(names, values))
+
+
+def _number(value):
+    return f"{value:.6f}" if isinstance(value, float) else str(value)
+
+
+REQUEST_SECONDS = Histogram("hms_request_duration_seconds", "Request latency by route", ("method", "route"))
+REQUESTS = Counter("hms_requests_total", "Requests by route and status", ("method", "route", "status"))
+SEGMENT_SECONDS = Histogram("hms_segment_duration_seconds", "Time per SQLite/Firestore/Auth/SendGrid call", ("segment",))
+ROUTE_SEGMENT_SECONDS = Counter("hms_route_segment_seconds_total", "Request time spent per segment", ("route", "segment"))
+ROUTE_READS = Counter("hms_route_reads_total", "SQLite rows and Firestore documents read", ("route", "kind"))
+
+_current = contextvars.ContextVar("hms_request_metrics", default=None)
+
+
+# --------------------------------------------------
+# PER-REQUEST ACCOUNTING
+# --------------------------------------------------
+class RequestMetrics:
+    __slots__ = ("segments", "rows", "documents")
+
+    def __init__(self):
+        self.segments = {}
+        self.rows = 0
+        self.documents = 0
+
+
+def begin():
+    """Start accounting for the current request; returns the reset token"""
+    return _current.set(RequestMetrics())
+
+
+def end(token, method, route, status, seconds):
+    current = _current.get()
+    _current.reset(token)
+    route = route or "<unmatched>"
+    REQUEST_SECONDS.observe(seconds, method, route)
+    REQUESTS.inc(1, method, route, status)
+    if current is None:
+        return
+    for segment, spent in current.segments.items():
+        ROUTE_SEGMENT_SECONDS.inc(spent, route, segment)
+    if current.rows:
+        ROUTE_READS.inc(current.rows, route, "rows")
+    if current.documents:
+        ROUTE_READS.inc(current.documents, route, "documents")
+
+
+def record_segment(name, seconds):
+    SEGMENT_SECONDS.observe(seconds, name)
+    current = _current.get()
+    if current is not None:
+        current.segments[name] = current.segments.get(name, 0.0) + seconds
+
+
+def count_rows(n):
+    current = _current.get()
+    if current is not None:
+        current.rows += n
+
+
+def count_documents(n):
+    current = _current.get()
+    if current is not None:
+        current.documents += n
+
+
+@contextmanager
+def segment(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_segment(name, time.perf_counter() - started)
+
+
+# --------------------------------------------------
+# SQLITE
+# --------------------------------------------------
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            record_segment("sqlite", time.perf_counter() - started)
+
+    def executemany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            record_segment("sqlite", time.perf_counter() - started)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            count_rows(1)
+        return row
+
+    def fetchmany(self, *args):
+        started = time.perf_counter()
+        rows = super().fetchmany(*args)
+        record_segment("sqlite", time.perf_counter() - started)
+        count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        record_segment("sqlite", time.perf_counter() - started)
+        count_rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        count_rows(1)
+        return row
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.connect factory: statements timed, rows read counted"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def connection_factory():
+    return TimedConnection if METRICS_ENABLED else sqlite3.Connection
+
+
+# --------------------------------------------------
+# FIRESTORE
+# --------------------------------------------------
+class _FirestoreProxy:
+    """Wraps a Firestore client, collection, query or document reference"""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def collection(self, *args):
+        return _FirestoreProxy(self._target.collection(*args))
+
+    def document(self, *args):
+        return _FirestoreProxy(self._target.document(*args))
+
+    def where(self, *args, **kwargs):
+        return _FirestoreProxy(self._target.where(*args, **kwargs))
+
+    def limit(self, *args):
+        return _FirestoreProxy(self._target.limit(*args))
+
+    def order_by(self, *args, **kwargs):
+        return _FirestoreProxy(self._target.order_by(*args, **kwargs))
+
+    def start_after(self, *args):
+        return _FirestoreProxy(self._target.start_after(*args))
+
+    def batch(self):
+        return _FirestoreProxy(self._target.batch())
+
+    def commit(self, *args, **kwargs):
+        with segment("firestore"):
+            return self._target.commit(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        with segment("firestore"):
+            result = self._target.get(*args, **kwargs)
+        count_documents(len(result) if isinstance(result, list) else 1)
+        return result
+
+    def set(self, *args, **kwargs):
+        with segment("firestore"):
+            return self._target.set(*args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        with segment("firestore"):
+            return self._target.update(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with segment("firestore"):
+            return self._target.delete(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with segment("firestore"):
+            return self._target.add(*args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        # Time is charged per batch pulled from the server, not per loop body
+        started = time.perf_counter()
+        iterator = iter(self._target.stream(*args, **kwargs))
+        record_segment("firestore", time.perf_counter() - started)
+        while True:
+            started = time.perf_counter()
+            try:
+                doc = next(iterator)
+            except StopIteration:
+                record_segment("firestore", time.perf_counter() - started)
+                return
+            record_segment("firestore", time.perf_counter() - started)
+            count_documents(1)
+            yield doc
+
+
+def instrument_firestore(client):
+    return _FirestoreProxy(client) if METRICS_ENABLED else client
+
+
+# --------------------------------------------------
+# PROFILER
+# --------------------------------------------------
+def profile_response(profiler, fmt):
+    """(body, mimetype) for a finished cProfile run"""
+    profiler.create_stats()
+    if fmt == "prof":
+        # Same bytes as pstats.dump_stats: load with snakeviz, flameprof, gprof2dot
+        return marshal.dumps(profiler.stats), "application/octet-stream"
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+    return out.getvalue(), "text/plain"
+
+
+# --------------------------------------------------
+# FLASK HOOK & EXPOSITION
+# --------------------------------------------------
+def render(extra=()):
+    lines = []
+    for metric in (REQUEST_SECONDS, REQUESTS, SEGMENT_SECONDS, ROUTE_SEGMENT_SECONDS, ROUTE_READS):
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+
+def authorized(header):
+    """True when an Authorization header carries METRICS_TOKEN; never without a token set"""
+    return bool(METRICS_TOKEN) and hmac.compare_digest((header or "").encode(), f"Bearer {METRICS_TOKEN}".encode())
+
+
+def gauges(name, help, labels, values):
+    """Exposition lines for point-in-time values: {label tuple: value}"""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{{{_labels(labels, key)}}} {_number(value)}")
+    return lines
+
+
+def install(app):
+    """Per-route timing on every request `app` serves, plus ?_profile=1 / X-Profile"""
+    from flask import Response, g, request, session
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = begin()
+        fmt = request.headers.get("X-Profile") or request.args.get("_profile")
+        if fmt and (PROFILE_REQUESTS or session.get("role") == "admin"):
+            g.profiler = cProfile.Profile()
+            g.profile_format = fmt
+            g.profiler.enable()
+
+    @app.after_request
+    def _metrics_record(response):
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            body, mimetype = profile_response(profiler, g.profile_format)
+            response = Response(body, mimetype=mimetype)
+        _finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(exc):
+        # after_request is skipped when the view raised
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+        _finish(500)
+
+    def _finish(status):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            rule = request.url_rule
+            end(token, request.method, rule.rule if rule else None, status,
+                time.perf_counter() - g.metrics_started)
@@ -0,0 +1,551 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from database import get_db, DB_NAME
+
+# Where package/model.py kept its tables before both schemas moved into DB_NAME
+LEGACY_RESOURCE_DB = "database.db"
+
+
+# --------------------------------------------------
+# MIGRATION STEPS
+# --------------------------------------------------
+def rebuild_counters(conn):
+    """Recompute every dashboard counter from the base tables"""
+    for table in ("patient", "doctor", "appointment"):
+        conn.execute(
+            f"INSERT OR REPLACE INTO counters(name, value) VALUES (?, (SELECT COUNT(*) FROM {table}))", (table,)
+        )
+    conn.execute("DELETE FROM appointment_doctor_counts")
+    conn.execute("""
+        INSERT INTO appointment_doctor_counts(doc_id, n)
+        SELECT doc_id, COUNT(*) FROM appointment GROUP BY doc_id
+    """)
+    conn.execute("DELETE FROM appointment_day_counts")
+    conn.execute("""
+        INSERT INTO appointment_day_counts(day, n)
+        SELECT substr(appointment_date, 1, 10), COUNT(*) FROM appointment GROUP BY 1
+    """)
+
+
+def _patient_doctor_count_triggers(conn):
+    for table in ("patient", "doctor"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_ins AFTER INSERT ON {table}
+            BEGIN UPDATE counters SET value = value + 1 WHERE name = '{table}'; END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_del AFTER DELETE ON {table}
+            BEGIN UPDATE counters SET value = value - 1 WHERE name = '{table}'; END
+        """)
+
+
+def _merge_legacy_resource_db(conn):
+    """Copy patient/doctor/appointment rows from the old database.db, keeping their ids.
+
+    Only tables that are still empty here are filled, so re-running is a no-op.
+    """
+    legacy = os.path.abspath(LEGACY_RESOURCE_DB)
+    main = conn.execute("PRAGMA database_list").fetchone()["file"]
+    if not os.path.exists(legacy) or os.path.abspath(main) == legacy:
+        return
+
+    conn.commit()   # ATTACH is not allowed inside a transaction
+    conn.execute("ATTACH DATABASE ? AS legacy", (legacy,))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        legacy_tables = {r["name"] for r in conn.execute("SELECT name FROM legacy.sqlite_master WHERE type = 'table'")}
+        copied = {}
+        for table in ("patient", "doctor", "appointment"):
+            if table not in legacy_tables:
+                continue
+            if conn.execute(f"SELECT 1 FROM main.{table} LIMIT 1").fetchone():
+                continue
+            columns = ", ".join(r["name"] for r in conn.execute(f"PRAGMA main.table_info({table})"))
+            copied[table] = conn.execute(
+                f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM legacy.{table}"
+            ).rowcount
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE legacy")
+    if copied:
+        print("✅ Merged legacy resource rows:", copied)
+
+
+# Stripped from phone and insurance numbers on both sides, so '555-123' finds '(555) 123'
+NUMBER_PUNCTUATION = (" ", "-", "(", ")", "+", ".", "/")
+
+
+def _compact(column):
+    """SQL removing NUMBER_PUNCTUATION from a column"""
+    expr = column
+    for ch in NUMBER_PUNCTUATION:
+        expr = f"replace({expr}, '{ch}', '')"
+    return expr
+
+
+# Contentless FTS5 index per table: (fts table, key, {column: SQL over a row alias "r"})
+SEARCH_INDEXES = {
+    "patient": ("patient_fts", "pat_id", {
+        "name": "r.pat_first_name || ' ' || r.pat_last_name",
+        "phone": _compact("r.pat_ph_no"),
+        "insurance": _compact("r.pat_insurance_no"),
+    }),
+    "doctor": ("doctor_fts", "doc_id", {
+        "name": "r.doc_first_name || ' ' || r.doc_last_name",
+        "phone": _compact("r.doc_ph_no"),
+        "specialization": "COALESCE(r.doc_specialization, '')",
+    }),
+}
+
+
+def _search_values(columns, alias):
+    return ", ".join(expr.replace("r.", f"{alias}.") for expr in columns.values())
+
+
+def rebuild_search(conn, tables=SEARCH_INDEXES):
+    """Re-index every row of the searched tables from scratch"""
+    for table in tables:
+        fts, key, columns = SEARCH_INDEXES[table]
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('delete-all')")
+        conn.execute(f"""
+            INSERT INTO {fts}(rowid, {', '.join(columns)})
+            SELECT r.{key}, {_search_values(columns, 'r')} FROM {table} r
+        """)
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+
+
+def _search_indexes(conn):
+    if "doc_specialization" not in {r["name"] for r in conn.execute("PRAGMA table_info(doctor)")}:
+        conn.execute("ALTER TABLE doctor ADD COLUMN doc_specialization TEXT")
+    for table, (fts, key, columns) in SEARCH_INDEXES.items():
+        # Contentless: the index holds tokens only, rows are read back from the table
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {', '.join(columns)}, content='', prefix='1 2 3',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        # Name matches outrank phone / insurance / specialization matches
+        conn.execute(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', 'bm25(10.0, 5.0, 5.0)')")
+        names = ", ".join(columns)
+        delete = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.{key}, {_search_values(columns, 'old')});"
+        insert = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.{key}, {_search_values(columns, 'new')});"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_ins AFTER INSERT ON {table} BEGIN {insert} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_del AFTER DELETE ON {table} BEGIN {delete} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_upd AFTER UPDATE ON {table} BEGIN {delete} {insert} END")
+    rebuild_search(conn)
+
+
+# Tables whose writes land in the change feed: {table: primary key}
+CHANGE_TABLES = {"appointments": "id", "patient": "pat_id", "doctor": "doc_id", "appointment": "app_id"}
+
+
+def _change_triggers(conn):
+    for table, key in CHANGE_TABLES.items():
+        for event, op, row in (("INSERT", "insert", "new"), ("UPDATE", "update", "new"), ("DELETE", "delete", "old")):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_changes_{table}_{op} AFTER {event} ON {table}
+                BEGIN INSERT INTO changes (tbl, row_id, op) VALUES ('{table}', {row}.{key}, '{op}'); END
+            """)
+
+
+def _version_triggers(conn):
+    # One bump per written row; list ETags (http_cache.py) are built from these
+    for table in CHANGE_TABLES:
+        conn.execute("INSERT OR IGNORE INTO table_versions (tbl, version) VALUES (?, 0)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()} AFTER {event} ON {table}
+                BEGIN UPDATE table_versions SET version = version + 1 WHERE tbl = '{table}'; END
+            """)
+
+
+# Report rollup -> {key column: expression over an appointments row `r`}.
+# Rows are keyed by doctor name; specialization is joined at report time.
+REPORT_ROLLUPS = {
+    "report_doctor_day": {"day": "r.date", "doctor": "r.doctor", "status": "r.status"},
+    "report_slot_month": {"month": "substr(r.date, 1, 7)", "doctor": "r.doctor", "time": "r.time", "status": "r.status"},
+    # Dashboard totals: appointments by status, and distinct patients booked
+    "report_status": {"status": "r.status"},
+    "report_patient": {"patient": "r.patient"},
+}
+# The rollups migration 11 created; later migrations add the rest
+V11_ROLLUPS = ("report_doctor_day", "report_slot_month")
+
+
+def rollup_select(table, schema="main"):
+    """SELECT of one rollup's (keys..., n) aggregated from {schema}.appointments"""
+    exprs = ", ".join(REPORT_ROLLUPS[table].values())
+    return f"SELECT {exprs}, COUNT(*) FROM {schema}.appointments r GROUP BY {exprs}"
+
+
+def rebuild_reports(conn, tables=None):
+    """Recompute the report rollups from the hot appointments table in one grouped pass"""
+    for table, columns in REPORT_ROLLUPS.items():
+        if tables is not None and table not in tables:
+            continue
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} ({', '.join(columns)}, n) {rollup_select(table)}")
+
+
+def _report_triggers(conn, tables=tuple(REPORT_ROLLUPS)):
+    rollups = {table: REPORT_ROLLUPS[table] for table in tables}
+    watched = sorted({expr[2:] for columns in rollups.values() for expr in columns.values() if expr.startswith("r.")})
+
+    def add(row):
+        return [f"""INSERT INTO {table} ({', '.join(columns)}, n) VALUES ({_search_values(columns, row)}, 1)
+                    ON CONFLICT({', '.join(columns)}) DO UPDATE SET n = n + 1;"""
+                for table, columns in rollups.items()]
+
+    def remove(row):
+        statements = []
+        for table, columns in rollups.items():
+            match = " AND ".join(f"{key} = {expr.replace('r.', row + '.')}" for key, expr in columns.items())
+            statements.append(f"UPDATE {table} SET n = n - 1 WHERE {match};")
+            statements.append(f"DELETE FROM {table} WHERE {match} AND n <= 0;")
+        return statements
+
+    conn.execute("CREATE TRIGGER IF NOT EXISTS trg_reports_ins AFTER INSERT ON appointments BEGIN %s END"
+                 % "\n".join(add("NEW")))
+    # Rows moved to the archive still count towards history
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_reports_del AFTER DELETE ON appointments
+                    WHEN NOT (SELECT moving FROM archive_state) BEGIN %s END""" % "\n".join(remove("OLD")))
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_reports_upd AFTER UPDATE OF %s ON appointments
+                    BEGIN %s END""" % (", ".join(watched), "\n".join(remove("OLD") + add("NEW"))))
+
+
+def _dashboard_rollups(conn):
+    """Triggers over every rollup, and the two new ones filled from the hot table"""
+    for event in ("ins", "del", "upd"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_reports_{event}")
+    _report_triggers(conn)
+    rebuild_reports(conn, ("report_status", "report_patient"))
+
+
+# Each migration: (version, name, steps); a step is SQL text or a callable(conn)
+MIGRATIONS = [
+    (1, "appointments_table", [
+        """
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient TEXT NOT NULL,
+            doctor TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            status TEXT NOT NULL
+        )
+        """,
+        # Keyset pagination walks id DESC inside each filter
+        "CREATE INDEX IF NOT EXISTS idx_appointments_doctor ON appointments(doctor, id)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_appointments_status ON appointments(status, id)",
+    ]),
+    (2, "resource_tables", [
+        """
+        CREATE TABLE IF NOT EXISTS patient (
+            pat_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pat_first_name TEXT NOT NULL,
+            pat_last_name TEXT NOT NULL,
+            pat_insurance_no TEXT NOT NULL,
+            pat_ph_no TEXT NOT NULL,
+            pat_date DATE DEFAULT (datetime('now','localtime')),
+            pat_address TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS doctor (
+            doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            doc_first_name TEXT NOT NULL,
+            doc_last_name TEXT NOT NULL,
+            doc_ph_no TEXT NOT NULL,
+            doc_date DATE DEFAULT (datetime('now','localtime')),
+            doc_address TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS appointment (
+            app_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pat_id INTEGER NOT NULL,
+            doc_id INTEGER NOT NULL,
+            appointment_date DATE NOT NULL,
+            FOREIGN KEY(pat_id) REFERENCES patient(pat_id),
+            FOREIGN KEY(doc_id) REFERENCES doctor(doc_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_appointment_date ON appointment(appointment_date, app_id)",
+    ]),
+    (3, "dashboard_counters", [
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS appointment_doctor_counts (doc_id INTEGER PRIMARY KEY, n INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS appointment_day_counts (day TEXT PRIMARY KEY, n INTEGER NOT NULL)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_appointment_count_ins AFTER INSERT ON appointment
+        BEGIN
+            UPDATE counters SET value = value + 1 WHERE name = 'appointment';
+            INSERT INTO appointment_doctor_counts(doc_id, n) VALUES (NEW.doc_id, 1)
+                ON CONFLICT(doc_id) DO UPDATE SET n = n + 1;
+            INSERT INTO appointment_day_counts(day, n) VALUES (substr(NEW.appointment_date, 1, 10), 1)
+                ON CONFLICT(day) DO UPDATE SET n = n + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_appointment_count_del AFTER DELETE ON appointment
+        BEGIN
+            UPDATE counters SET value = value - 1 WHERE name = 'appointment';
+            UPDATE appointment_doctor_counts SET n = n - 1 WHERE doc_id = OLD.doc_id;
+            DELETE FROM appointment_doctor_counts WHERE doc_id = OLD.doc_id AND n <= 0;
+            UPDATE appointment_day_counts SET n = n - 1 WHERE day = substr(OLD.appointment_date, 1, 10);
+            DELETE FROM appointment_day_counts WHERE day = substr(OLD.appointment_date, 1, 10) AND n <= 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_appointment_count_upd AFTER UPDATE OF doc_id, appointment_date ON appointment
+        BEGIN
+            UPDATE appointment_doctor_counts SET n = n - 1 WHERE doc_id = OLD.doc_id;
+            DELETE FROM appointment_doctor_counts WHERE doc_id = OLD.doc_id AND n <= 0;
+            UPDATE appointment_day_counts SET n = n - 1 WHERE day = substr(OLD.appointment_date, 1, 10);
+            DELETE FROM appointment_day_counts WHERE day = substr(OLD.appointment_date, 1, 10) AND n <= 0;
+            INSERT INTO appointment_doctor_counts(doc_id, n) VALUES (NEW.doc_id, 1)
+                ON CONFLICT(doc_id) DO UPDATE SET n = n + 1;
+            INSERT INTO appointment_day_counts(day, n) VALUES (substr(NEW.appointment_date, 1, 10), 1)
+                ON CONFLICT(day) DO UPDATE SET n = n + 1;
+        END
+        """,
+        _patient_doctor_count_triggers,
+        # Seed from the real counts when added to an existing database
+        rebuild_counters,
+    ]),
+    (4, "merge_legacy_resource_db", [_merge_legacy_resource_db]),
+    (5, "route_indexes", [
+        # Patients.get / Doctors.get sort by creation date
+        "CREATE INDEX IF NOT EXISTS idx_patient_date ON patient(pat_date)",
+        "CREATE INDEX IF NOT EXISTS idx_doctor_date ON doctor(doc_date)",
+        # FK children: joins, ON DELETE checks and the per-doctor counter rebuild
+        "CREATE INDEX IF NOT EXISTS idx_appointment_pat ON appointment(pat_id)",
+        "CREATE INDEX IF NOT EXISTS idx_appointment_doc ON appointment(doc_id)",
+        # Scheduler warm-up: status = 'Booked' AND date >= today
+        "CREATE INDEX IF NOT EXISTS idx_appointments_status_date ON appointments(status, date, doctor, time)",
+    ]),
+    (6, "unified_appointments_view", [
+        """
+        CREATE VIEW IF NOT EXISTS all_appointments AS
+        SELECT 'booking' AS source, id, patient, doctor, date, time, status
+        FROM appointments
+        UNION ALL
+        SELECT 'resource', a.app_id,
+               p.pat_first_name || ' ' || p.pat_last_name,
+               d.doc_first_name || ' ' || d.doc_last_name,
+               substr(a.appointment_date, 1, 10),
+               substr(a.appointment_date, 12, 5),
+               'Booked'
+        FROM appointment a
+        LEFT JOIN patient p ON p.pat_id = a.pat_id
+        LEFT JOIN doctor d ON d.doc_id = a.doc_id
+        """,
+    ]),
+    (7, "audit_logs", [
+        # audit.log_action always wrote here but nothing created the table
+        """
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            actor TEXT,
+            role TEXT,
+            method TEXT,
+            route TEXT,
+            path TEXT,
+            status INTEGER,
+            entity_id TEXT,
+            latency_ms REAL,
+            action TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_ts ON audit_logs(ts)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_actor ON audit_logs(actor, ts)",
+    ]),
+    (8, "search_indexes", [_search_indexes]),
+    (9, "change_feed", [
+        # AUTOINCREMENT: seq never goes backwards, even after old rows are pruned
+        """
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            ts REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+        )
+        """,
+        # Finds a row's latest change when coalescing deltas
+        "CREATE INDEX IF NOT EXISTS idx_changes_row ON changes(tbl, row_id, seq)",
+        _change_triggers,
+    ]),
+    (10, "appointment_archive", [
+        # Rows moved to the per-month archive files (archive.py), so totals can include them
+        "INSERT OR IGNORE INTO counters(name, value) VALUES ('appointment_archived', 0), ('appointments_archived', 0)",
+    ]),
+    (11, "report_rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS report_doctor_day (
+            day TEXT NOT NULL, doctor TEXT NOT NULL, status TEXT NOT NULL, n INTEGER NOT NULL,
+            PRIMARY KEY (day, doctor, status)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS report_slot_month (
+            month TEXT NOT NULL, doctor TEXT NOT NULL, time TEXT NOT NULL, status TEXT NOT NULL, n INTEGER NOT NULL,
+            PRIMARY KEY (month, doctor, time, status)
+        ) WITHOUT ROWID
+        """,
+        # Set by archive.py while it deletes rows it has just archived
+        "CREATE TABLE IF NOT EXISTS archive_state (id INTEGER PRIMARY KEY CHECK (id = 1), moving INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO archive_state (id, moving) VALUES (1, 0)",
+        lambda conn: _report_triggers(conn, V11_ROLLUPS),
+        # Archived months are added by `python reports.py --backfill`
+        lambda conn: rebuild_reports(conn, V11_ROLLUPS),
+    ]),
+    (12, "table_versions", [
+        "CREATE TABLE IF NOT EXISTS table_versions (tbl TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID",
+        # Random per database, so a fresh or replaced file never reuses an old ETag
+        "INSERT OR IGNORE INTO table_versions (tbl, version) VALUES ('epoch', abs(random()))",
+        _version_triggers,
+    ]),
+    (13, "dashboard_rollups", [
+        "CREATE TABLE IF NOT EXISTS report_status (status TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS report_patient (patient TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID",
+        _dashboard_rollups,
+    ]),
+    # Bumped by `reports.py --backfill`, which rewrites the rollups without touching appointments
+    (14, "report_version", [
+        "INSERT OR IGNORE INTO table_versions (tbl, version) VALUES ('report', 0)",
+    ]),
+]
+
+
+# --------------------------------------------------
+# RUNNER
+# --------------------------------------------------
+def current_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at REAL NOT NULL
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+
+def analyze(conn):
+    """ANALYZE every table except the FTS5 indexes and their shadow tables.
+
+    Stats taken while an index is near empty send FTS5's own segment lookups
+    into scans as it grows, turning each indexed insert into O(n) work.
+    """
+    search = tuple(fts for fts, _, _ in SEARCH_INDEXES.values())
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table in tables:
+        if not table.startswith(search + ("sqlite_",)):
+            conn.execute(f'ANALYZE "{table}"')
+
+
+def migrate(path=DB_NAME, verbose=False):
+    """Apply pending migrations in order, one transaction each; returns the versions applied"""
+    applied = []
+    with get_db(path) as conn:
+        for version, name, steps in MIGRATIONS:
+            conn.commit()
+            # IMMEDIATE takes the write lock so concurrent workers apply each version once
+            conn.execute("BEGIN IMMEDIATE")
+            if current_version(conn) >= version:
+                conn.commit()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, time.time())
+            )
+            conn.commit()
+            applied.append(version)
+            if verbose:
+                print(f"✅ Migration {version} {name}")
+        if applied:
+            analyze(conn)
+    return applied
+
+
+# Query shapes issued by each route, with representative parameters
+ROUTE_QUERIES = {
+    "GET /appointments": ("SELECT id, patient, doctor, date, time, status FROM appointments ORDER BY id DESC LIMIT ?", (101,)),
+    "GET /appointments?cursor=": ("SELECT id, patient, doctor, date, time, status FROM appointments WHERE id < ? ORDER BY id DESC LIMIT ?", (1000, 101)),
+    "GET /appointments?doctor=": ("SELECT id, patient, doctor, date, time, status FROM appointments WHERE doctor = ? AND id < ? ORDER BY id DESC LIMIT ?", ("Dr. Anita Rao", 1000, 101)),
+    "GET /appointments?date=": ("SELECT id, patient, doctor, date, time, status FROM appointments WHERE date = ? ORDER BY id DESC LIMIT ?", ("2026-01-01", 101)),
+    "GET /appointments?status=": ("SELECT id, patient, doctor, date, time, status FROM appointments WHERE status = ? ORDER BY id DESC LIMIT ?", ("Booked", 101)),
+    "GET /appointments?history=1": ("SELECT id, patient, doctor, date, time, status FROM appointments WHERE (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT ?", ("2026-01-01", 1000, 101)),
+    "archive batch": ("SELECT id, substr(date, 1, 7) FROM appointments WHERE date < ? ORDER BY date LIMIT ?", ("2025-01-01", 1000)),
+    "POST /delete_appointment": ("SELECT doctor, date, time, status FROM appointments WHERE id = ?", (1,)),
+    "scheduler warm-up": ("SELECT doctor, date, time FROM appointments WHERE status = ? AND date >= ?", ("Booked", "2026-01-01")),
+    "GET patients": ("SELECT * FROM patient ORDER BY pat_date DESC", ()),
+    "GET patient/<id>": ("SELECT * FROM patient WHERE pat_id = ?", (1,)),
+    "GET doctors": ("SELECT * FROM doctor ORDER BY doc_date DESC", ()),
+    "GET doctor/<id>": ("SELECT * FROM doctor WHERE doc_id = ?", (1,)),
+    "GET appointments (resource)": ("SELECT p.*, d.*, a.* FROM appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id LEFT JOIN doctor d ON a.doc_id = d.doc_id ORDER BY a.appointment_date DESC, a.app_id DESC LIMIT ?", (101,)),
+    "GET appointments (resource, cursor)": ("SELECT p.*, d.*, a.* FROM appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id LEFT JOIN doctor d ON a.doc_id = d.doc_id WHERE (a.appointment_date, a.app_id) < (?, ?) ORDER BY a.appointment_date DESC, a.app_id DESC LIMIT ?", ("2026-01-01", 10, 101)),
+    "GET appointment/<id>": ("SELECT * FROM appointment WHERE app_id = ?", (1,)),
+    "DELETE patient/<id> (FK check)": ("SELECT 1 FROM appointment WHERE pat_id = ?", (1,)),
+    "GET common": ("SELECT name, value FROM counters WHERE name IN ('patient', 'doctor', 'appointment', 'appointment_archived')", ()),
+    "GET patient/search": ("SELECT rowid FROM patient_fts WHERE patient_fts MATCH ? ORDER BY rank LIMIT ?", ('"jo"*', 21)),
+    "GET patient/search (broad)": ("SELECT rowid FROM patient_fts WHERE patient_fts MATCH ? ORDER BY rowid DESC LIMIT ?", ('"a"*', 21)),
+    "GET /changes?since=": ("SELECT c.seq, c.tbl, c.row_id, c.op FROM changes c WHERE c.seq > ? AND c.seq <= ? AND NOT EXISTS (SELECT 1 FROM changes l WHERE l.tbl = c.tbl AND l.row_id = c.row_id AND l.seq > c.seq AND l.seq <= ?) ORDER BY c.seq LIMIT ?", (1000, 2000, 2000, 500)),
+    "GET /reports/bookings": ("SELECT r.day, r.doctor, SUM(r.n) FROM report_doctor_day r WHERE r.day BETWEEN ? AND ? GROUP BY 1, 2", ("2026-01-01", "2026-01-31")),
+    "GET /reports/slots": ("SELECT r.doctor, r.time, SUM(r.n) FROM report_slot_month r WHERE r.month BETWEEN ? AND ? GROUP BY 1, 2", ("2026-01", "2026-01")),
+    "conditional GET (versions)": ("SELECT tbl, version FROM table_versions WHERE tbl IN (?, ?)", ("epoch", "appointments")),
+    "GET counts/day": ("SELECT day, n AS appointment FROM appointment_day_counts ORDER BY day DESC LIMIT ?", (30,)),
+}
+
+
+def explain(path=DB_NAME):
+    """EXPLAIN QUERY PLAN for every route query; flags plans that scan a whole table"""
+    report = {}
+    with get_db(path) as conn:
+        for route, (sql, params) in ROUTE_QUERIES.items():
+            plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            temp_sort = any("TEMP B-TREE" in p for p in plan)
+            # A rowid-order scan feeding LIMIT without a sort stops early
+            bounded = " LIMIT " in sql and not temp_sort
+            full_scan = any(p.startswith("SCAN") and "INDEX" not in p for p in plan) and not bounded
+            report[route] = {"plan": plan, "full_scan": full_scan, "temp_sort": temp_sort}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply HMS schema migrations")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--explain", action="store_true", help="print EXPLAIN QUERY PLAN for every route query")
+    parser.add_argument("--rebuild-search", action="store_true", help="re-index patients and doctors for search")
+    args = parser.parse_args(argv)
+
+    applied = migrate(args.db, verbose=True)
+    if not applied:
+        print("Schema up to date")
+    if args.rebuild_search:
+        started = time.perf_counter()
+        with get_db(args.db) as conn:
+            rebuild_search(conn)
+        print(f"✅ Search index rebuilt in {time.perf_counter() - started:.1f}s")
+    if args.explain:
+        print(json.dumps(explain(args.db), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+from flask_restful import Api
+
+from package.patient import Patients, Patient
+from package.doctor import Doctors, Doctor
+from package.appointment import Appointments, Appointment
+from package.search import PatientSearch, DoctorSearch
+from package.common import Common, DoctorAppointmentCounts, DailyAppointmentCounts, CounterCheck
+
+RESOURCES = (
+    (Patients, '/patient'),
+    (PatientSearch, '/patient/search'),
+    (Patient, '/patient/<int:id>'),
+    (Doctors, '/doctor'),
+    (DoctorSearch, '/doctor/search'),
+    (Doctor, '/doctor/<int:id>'),
+    (Appointments, '/appointment'),
+    (Appointment, '/appointment/<int:id>'),
+    (Common, '/common'),
+    (DoctorAppointmentCounts, '/common/doctors'),
+    (DailyAppointmentCounts, '/common/daily'),
+    (CounterCheck, '/common/check'),
+)
+
+
+def register(app, prefix='/api'):
+    """Mount the resources on a Flask app; the prefix keeps /doctor free for app.py"""
+    api = Api(app, prefix=prefix)
+    for resource, url in RESOURCES:
+        api.add_resource(resource, url)
+    return api
@@ -2,31 +2,96 @@
 #Python 2.7
 
 from flask_restful import Resource, Api, request
-from package.model import conn
+from package.model import connection, read_connection, json_object_sql, plain_rows, json_list, archiver
+from http_cache import versioned
+from admission import idempotent
+from database import encode_cursor, decode_cursor, page_limit
 
 
 
 class Appointments(Resource):
     """This contain apis to carry out activity with all appiontments"""
 
-    def get(self):
-        """Retrive all the appointment and return in form of json"""
-
-        appointment = conn.execute("SELECT p.*,d.*,a.* from appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id LEFT JOIN doctor d ON a.doc_id = d.doc_id ORDER BY appointment_date DESC").fetchall()
-        return appointment
+    method_decorators = {'get': [versioned('appointment', 'patient', 'doctor', connect=read_connection)]}
 
+    def get(self):
+        """Retrive a page of appointments, newest first, continuing after ?cursor="""
+
+        limit = page_limit(request.args.get('limit'))
+        try:
+            cursor = decode_cursor(request.args.get('cursor'), 2)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        where, params = '', []
+        if cursor:
+            where = 'WHERE (a.appointment_date, a.app_id) < (?, ?)'
+            params = list(cursor)
+        with read_connection() as conn:
+            row = json_object_sql(conn, ('p', 'patient'), ('d', 'doctor'), ('a', 'appointment'))
+
+            def query(schema):
+                return plain_rows(conn, "SELECT " + row + ", a.appointment_date, a.app_id from " + schema + ".appointment a LEFT JOIN patient p ON a.pat_id = p.pat_id LEFT JOIN doctor d ON a.doc_id = d.doc_id "
+                                  + where + " ORDER BY a.appointment_date DESC, a.app_id DESC LIMIT ?", params + [limit + 1])
+
+            if request.args.get('history') in ('1', 'true'):
+                # Archived months too, newest first, continuing from the same cursor
+                newest = str(cursor[0])[:7] if cursor else None
+                appointment = archiver.history(conn, query, lambda r: (r[1], r[2]), limit + 1, newest)
+            else:
+                appointment = query('main')
+        response = json_list(appointment[:limit])
+        if len(appointment) > limit:
+            last = appointment[limit - 1]
+            response.headers['X-Next-Cursor'] = encode_cursor(last[1], last[2])
+        return response
+
+    @idempotent
     def post(self):
         """Create the appoitment by assiciating patient and docter with appointment date"""
 
         appointment = request.get_json(force=True)
+        if isinstance(appointment, list):
+            return self.post_many(appointment)
         pat_id = appointment['pat_id']
         doc_id = appointment['doc_id']
         appointment_date = appointment['appointment_date']
-        appointment['app_id'] = conn.execute('''INSERT INTO appointment(pat_id,doc_id,appointment_date)
-            VALUES(?,?,?)''', (pat_id, doc_id,appointment_date)).lastrowid
-        conn.commit()
+        with connection() as conn:
+            appointment['app_id'] = conn.execute('''INSERT INTO appointment(pat_id,doc_id,appointment_date)
+                VALUES(?,?,?)''', (pat_id, doc_id,appointment_date)).lastrowid
         return appointment
 
+    def post_many(self, appointments):
+        """Create a list of appointments in one transaction, reporting bad rows instead of failing them all"""
+
+        rows = [a for a in appointments if isinstance(a, dict) and {'pat_id', 'doc_id', 'appointment_date'} <= set(a)]
+        with connection() as conn:
+            pat_ids = _existing(conn, 'patient', 'pat_id', {a['pat_id'] for a in rows})
+            doc_ids = _existing(conn, 'doctor', 'doc_id', {a['doc_id'] for a in rows})
+            valid = [a for a in rows if a['pat_id'] in pat_ids and a['doc_id'] in doc_ids]
+            for appointment in valid:
+                appointment['app_id'] = conn.execute('''INSERT INTO appointment(pat_id,doc_id,appointment_date)
+                    VALUES(?,?,?)''', (appointment['pat_id'], appointment['doc_id'], appointment['appointment_date'])).lastrowid
+        complete = {id(a) for a in rows}
+        for appointment in appointments:
+            if not isinstance(appointment, dict):
+                continue
+            if id(appointment) not in complete:
+                appointment['error'] = 'Missing fields'
+            elif 'app_id' not in appointment:
+                appointment['error'] = 'Unknown patient or doctor'
+        return appointments
+
+
+def _existing(conn, table, key, ids):
+    """Subset of ids present in table, looked up by primary key"""
+    ids = list(ids)
+    found = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        found.update(r[key] for r in conn.execute(
+            "SELECT %s FROM %s WHERE %s IN (%s)" % (key, table, key, ','.join('?' * len(chunk))), chunk))
+    return found
+
 
 
 class Appointment(Resource):
@@ -35,15 +100,16 @@ class Appointment(Resource):
     def get(self,id):
         """retrive a singe appointment details by its id"""
 
-        appointment = conn.execute("SELECT * FROM appointment WHERE app_id=?",(id,)).fetchall()
+        with read_connection() as conn:
+            appointment = conn.execute("SELECT * FROM appointment WHERE app_id=?",(id,)).fetchall()
         return appointment
 
 
     def delete(self,id):
         """Delete teh appointment by its id"""
 
-        conn.execute("DELETE FROM appointment WHERE app_id=?",(id,))
-        conn.commit()
+        with connection() as conn:
+            conn.execute("DELETE FROM appointment WHERE app_id=?",(id,))
         return {'msg': 'sucessfully deleted'}
 
     def put(self,id):
@@ -52,7 +118,7 @@ class Appointment(Resource):
         appointment = request.get_json(force=True)
         pat_id = appointment['pat_id']
         doc_id = appointment['doc_id']
-        conn.execute("UPDATE appointment SET pat_id=?,doc_id=? WHERE app_id=?",
-                     (pat_id, doc_id, id))
-        conn.commit()
+        with connection() as conn:
+            conn.execute("UPDATE appointment SET pat_id=?,doc_id=? WHERE app_id=?",
+                         (pat_id, doc_id, id))
         return appointment
\ No newline at end of file
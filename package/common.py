@@ -1,19 +1,63 @@
 #Tushar Borole
 #Python 2.7
 
+from flask import session
 from flask_restful import Resource, Api, request
-from package.model import conn
+from package.model import read_connection, verify_counters
+from http_cache import versioned
 
 
 class Common(Resource):
     """This contain common api ie noe related to the specific module"""
 
+    method_decorators = {'get': [versioned('patient', 'doctor', 'appointment', connect=read_connection)]}
+
+    def get(self):
+        """Retrive the patient,doctor and appointment count for the dashboard page, archived appointments included"""
+
+        with read_connection() as conn:
+            counters = conn.execute("SELECT name, value FROM counters WHERE name IN ('patient', 'doctor', 'appointment', 'appointment_archived')").fetchall()
+        counts = {c['name']: c['value'] for c in counters}
+        archived = counts.pop('appointment_archived', 0)
+        if 'appointment' in counts:
+            counts['appointment'] += archived
+        return counts
+
+
+class DoctorAppointmentCounts(Resource):
+    """Appointment count per doctor for the dashboard"""
+
     def get(self):
-        """Retrive the patient,doctor and appointment count for the dashboard page"""
-
-        getPatientCount=conn.execute("SELECT COUNT(*) AS patient FROM patient").fetchone()
-        getDoctorCount = conn.execute("SELECT COUNT(*) AS doctor FROM doctor").fetchone()
-        getAppointmentCount = conn.execute("SELECT COUNT(*) AS appointment FROM appointment").fetchone()
-        getPatientCount.update(getDoctorCount)
-        getPatientCount.update(getAppointmentCount)
-        return getPatientCount
\ No newline at end of file
+        """Retrive the materialized per doctor appointment counts"""
+
+        with read_connection() as conn:
+            return conn.execute("SELECT c.doc_id, d.doc_first_name, d.doc_last_name, c.n AS appointment FROM appointment_doctor_counts c LEFT JOIN doctor d ON d.doc_id = c.doc_id ORDER BY c.n DESC").fetchall()
+
+
+class DailyAppointmentCounts(Resource):
+    """Appointment count per day for the dashboard"""
+
+    def get(self):
+        """Retrive the materialized per day appointment counts, latest day first"""
+
+        limit = request.args.get('days', 30, type=int)
+        with read_connection() as conn:
+            return conn.execute("SELECT day, n AS appointment FROM appointment_day_counts ORDER BY day DESC LIMIT ?", (limit,)).fetchall()
+
+
+class CounterCheck(Resource):
+    """Consistency check for the materialized dashboard counters"""
+
+    def get(self):
+        """List counters that disagree with the base tables (admin sessions only, it scans every table)"""
+
+        if session.get('role') != 'admin':
+            return {'error': 'Unauthorized'}, 401
+        return verify_counters()
+
+    def post(self):
+        """Rebuild the counters if any disagree (admin sessions only)"""
+
+        if session.get('role') != 'admin':
+            return {'error': 'Unauthorized'}, 401
+        return {'rebuilt': verify_counters(repair=True)}
\ No newline at end of file
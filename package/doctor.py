@@ -2,15 +2,19 @@
 #Python 2.7
 
 from flask_restful import Resource, Api, request
-from package.model import conn
+from package.model import connection, read_connection, json_object_sql, plain_rows, json_list
+from http_cache import versioned
 class Doctors(Resource):
     """This contain apis to carry out activity with all doctors"""
 
+    method_decorators = {'get': [versioned('doctor', connect=read_connection)]}
+
     def get(self):
         """Retrive list of all the doctor"""
 
-        doctors = conn.execute("SELECT * FROM doctor ORDER BY doc_date DESC").fetchall()
-        return doctors
+        with read_connection() as conn:
+            doctors = plain_rows(conn, "SELECT %s FROM doctor d ORDER BY doc_date DESC" % json_object_sql(conn, ('d', 'doctor')))
+        return json_list(doctors)
 
 
 
@@ -22,9 +26,10 @@ class Doctors(Resource):
         doc_last_name = doctorInput['doc_last_name']
         doc_ph_no = doctorInput['doc_ph_no']
         doc_address = doctorInput['doc_address']
-        doctorInput['doc_id']=conn.execute('''INSERT INTO doctor(doc_first_name,doc_last_name,doc_ph_no,doc_address)
-            VALUES(?,?,?,?)''', (doc_first_name, doc_last_name,doc_ph_no,doc_address)).lastrowid
-        conn.commit()
+        doc_specialization = doctorInput.get('doc_specialization')
+        with connection() as conn:
+            doctorInput['doc_id']=conn.execute('''INSERT INTO doctor(doc_first_name,doc_last_name,doc_ph_no,doc_address,doc_specialization)
+                VALUES(?,?,?,?,?)''', (doc_first_name, doc_last_name,doc_ph_no,doc_address,doc_specialization)).lastrowid
         return doctorInput
 
 class Doctor(Resource):
@@ -34,14 +39,15 @@ class Doctor(Resource):
     def get(self,id):
         """get the details of the docktor by the doctor id"""
 
-        doctor = conn.execute("SELECT * FROM doctor WHERE doc_id=?",(id,)).fetchall()
+        with read_connection() as conn:
+            doctor = conn.execute("SELECT * FROM doctor WHERE doc_id=?",(id,)).fetchall()
         return doctor
 
     def delete(self, id):
         """Delete the doctor by its id"""
 
-        conn.execute("DELETE FROM doctor WHERE doc_id=?", (id,))
-        conn.commit()
+        with connection() as conn:
+            conn.execute("DELETE FROM doctor WHERE doc_id=?", (id,))
         return {'msg': 'sucessfully deleted'}
 
     def put(self,id):
@@ -52,8 +58,11 @@ class Doctor(Resource):
         doc_last_name = doctorInput['doc_last_name']
         doc_ph_no = doctorInput['doc_ph_no']
         doc_address = doctorInput['doc_address']
-        conn.execute(
-            "UPDATE doctor SET doc_first_name=?,doc_last_name=?,doc_ph_no=?,doc_address=? WHERE doc_id=?",
-            (doc_first_name, doc_last_name, doc_ph_no, doc_address, id))
-        conn.commit()
+        # Optional: left as it was when the client does not send it
+        doc_specialization = doctorInput.get('doc_specialization')
+        with connection() as conn:
+            conn.execute(
+                "UPDATE doctor SET doc_first_name=?,doc_last_name=?,doc_ph_no=?,doc_address=?,"
+                "doc_specialization=COALESCE(?,doc_specialization) WHERE doc_id=?",
+                (doc_first_name, doc_last_name, doc_ph_no, doc_address, doc_specialization, id))
         return doctorInput
\ No newline at end of file
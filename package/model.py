@@ -1,8 +1,12 @@
 #Tushar Borole
 #Python 2.7
 import os
-import sqlite3
 import json
+from flask import Response
+from database import get_write_db, get_read_db
+from lazy import Once
+from migrations import migrate, rebuild_counters
+from archive import Archive
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CONFIG_PATH = os.path.join(BASE_DIR, "HMS", "config.json")
 
@@ -10,9 +14,9 @@ with open(CONFIG_PATH) as data_file:
 
     config = json.load(data_file)
 
-conn=sqlite3.connect(config['database'], check_same_thread=False)
-conn.execute('pragma foreign_keys=ON')
-
+DATABASE = config['database']
+# Month files of appointments moved out by archive.py, read for ?history=1
+archiver = Archive(DATABASE)
 
 
 def dict_factory(cursor, row):
@@ -23,29 +27,76 @@ def dict_factory(cursor, row):
     return d
 
 
-conn.row_factory = dict_factory
-
-conn.execute('''CREATE TABLE if not exists patient
-(pat_id INTEGER PRIMARY KEY AUTOINCREMENT,
-pat_first_name TEXT NOT NULL,
-pat_last_name TEXT NOT NULL,
-pat_insurance_no TEXT NOT NULL,
-pat_ph_no TEXT NOT NULL,
-pat_date DATE DEFAULT (datetime('now','localtime')),
-pat_address TEXT NOT NULL);''')
-
-conn.execute('''CREATE TABLE if not exists doctor
-(doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
-doc_first_name TEXT NOT NULL,
-doc_last_name TEXT NOT NULL,
-doc_ph_no TEXT NOT NULL,
-doc_date DATE DEFAULT (datetime('now','localtime')),
-doc_address TEXT NOT NULL);''')
-
-conn.execute('''CREATE TABLE if not exists appointment
-(app_id INTEGER PRIMARY KEY AUTOINCREMENT,
-pat_id INTEGER NOT NULL,
-doc_id INTEGER NOT NULL,
-appointment_date DATE NOT NULL,
-FOREIGN KEY(pat_id) REFERENCES patient(pat_id),
-FOREIGN KEY(doc_id) REFERENCES doctor(doc_id));''')
\ No newline at end of file
+def connection():
+    """Borrow a pooled connection to the resource database with json friendly rows, for writes"""
+    ensure_schema()
+    return get_write_db(DATABASE, row_factory=dict_factory)
+
+
+def read_connection():
+    """Like connection(), from the read-only pool; GET handlers read through this"""
+    ensure_schema()
+    return get_read_db(DATABASE, row_factory=dict_factory)
+
+
+_json_objects = {}
+
+
+def json_object_sql(conn, *tables):
+    """SQL json_object(...) expression giving the same keys, order and values dict_factory would
+    for SELECT alias1.*, alias2.*, ... ; tables are (alias, table) pairs. Duplicate column names
+    keep their first position and the last table's value, exactly like the dict it replaces."""
+    key = tables
+    if key not in _json_objects:
+        columns = {}
+        for alias, table in tables:
+            for col in conn.execute("PRAGMA table_info(%s)" % table).fetchall():
+                columns[col['name']] = '%s.%s' % (alias, col['name'])
+        _json_objects[key] = 'json_object(%s)' % ', '.join("'%s', %s" % item for item in columns.items())
+    return _json_objects[key]
+
+
+def plain_rows(conn, sql, params=()):
+    """Run a query returning bare tuples, skipping dict_factory"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(sql, params).fetchall()
+
+
+def json_list(rows):
+    """Flask response for rows whose first column is an already serialized json object"""
+    return Response('[' + ','.join([r[0] for r in rows]) + ']', mimetype='application/json')
+
+
+def verify_counters(repair=False):
+    """Compare the materialized counters with real counts; returns the mismatches and optionally rebuilds"""
+    with connection() as conn:
+        mismatches = conn.execute('''
+        SELECT c.name AS counter, c.value AS stored,
+            CASE c.name WHEN 'patient' THEN (SELECT COUNT(*) FROM patient)
+                        WHEN 'doctor' THEN (SELECT COUNT(*) FROM doctor)
+                        ELSE (SELECT COUNT(*) FROM appointment) END AS actual
+        FROM counters c WHERE c.name IN ('patient', 'doctor', 'appointment')
+        UNION ALL
+        SELECT 'doctor:' || doc_id, stored, actual FROM (
+            SELECT a.doc_id, c.n AS stored, COUNT(*) AS actual FROM appointment a
+            LEFT JOIN appointment_doctor_counts c ON c.doc_id = a.doc_id GROUP BY a.doc_id
+            UNION ALL
+            SELECT c.doc_id, c.n, 0 FROM appointment_doctor_counts c
+            WHERE NOT EXISTS (SELECT 1 FROM appointment a WHERE a.doc_id = c.doc_id))
+        UNION ALL
+        SELECT 'day:' || day, stored, actual FROM (
+            SELECT substr(a.appointment_date, 1, 10) AS day, c.n AS stored, COUNT(*) AS actual FROM appointment a
+            LEFT JOIN appointment_day_counts c ON c.day = substr(a.appointment_date, 1, 10) GROUP BY 1
+            UNION ALL
+            SELECT c.day, c.n, 0 FROM appointment_day_counts c
+            WHERE NOT EXISTS (SELECT 1 FROM appointment a WHERE substr(a.appointment_date, 1, 10) = c.day))
+        ''').fetchall()
+        mismatches = [m for m in mismatches if m['stored'] != m['actual']]
+        if mismatches and repair:
+            rebuild_counters(conn)
+    return mismatches
+
+
+# Schema check on the first connection() instead of at import
+ensure_schema = Once(lambda: migrate(DATABASE))
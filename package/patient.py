@@ -2,7 +2,8 @@
 #Python 2.7
 
 from flask_restful import Resource, Api, request
-from package.model import conn
+from package.model import connection, read_connection, json_object_sql, plain_rows, json_list
+from http_cache import versioned
 
 
 
@@ -10,11 +11,14 @@ from package.model import conn
 class Patients(Resource):
     """It contain all the api carryign the activity with aand specific patient"""
 
+    method_decorators = {'get': [versioned('patient', connect=read_connection)]}
+
     def get(self):
         """Api to retive all the patient from the database"""
 
-        patients = conn.execute("SELECT * FROM patient  ORDER BY pat_date DESC").fetchall()
-        return patients
+        with read_connection() as conn:
+            patients = plain_rows(conn, "SELECT %s FROM patient p ORDER BY pat_date DESC" % json_object_sql(conn, ('p', 'patient')))
+        return json_list(patients)
 
 
 
@@ -27,9 +31,9 @@ class Patients(Resource):
         pat_insurance_no = patientInput['pat_insurance_no']
         pat_ph_no = patientInput['pat_ph_no']
         pat_address = patientInput['pat_address']
-        patientInput['pat_id']=conn.execute('''INSERT INTO patient(pat_first_name,pat_last_name,pat_insurance_no,pat_ph_no,pat_address)
-            VALUES(?,?,?,?,?)''', (pat_first_name, pat_last_name, pat_insurance_no,pat_ph_no,pat_address)).lastrowid
-        conn.commit()
+        with connection() as conn:
+            patientInput['pat_id']=conn.execute('''INSERT INTO patient(pat_first_name,pat_last_name,pat_insurance_no,pat_ph_no,pat_address)
+                VALUES(?,?,?,?,?)''', (pat_first_name, pat_last_name, pat_insurance_no,pat_ph_no,pat_address)).lastrowid
         return patientInput
 
 class Patient(Resource):
@@ -38,14 +42,15 @@ class Patient(Resource):
     def get(self,id):
         """api to retrive details of the patient by it id"""
 
-        patient = conn.execute("SELECT * FROM patient WHERE pat_id=?",(id,)).fetchall()
+        with read_connection() as conn:
+            patient = conn.execute("SELECT * FROM patient WHERE pat_id=?",(id,)).fetchall()
         return patient
 
     def delete(self,id):
         """api to delete the patiend by its id"""
 
-        conn.execute("DELETE FROM patient WHERE pat_id=?",(id,))
-        conn.commit()
+        with connection() as conn:
+            conn.execute("DELETE FROM patient WHERE pat_id=?",(id,))
         return {'msg': 'sucessfully deleted'}
 
     def put(self,id):
@@ -57,7 +62,7 @@ class Patient(Resource):
         pat_insurance_no = patientInput['pat_insurance_no']
         pat_ph_no = patientInput['pat_ph_no']
         pat_address = patientInput['pat_address']
-        conn.execute("UPDATE patient SET pat_first_name=?,pat_last_name=?,pat_insurance_no=?,pat_ph_no=?,pat_address=? WHERE pat_id=?",
-                     (pat_first_name, pat_last_name, pat_insurance_no,pat_ph_no,pat_address,id))
-        conn.commit()
+        with connection() as conn:
+            conn.execute("UPDATE patient SET pat_first_name=?,pat_last_name=?,pat_insurance_no=?,pat_ph_no=?,pat_address=? WHERE pat_id=?",
+                         (pat_first_name, pat_last_name, pat_insurance_no,pat_ph_no,pat_address,id))
         return patientInput
\ No newline at end of file
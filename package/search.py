@@ -0,0 +1,89 @@
+import os
+import re
+
+from flask_restful import Resource, request
+from package.model import read_connection, json_object_sql, plain_rows, json_list
+from database import encode_cursor, decode_cursor, page_limit
+from migrations import SEARCH_INDEXES, NUMBER_PUNCTUATION
+
+# bm25 ordering only while a query matches at most this many rows; broader
+# prefixes ("a", "jo") page newest first instead of sorting every match
+RANK_LIMIT = int(os.getenv("SEARCH_RANK_LIMIT", "2000"))
+
+_WORD = re.compile(r"\w+")
+_PUNCTUATION = re.compile("[%s]" % re.escape("".join(NUMBER_PUNCTUATION)))
+_NUMBER = re.compile(r"^[\d%s]+$" % re.escape("".join(NUMBER_PUNCTUATION)))
+
+
+def match_query(text):
+    """FTS5 MATCH expression where every word of text is a prefix; None when there is nothing to search"""
+    if _NUMBER.match(text) and any(ch.isdigit() for ch in text):
+        # A phone or insurance number typed with spaces is still one number
+        text = _PUNCTUATION.sub("", text)
+    words = []
+    for chunk in text.split():
+        if any(ch.isdigit() for ch in chunk):
+            # Numbers are indexed without punctuation, search them the same way
+            chunk = _PUNCTUATION.sub("", chunk)
+        words.extend(_WORD.findall(chunk))
+    if not words:
+        return None
+    return " ".join('"%s"*' % word for word in words)
+
+
+def search(table, text, limit, cursor=None):
+    """Flask response with a page of table rows matching text and an X-Next-Cursor header"""
+    fts, key, _ = SEARCH_INDEXES[table]
+    query = match_query(text)
+    if query is None:
+        return json_list([])
+    with read_connection() as conn:
+        row = json_object_sql(conn, ('t', table))
+        if cursor is None:
+            matches = plain_rows(conn, "SELECT count(*) FROM (SELECT 1 FROM %s WHERE %s MATCH ? LIMIT ?)" % (fts, fts),
+                                 (query, RANK_LIMIT + 1))[0][0]
+            cursor = ['rank', 0] if matches <= RANK_LIMIT else ['recent', None]
+        order, position = cursor
+        if order == 'rank':
+            rows = plain_rows(conn, "SELECT " + row + " FROM (SELECT rowid AS id, rank FROM " + fts + " WHERE " + fts
+                              + " MATCH ? ORDER BY rank LIMIT ? OFFSET ?) m JOIN " + table + " t ON t." + key
+                              + " = m.id ORDER BY m.rank, m.id", (query, limit + 1, position))
+            following = encode_cursor('rank', position + limit)
+        else:
+            before = 'AND rowid < ? ' if position is not None else ''
+            params = [query] + ([position] if position is not None else []) + [limit + 1]
+            rows = plain_rows(conn, "SELECT " + row + ", m.id FROM (SELECT rowid AS id FROM " + fts + " WHERE " + fts
+                              + " MATCH ? " + before + "ORDER BY rowid DESC LIMIT ?) m JOIN " + table + " t ON t." + key
+                              + " = m.id ORDER BY m.id DESC", params)
+            following = encode_cursor('recent', rows[limit - 1][1]) if len(rows) > limit else None
+    response = json_list(rows[:limit])
+    response.headers['X-Search-Order'] = order
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = following
+    return response
+
+
+def _cursor():
+    cursor = decode_cursor(request.args.get('cursor'))
+    if isinstance(cursor, list) and len(cursor) == 2 and isinstance(cursor[1], int) \
+            and cursor[0] in ('rank', 'recent'):
+        return cursor
+    return None
+
+
+class PatientSearch(Resource):
+    """Typeahead search over patient names, phone and insurance numbers"""
+
+    def get(self):
+        """Patients matching every word of ?q= as a prefix, best match first when few rows match"""
+
+        return search('patient', request.args.get('q', ''), page_limit(request.args.get('limit'), default=20), _cursor())
+
+
+class DoctorSearch(Resource):
+    """Typeahead search over doctor names, phone numbers and specializations"""
+
+    def get(self):
+        """Doctors matching every word of ?q= as a prefix, best match first when few rows match"""
+
+        return search('doctor', request.args.get('q', ''), page_limit(request.args.get('limit'), default=20), _cursor())
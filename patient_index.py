@@ -0,0 +1,162 @@
+import os
+import time
+
+from database import get_db, DB_NAME
+
+RESOLVE_CHUNK = 500
+
+
+def normalize_name(name):
+    return " ".join(name.split()).casefold()
+
+
+class PatientIndex:
+    """Local SQLite copy of the Firestore `patients` collection.
+
+    Keyed by Firestore document id and by normalized name so booking can
+    resolve a patient without a remote query.
+    """
+
+    def __init__(self, db=None, path=DB_NAME, listen=True):
+        self.db = db
+        self.path = path
+        self.listen = listen
+        self._watching = None     # pid that owns the listener; none survives fork
+        self.local_hits = 0
+        self.remote_fallbacks = 0
+
+    def init_schema(self):
+        with get_db(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS patient_index (
+                    doc_id TEXT PRIMARY KEY,
+                    name_key TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    email TEXT,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_patient_index_name ON patient_index(name_key)")
+
+    # --------------------------------------------------
+    # WRITES
+    # --------------------------------------------------
+    def upsert(self, doc_id, name, email):
+        self.upsert_many([(doc_id, name, email)])
+
+    def upsert_many(self, patients):
+        now = time.time()
+        with get_db(self.path) as conn:
+            conn.executemany("""
+                INSERT INTO patient_index (doc_id, name_key, name, email, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(doc_id) DO UPDATE SET
+                    name_key = excluded.name_key,
+                    name = excluded.name,
+                    email = excluded.email,
+                    updated_at = excluded.updated_at
+            """, [(doc_id, normalize_name(name), name, email, now) for doc_id, name, email in patients])
+
+    def remove(self, doc_id):
+        with get_db(self.path) as conn:
+            conn.execute("DELETE FROM patient_index WHERE doc_id = ?", (doc_id,))
+
+    # --------------------------------------------------
+    # FIRESTORE SYNC
+    # --------------------------------------------------
+    def _on_snapshot(self, docs, changes, read_time):
+        upserts = []
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                self.remove(doc.id)
+                continue
+            d = doc.to_dict()
+            if d.get("name"):
+                upserts.append((doc.id, d["name"], d.get("email")))
+        if upserts:
+            self.upsert_many(upserts)
+
+    def start_sync(self):
+        """Mirror the patients collection; the first snapshot backfills everything"""
+        if self._watching == os.getpid() or self.db is None or not self.listen:
+            return
+        self._watching = os.getpid()
+        try:
+            self.db.collection("patients").on_snapshot(self._on_snapshot)
+        except Exception as e:
+            print("⚠️ Patient sync not started:", e)
+
+    def backfill(self):
+        rows = []
+        for doc in self.db.collection("patients").stream():
+            d = doc.to_dict()
+            if d.get("name"):
+                rows.append((doc.id, d["name"], d.get("email")))
+        self.upsert_many(rows)
+        return len(rows)
+
+    # --------------------------------------------------
+    # LOOKUPS
+    # --------------------------------------------------
+    def get(self, doc_id):
+        with get_db(self.path) as conn:
+            row = conn.execute(
+                "SELECT doc_id, name, email FROM patient_index WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def lookup(self, name):
+        """Local-only lookup; counts a hit when found"""
+        self.start_sync()
+        with get_db(self.path) as conn:
+            row = conn.execute("""
+                SELECT doc_id, name, email FROM patient_index
+                WHERE name_key = ? ORDER BY rowid LIMIT 1
+            """, (normalize_name(name),)).fetchone()
+        if row:
+            self.local_hits += 1
+            return dict(row)
+        return None
+
+    def resolve(self, name):
+        """Patient dict for a name, falling back to Firestore on a local miss"""
+        found = self.lookup(name)
+        if found:
+            return found
+
+        if self.db is None:
+            return None
+        self.remote_fallbacks += 1
+        for doc in self.db.collection("patients").where("name", "==", name).stream():
+            d = doc.to_dict()
+            self.upsert(doc.id, d.get("name", name), d.get("email"))
+            return {"doc_id": doc.id, "name": d.get("name", name), "email": d.get("email")}
+        return None
+
+    def resolve_many(self, names):
+        """Batch resolve for bulk imports: {name: patient dict or None}, local only"""
+        keys = {name: normalize_name(name) for name in names}
+        found = {}
+        unique = list(set(keys.values()))
+        with get_db(self.path) as conn:
+            for i in range(0, len(unique), RESOLVE_CHUNK):
+                chunk = unique[i:i + RESOLVE_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                # Iterate newest first so the oldest row per name wins, like resolve()
+                for row in conn.execute(f"""
+                    SELECT doc_id, name_key, name, email FROM patient_index
+                    WHERE name_key IN ({marks}) ORDER BY rowid DESC
+                """, chunk):
+                    found[row["name_key"]] = {"doc_id": row["doc_id"], "name": row["name"], "email": row["email"]}
+        return {name: found.get(key) for name, key in keys.items()}
+
+    def stats(self):
+        with get_db(self.path) as conn:
+            size = conn.execute("SELECT COUNT(*) FROM patient_index").fetchone()[0]
+        return {
+            "size": size,
+            "local_hits": self.local_hits,
+            "remote_fallbacks": self.remote_fallbacks,
+            "syncing": self._watching == os.getpid(),
+        }
@@ -0,0 +1,192 @@
+import argparse
+import datetime
+import json
+import os
+import time
+from collections import Counter
+
+from archive import Archive
+from database import get_db, DB_NAME
+from migrations import REPORT_ROLLUPS, rollup_select
+
+REPORT_DEFAULT_DAYS = int(os.getenv("REPORT_DEFAULT_DAYS", "30"))
+# Backfill passes to try when the archiver moves rows while the archives are read
+REPORT_BACKFILL_ATTEMPTS = int(os.getenv("REPORT_BACKFILL_ATTEMPTS", "5"))
+# Status values counted as cancellations / no-shows (case-insensitive)
+CANCELLED_STATUSES = tuple(s.strip().lower() for s in os.getenv(
+    "REPORT_CANCELLED_STATUSES", "Cancelled,Canceled").split(",") if s.strip())
+NO_SHOW_STATUSES = tuple(s.strip().lower() for s in os.getenv(
+    "REPORT_NO_SHOW_STATUSES", "No-show,No show,Noshow,Missed").split(",") if s.strip())
+
+PERIODS = {
+    "day": "r.day",
+    # Monday of the week
+    "week": "date(r.day, 'weekday 0', '-6 days')",
+    "month": "substr(r.day, 1, 7)",
+}
+
+# One specialization per doctor name; the doctors table does not enforce unique names
+DOCTOR_SPECIALIZATION = """
+    LEFT JOIN (SELECT name, MAX(specialization) AS specialization FROM doctors GROUP BY name) s
+    ON s.name = r.doctor
+"""
+
+
+def _marks(values):
+    return ", ".join("?" * len(values))
+
+
+def _share(part, total):
+    return round(part / total, 4) if total else 0.0
+
+
+class Reports:
+    """Utilization reports read from the rollups the appointments triggers keep.
+
+    report_doctor_day holds bookings per (day, doctor, status) and
+    report_slot_month per (month, doctor, time, status), so a report
+    sums a few thousand rollup rows instead of scanning appointments.
+    """
+
+    def __init__(self, path=DB_NAME, archive=None):
+        self.path = path
+        self.archive = archive or Archive(path)
+
+    def _counts(self):
+        """SQL for (bookings, cancelled, no_show) summed over rollup rows `r`"""
+        return (f"SUM(r.n), "
+                f"SUM(CASE WHEN lower(r.status) IN ({_marks(CANCELLED_STATUSES)}) THEN r.n ELSE 0 END), "
+                f"SUM(CASE WHEN lower(r.status) IN ({_marks(NO_SHOW_STATUSES)}) THEN r.n ELSE 0 END)",
+                list(CANCELLED_STATUSES) + list(NO_SHOW_STATUSES))
+
+    # --------------------------------------------------
+    # REPORTS
+    # --------------------------------------------------
+    def bookings(self, start, end, period="day", doctor=None):
+        """Bookings per doctor per day/week/month between start and end (ISO dates, inclusive)"""
+        bucket = PERIODS[period]
+        counts, params = self._counts()
+        where = "r.day BETWEEN ? AND ?" + (" AND r.doctor = ?" if doctor else "")
+        params += [start, end] + ([doctor] if doctor else [])
+        with get_db(self.path) as conn:
+            rows = conn.execute(f"""
+                SELECT {bucket} AS period, r.doctor, {counts} FROM report_doctor_day r
+                WHERE {where} GROUP BY 1, 2 ORDER BY 1, 2
+            """, params).fetchall()
+        return [{"period": p, "doctor": d, "bookings": n, "cancelled": c, "no_show": x} for p, d, n, c, x in rows]
+
+    def rates(self, start, end, by="doctor"):
+        """Cancellation and no-show rates per doctor or per specialization"""
+        group = "r.doctor" if by == "doctor" else "COALESCE(s.specialization, '')"
+        join = "" if by == "doctor" else DOCTOR_SPECIALIZATION
+        counts, params = self._counts()
+        with get_db(self.path) as conn:
+            rows = conn.execute(f"""
+                SELECT {group}, {counts} FROM report_doctor_day r {join}
+                WHERE r.day BETWEEN ? AND ? GROUP BY 1 ORDER BY 2 DESC
+            """, params + [start, end]).fetchall()
+        return [{by: key, "bookings": n, "cancelled": c, "no_show": x,
+                 "cancellation_rate": _share(c, n), "no_show_rate": _share(x, n)}
+                for key, n, c, x in rows]
+
+    def busiest_slots(self, start, end, specialization=None, top=5):
+        """The top slots by kept bookings per specialization, for the months start..end touch"""
+        where, params = "", [start[:7], end[:7]] + list(CANCELLED_STATUSES)
+        if specialization:
+            where = "AND s.specialization = ? COLLATE NOCASE"
+            params.append(specialization)
+        with get_db(self.path) as conn:
+            rows = conn.execute(f"""
+                SELECT specialization, time, bookings FROM (
+                    SELECT COALESCE(s.specialization, '') AS specialization, r.time, SUM(r.n) AS bookings,
+                           ROW_NUMBER() OVER (PARTITION BY COALESCE(s.specialization, '')
+                                              ORDER BY SUM(r.n) DESC, r.time) AS rank
+                    FROM report_slot_month r {DOCTOR_SPECIALIZATION}
+                    WHERE r.month BETWEEN ? AND ? AND lower(r.status) NOT IN ({_marks(CANCELLED_STATUSES)}) {where}
+                    GROUP BY 1, 2)
+                WHERE rank <= ? ORDER BY specialization, rank
+            """, params + [top]).fetchall()
+        return [{"specialization": sp, "time": t, "bookings": n} for sp, t, n in rows]
+
+    # --------------------------------------------------
+    # BACKFILL
+    # --------------------------------------------------
+    def backfill(self):
+        """Rebuild every rollup from the hot table and the archived months.
+
+        Each source is aggregated by one GROUP BY pass; the results are summed
+        here and written in one transaction that also holds the write lock
+        while the hot table is read. An archive month cannot be detached inside
+        that transaction, so the months are read first and the pass starts over
+        if the archiver moved rows in between (its counter changed): no booking
+        is counted twice or missed.
+        """
+        for _ in range(REPORT_BACKFILL_ATTEMPTS):
+            rows = self._backfill_pass()
+            if rows is not None:
+                return rows
+        raise RuntimeError(f"Archiver kept moving rows during {REPORT_BACKFILL_ATTEMPTS} backfill passes")
+
+    def _backfill_pass(self):
+        """One backfill attempt; None when rows were archived while it ran"""
+        totals = {table: Counter() for table in REPORT_ROLLUPS}
+
+        def aggregate(conn, schema):
+            for table in REPORT_ROLLUPS:
+                for row in conn.execute(rollup_select(table, schema)):
+                    totals[table][tuple(row[:-1])] += row[-1]
+
+        def archived(conn):
+            return conn.execute("SELECT value FROM counters WHERE name = 'appointments_archived'").fetchone()
+
+        with get_db(self.path) as conn:
+            before = archived(conn)
+            for month in self.archive.months():
+                with self.archive.attached(conn, month) as schema:
+                    if conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'appointments'").fetchone():
+                        aggregate(conn, schema)
+            conn.execute("BEGIN IMMEDIATE")
+            if archived(conn) != before:
+                conn.rollback()
+                return None
+            aggregate(conn, "main")
+            for table, columns in REPORT_ROLLUPS.items():
+                conn.execute(f"DELETE FROM {table}")
+                conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}, n) VALUES ({_marks(columns)}, ?)",
+                                 [key + (n,) for key, n in totals[table].items()])
+            # Report ETags (http_cache.versioned) cover this; the appointments version does not move
+            conn.execute("UPDATE table_versions SET version = version + 1 WHERE tbl = 'report'")
+        return {table: len(rows) for table, rows in totals.items()}
+
+def parse_range(start, end, default_days=REPORT_DEFAULT_DAYS):
+    """?from=&to= as ISO dates, the last default_days by default; ValueError when malformed"""
+    end = datetime.date.fromisoformat(end) if end else datetime.date.today()
+    start = datetime.date.fromisoformat(start) if start else end - datetime.timedelta(days=default_days - 1)
+    if start > end:
+        raise ValueError("from is after to")
+    return start.isoformat(), end.isoformat()
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+if __name__ == "__main__":
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Rebuild or query the appointment report rollups")
+    parser.add_argument("db", nargs="?", default=DB_NAME)
+    parser.add_argument("--backfill", action="store_true", help="rebuild the rollups, archived months included")
+    parser.add_argument("--from", dest="start")
+    parser.add_argument("--to", dest="end")
+    args = parser.parse_args()
+
+    migrate(args.db)
+    reports = Reports(args.db)
+    if args.backfill:
+        started = time.perf_counter()
+        rows = reports.backfill()
+        print(f"✅ Report rollups rebuilt ({rows}) in {time.perf_counter() - started:.2f}s")
+    else:
+        start, end = parse_range(args.start, args.end)
+        print(json.dumps({"rates": reports.rates(start, end, "specialization"),
+                          "busiest_slots": reports.busiest_slots(start, end)}, indent=2))
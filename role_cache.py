@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+from cache import SingleFlight, make_cache
+
+ROLE_CACHE_TTL = float(os.getenv("ROLE_CACHE_TTL", "300"))
+ROLE_CACHE_NEGATIVE_TTL = float(os.getenv("ROLE_CACHE_NEGATIVE_TTL", "30"))
+ROLE_CACHE_SIZE = int(os.getenv("ROLE_CACHE_SIZE", "10000"))
+
+# Lookup outcomes
+FOUND = "found"
+NO_USER = "no_user"
+NO_ROLE = "no_role"
+
+
+class RoleCache:
+    """Email -> (outcome, role) cache in front of the Firebase Auth + Firestore lookup.
+
+    `lookup(email)` returns (FOUND, role), (NO_USER, None) or (NO_ROLE, None);
+    negative outcomes are kept for a shorter TTL, exceptions are not cached.
+    Concurrent misses for the same email share one lookup, and a lookup
+    that started before invalidate() (e.g. a /signup) is not stored.
+    """
+
+    def __init__(self, lookup, ttl=ROLE_CACHE_TTL, negative_ttl=ROLE_CACHE_NEGATIVE_TTL, maxsize=ROLE_CACHE_SIZE):
+        self.lookup = lookup
+        self.negative_ttl = negative_ttl
+        # Shared by every worker: one lookup per email, not one per process
+        self.cache = make_cache("roles", ttl=ttl, maxsize=maxsize)
+        # key -> time of its last invalidate(), seen by every worker like the cache
+        self.invalidated = make_cache("role_invalidations", ttl=ttl, maxsize=maxsize)
+        self.flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.latency = {"hit": [0, 0.0, 0.0], "miss": [0, 0.0, 0.0]}
+
+    @staticmethod
+    def key(email):
+        return (email or "").strip().casefold()
+
+    def _load(self, key, email):
+        started = time.time()
+        return self.store(key, self.lookup(email), started)
+
+    def store(self, key, result, started=None):
+        """Cache a lookup result, unless the email was invalidated after the lookup `started`"""
+        if started is not None and self.invalidated.peek(key, 0) >= started:
+            return result
+        ttl = None if result[0] == FOUND else self.negative_ttl
+        self.cache.set(key, result, ttl=ttl)
+        return result
+
+    def get(self, email):
+        started = time.perf_counter()
+        key = self.key(email)
+        result = self.cache.get(key)
+        kind = "hit"
+        if result is None:
+            kind = "miss"
+            result = self.flight.do(key, lambda: self._load(key, email))
+        self.observe(kind, time.perf_counter() - started)
+        return result
+
+    def observe(self, kind, seconds):
+        with self._lock:
+            stat = self.latency[kind]
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+
+    def invalidate(self, email):
+        key = self.key(email)
+        self.invalidated.set(key, time.time())
+        self.cache.delete(key)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["coalesced"] = self.flight.coalesced
+        with self._lock:
+            for kind, (count, total, worst) in self.latency.items():
+                stats[f"login_{kind}"] = {
+                    "count": count,
+                    "avg_ms": round(total / count * 1000, 3) if count else None,
+                    "max_ms": round(worst * 1000, 3),
+                }
+        return stats
@@ -0,0 +1,203 @@
+import datetime
+import re
+import sqlite3
+import threading
+import time
+
+from database import get_db, DB_NAME
+
+ACTIVE_STATUS = "Booked"
+SEARCH_HORIZON_DAYS = 60
+
+
+_SLOT = re.compile(r"(\d{1,2}):(\d{2})")
+_reported = set()
+
+
+def _slot(part):
+    """'9:30' -> '09:30'; None when part is not a valid H:MM time"""
+    match = _SLOT.fullmatch(part.strip()) if isinstance(part, str) else None
+    if not match or int(match[1]) > 23 or int(match[2]) > 59:
+        return None
+    return f"{int(match[1]):02d}:{match[2]}"
+
+
+def parse_slots(slots):
+    """'10:00, 9:30' -> ['09:30', '10:00']; parts that are not H:MM are skipped"""
+    parsed = set()
+    for part in (slots if isinstance(slots, str) else "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        slot = _slot(part)
+        if slot is None:
+            # One bad doctor row must not take booking down; say so once per value
+            if part not in _reported:
+                _reported.add(part)
+                print(f"⚠️ Skipping unparseable slot {part!r}")
+            continue
+        parsed.add(slot)
+    return sorted(parsed)
+
+
+def normalize_time(value):
+    """'9:30' -> '09:30'; anything else is returned as given (and matches no slot)"""
+    return _slot(value) or value
+
+
+class SlotConflict(Exception):
+    pass
+
+
+class InvalidSlot(Exception):
+    pass
+
+
+class Scheduler:
+    """In-memory availability index over doctor slots.
+
+    Each doctor's slots map to bit positions; each (doctor, date) holds an
+    int bitmap of booked slots. The partial UNIQUE index on appointments is
+    the source of truth, the bitmaps only answer queries and fast-reject.
+    """
+
+    def __init__(self, path=DB_NAME, refresh_interval=60):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self.doctors = {}         # name -> {"specialization", "slots", "bits"}
+        self.by_specialization = {}
+        self.booked = {}          # (doctor, date) -> bitmap
+
+    def init_schema(self):
+        with get_db(self.path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS doctors (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT,
+                    specialization TEXT,
+                    slots TEXT
+                )
+            """)
+            try:
+                conn.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS uq_appointments_slot
+                    ON appointments(doctor, date, time) WHERE status = 'Booked'
+                """)
+            except sqlite3.IntegrityError:
+                print("⚠️ Double bookings exist; slot uniqueness not enforced until resolved")
+
+    # --------------------------------------------------
+    # INDEX MAINTENANCE
+    # --------------------------------------------------
+    def load(self):
+        doctors, by_spec, booked = {}, {}, {}
+        today = datetime.date.today().isoformat()
+        with get_db(self.path) as conn:
+            for row in conn.execute("SELECT name, specialization, slots FROM doctors"):
+                slots = parse_slots(row["slots"])
+                if not row["name"] or not slots:
+                    continue
+                doctors[row["name"]] = {
+                    "specialization": row["specialization"],
+                    "slots": slots,
+                    "bits": {t: 1 << i for i, t in enumerate(slots)},
+                }
+                by_spec.setdefault((row["specialization"] or "").casefold(), []).append(row["name"])
+            for row in conn.execute("""
+                SELECT doctor, date, time FROM appointments
+                WHERE status = ? AND date >= ?
+            """, (ACTIVE_STATUS, today)):
+                bit = doctors.get(row["doctor"], {}).get("bits", {}).get(normalize_time(row["time"]))
+                if bit:
+                    key = (row["doctor"], row["date"])
+                    booked[key] = booked.get(key, 0) | bit
+
+        with self._lock:
+            self.doctors, self.by_specialization, self.booked = doctors, by_spec, booked
+            self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        if time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.load()
+
+    def _bit(self, doctor, slot):
+        info = self.doctors.get(doctor)
+        if info is None:
+            return None
+        bit = info["bits"].get(normalize_time(slot))
+        if bit is None:
+            raise InvalidSlot(f"{doctor} has no {slot} slot")
+        return bit
+
+    def check(self, doctor, date, slot):
+        """Fast local reject; raises InvalidSlot or SlotConflict"""
+        self._ensure_fresh()
+        with self._lock:
+            bit = self._bit(doctor, slot)
+            if not (bit and self.booked.get((doctor, date), 0) & bit):
+                return
+        # Another worker may have freed the slot since our last load
+        if self._taken(doctor, date, slot):
+            raise SlotConflict(f"{doctor} is already booked at {date} {slot}")
+        self.release(doctor, date, slot)
+
+    def _taken(self, doctor, date, slot):
+        slot = normalize_time(slot)
+        with get_db(self.path) as conn:
+            rows = conn.execute("SELECT time FROM appointments WHERE doctor = ? AND date = ? AND status = ?",
+                                (doctor, date, ACTIVE_STATUS)).fetchall()
+        return any(normalize_time(row["time"]) == slot for row in rows)
+
+    def book(self, doctor, date, slot):
+        with self._lock:
+            try:
+                bit = self._bit(doctor, slot)
+            except InvalidSlot:
+                return
+            if bit:
+                self.booked[(doctor, date)] = self.booked.get((doctor, date), 0) | bit
+
+    def release(self, doctor, date, slot):
+        with self._lock:
+            try:
+                bit = self._bit(doctor, slot)
+            except InvalidSlot:
+                return
+            if bit:
+                self.booked[(doctor, date)] = self.booked.get((doctor, date), 0) & ~bit
+
+    # --------------------------------------------------
+    # QUERIES
+    # --------------------------------------------------
+    def next_free(self, doctor=None, specialization=None, n=5, start=None, now=None):
+        """Next n free (date, time, doctor) slots, earliest first"""
+        self._ensure_fresh()
+        now = now or datetime.datetime.now()
+        start = start or now.date()
+        if doctor:
+            names = [doctor] if doctor in self.doctors else []
+        elif specialization:
+            names = self.by_specialization.get(specialization.casefold(), [])
+        else:
+            names = list(self.doctors)
+
+        found = []
+        with self._lock:
+            for offset in range(SEARCH_HORIZON_DAYS):
+                day = start + datetime.timedelta(days=offset)
+                date = day.isoformat()
+                earliest = now.strftime("%H:%M") if day == now.date() else ""
+                todays = []
+                for name in names:
+                    info = self.doctors[name]
+                    taken = self.booked.get((name, date), 0)
+                    for i, slot in enumerate(info["slots"]):
+                        if not taken >> i & 1 and slot > earliest:
+                            todays.append((slot, name))
+                todays.sort()
+                found.extend({"date": date, "time": t, "doctor": name} for t, name in todays)
+                if len(found) >= n:
+                    break
+        return found[:n]
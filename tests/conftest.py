@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# bench/standins.py: the in-process Firestore and Firebase Auth stand-ins
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A migrated hospital.db of its own, with the booking and patient index tables"""
+    from migrations import migrate
+    from patient_index import PatientIndex
+    from scheduling import Scheduler
+
+    path = str(tmp_path / "hospital.db")
+    migrate(path)
+    PatientIndex(None, path, listen=False).init_schema()
+    Scheduler(path).init_schema()
+    return path
@@ -0,0 +1,159 @@
+import json
+
+import pytest
+from flask import Flask, jsonify, request
+
+import admission
+from admission import Guard, IdempotencyStore, RateLimiter, parse_rate
+
+
+@pytest.fixture
+def keys(db_path):
+    keys = IdempotencyStore(db_path)
+    keys.init_schema()
+    return keys
+
+
+def make_app(keys, guard):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    admission.install(app, guard=guard, keys=keys)
+    app.calls = 0
+
+    @app.route("/create", methods=["POST"])
+    @admission.idempotent
+    def create():
+        app.calls += 1
+        if request.json.get("fail"):
+            return jsonify({"error": "upstream"}), 502
+        return jsonify({"id": app.calls})
+
+    @app.route("/plain", methods=["POST"])
+    def plain():
+        app.calls += 1
+        return jsonify({"id": app.calls})
+
+    return app
+
+
+@pytest.fixture
+def app(keys):
+    return make_app(keys, Guard(max_in_flight=0, session_rate="0", route_rate="0"))
+
+
+def post(client, body, key=None, path="/create", **kwargs):
+    return client.post(path, json=body, headers={"Idempotency-Key": key} if key else {}, **kwargs)
+
+
+def client_post_raw(app, body, key):
+    return app.test_client().post("/create", data=body, content_type="application/json",
+                                  headers={"Idempotency-Key": key})
+
+
+def test_parse_rate():
+    assert parse_rate("5/20") == (5.0, 20.0)
+    assert parse_rate("5") == (5.0, 5.0)
+    assert parse_rate("0") == (0.0, 0.0)
+
+
+def test_rate_limiter_allows_the_burst_then_waits():
+    limiter = RateLimiter(rate=1, burst=2)
+    assert limiter.take("a") == 0 and limiter.take("a") == 0
+    assert 0 < limiter.take("a") <= 1
+    # Buckets are per key
+    assert limiter.take("b") == 0
+    assert limiter.limited == 1
+
+
+def test_guard_sheds_past_max_in_flight():
+    guard = Guard(max_in_flight=1, session_rate="0", route_rate="0")
+    assert guard.admit("a", "GET /x", write=False) is None
+    error, wait = guard.admit("b", "GET /x", write=False)
+    assert guard.shed == 1 and wait > 0
+    guard.leave()
+    assert guard.admit("b", "GET /x", write=False) is None
+
+
+def test_guard_rate_limits_writes_only():
+    guard = Guard(max_in_flight=0, session_rate="1/1", route_rate="0")
+    assert guard.admit("a", "POST /x", write=True) is None
+    assert guard.admit("a", "POST /x", write=True) is not None
+    assert guard.admit("a", "GET /x", write=False) is None
+    assert guard.admit("b", "POST /x", write=True) is None
+
+
+def test_retry_with_the_same_key_replays_the_stored_response(app):
+    client = app.test_client()
+    first = post(client, {"name": "x"}, key="k1")
+    again = post(client, {"name": "x"}, key="k1")
+    assert first.status_code == again.status_code == 200
+    assert again.json == first.json and app.calls == 1
+    assert again.headers["Idempotent-Replayed"] == "true"
+    # A different key runs the request
+    assert post(client, {"name": "x"}, key="k2").json == {"id": 2}
+
+
+def test_key_reused_for_a_different_body_is_refused(app):
+    client = app.test_client()
+    post(client, {"name": "x"}, key="k1")
+    response = post(client, {"name": "y"}, key="k1")
+    assert response.status_code == 422 and app.calls == 1
+
+
+def test_retry_while_the_first_request_runs_gets_409(app, keys):
+    # What a concurrent first attempt leaves behind: a claim with no response yet
+    body = json.dumps({"name": "x"}).encode()
+    keys.claim(keys.scope("127.0.0.1", "POST /create", "k1"), keys.fingerprint(body))
+    response = client_post_raw(app, body, "k1")
+    assert response.status_code == 409 and response.headers["Retry-After"] == "1"
+    assert app.calls == 0
+
+
+def test_server_errors_release_the_key(app):
+    client = app.test_client()
+    assert post(client, {"fail": True}, key="k1").status_code == 502
+    assert post(client, {"fail": True}, key="k1").status_code == 502
+    assert app.calls == 2
+
+
+def test_keys_are_ignored_on_views_without_the_marker_and_checked_for_length(app):
+    client = app.test_client()
+    post(client, {}, key="k1", path="/plain")
+    post(client, {}, key="k1", path="/plain")
+    assert app.calls == 2
+    assert post(client, {}, key="x" * 300).status_code == 400
+
+
+def test_write_rate_limit_answers_429_with_retry_after(keys):
+    app = make_app(keys, Guard(max_in_flight=0, session_rate="1/1", route_rate="0"))
+    client = app.test_client()
+    assert post(client, {}, path="/plain").status_code == 200
+    response = post(client, {}, path="/plain")
+    assert response.status_code == 429 and int(response.headers["Retry-After"]) >= 1
+
+
+def test_requests_already_admitted_by_the_asgi_app_are_not_charged_again(keys):
+    guard = Guard(max_in_flight=0, session_rate="1/1", route_rate="0")
+    app = make_app(keys, guard)
+    client = app.test_client()
+    assert post(client, {}, path="/plain").status_code == 200
+    admitted = {admission.ADMITTED_ENVIRON: True}
+    assert post(client, {}, path="/plain", environ_base=admitted).status_code == 200
+    assert guard.in_flight == 0 and guard.sessions.limited == 0
+
+
+def test_each_login_gets_its_own_bucket(keys):
+    app = make_app(keys, Guard(max_in_flight=0, session_rate="1/1", route_rate="0"))
+    first, second = app.test_client(), app.test_client()
+    for client in (first, second):
+        with client.session_transaction() as session:
+            session.update(email="admin@example.com", sid=admission.new_session_id())
+    assert post(first, {}, path="/plain").status_code == 200
+    assert post(second, {}, path="/plain").status_code == 200
+    assert post(first, {}, path="/plain").status_code == 429
+
+
+def test_client_addr_takes_the_entry_the_trusted_proxy_appended():
+    assert admission.client_addr("10.0.0.1", "6.6.6.6, 1.2.3.4", proxies=1) == "1.2.3.4"
+    assert admission.client_addr("10.0.0.1", "1.2.3.4", proxies=2) == "10.0.0.1"
+    assert admission.client_addr("10.0.0.1", "1.2.3.4", proxies=0) == "10.0.0.1"
@@ -0,0 +1,78 @@
+import datetime
+import io
+
+import pytest
+
+from bulk_import import AppointmentImporter, read_rows
+from database import get_db
+from patient_index import PatientIndex
+from scheduling import Scheduler
+
+DAY = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+
+
+@pytest.fixture
+def importer(db_path):
+    with get_db(db_path) as conn:
+        conn.execute("INSERT INTO doctors (name, specialization, slots) VALUES ('Dr A', 'Cardiology', '09:00, 09:30')")
+        # Known to the directory only: the scheduler has no slots for it
+        conn.execute("INSERT INTO appointments (patient, doctor, date, time, status) VALUES ('Old', 'Dr Z', ?, '08:00', 'Booked')",
+                     (DAY,))
+    patients = PatientIndex(None, db_path, listen=False)
+    patients.upsert("p1", "Ann Lee", "ann@example.com")
+    patients.upsert("p2", "Bo Ray", "bo@example.com")
+    scheduler = Scheduler(db_path)
+    scheduler.load()
+    return AppointmentImporter(patients, scheduler, db_path, chunk_size=3, doctor_names=lambda: ["Dr A", "Dr Z"])
+
+
+def row(patient="Ann Lee", doctor="Dr A", date=DAY, time="09:00"):
+    return {"patient": patient, "doctor": doctor, "date": date, "time": time}
+
+
+def booked(path):
+    with get_db(path) as conn:
+        return sorted(tuple(r) for r in conn.execute("SELECT patient, doctor, time FROM appointments WHERE patient != 'Old'"))
+
+
+def test_valid_rows_are_inserted_across_chunks(importer):
+    report = importer.run([row(), row(" Bo Ray ", time="9:30")])
+    assert (report["rows"], report["inserted"], report["failed"], report["errors"]) == (2, 2, 0, [])
+    assert booked(importer.path) == [("Ann Lee", "Dr A", "09:00"), ("Bo Ray", "Dr A", "09:30")]
+    # The scheduler learns the imported bookings
+    assert importer.run([row("Bo Ray")])["errors"] == [{"row": 1, "error": f"Dr A is already booked at {DAY} 09:00"}]
+
+
+def test_bad_rows_are_reported_by_row_number(importer):
+    report = importer.run([
+        row(),
+        {"patient": "Ann Lee", "doctor": "Dr A", "date": DAY},
+        row("Nobody"),
+        row(doctor="Dr Q"),
+        row(time="11:00"),
+        row("Bo Ray"),
+        {"_error": "Bad JSON: x"},
+        "not a dict",
+        row(doctor="Dr Z", time="08:00"),
+    ])
+    assert report["rows"] == 9 and report["inserted"] == 1 and report["failed"] == 8
+    errors = {e["row"]: e["error"] for e in report["errors"]}
+    assert errors[2] == "Missing fields"
+    assert errors[3] == "Patient not found"
+    assert errors[4] == "Doctor not found"
+    assert errors[5] == "Dr A has no 11:00 slot"
+    # A duplicate within the same file, and one the unique index catches
+    assert errors[6] == f"Dr A is already booked at {DAY} 09:00"
+    assert errors[7] == "Bad JSON: x"
+    assert errors[8] == "Row is not an object"
+    assert "UNIQUE" in errors[9]
+    assert [e["row"] for e in report["errors"]] == sorted(errors)
+    assert booked(importer.path) == [("Ann Lee", "Dr A", "09:00")]
+
+
+def test_read_rows_parses_csv_and_ndjson():
+    csv_rows = list(read_rows(io.StringIO("patient,doctor,date,time\nAnn Lee,Dr A,2030-01-01,09:00\n"), "csv"))
+    assert csv_rows == [{"patient": "Ann Lee", "doctor": "Dr A", "date": "2030-01-01", "time": "09:00"}]
+    ndjson_rows = list(read_rows(io.StringIO('{"patient": "Ann Lee"}\n\n{oops\n'), "ndjson"))
+    assert ndjson_rows[0] == {"patient": "Ann Lee"}
+    assert len(ndjson_rows) == 2 and ndjson_rows[1]["_error"].startswith("Bad JSON")
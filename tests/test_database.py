@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+import database
+from database import ConnectionPool, decode_cursor, encode_cursor
+
+
+def test_failed_open_gives_its_slot_back(tmp_path, monkeypatch):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.1)
+    real_open = database._open
+
+    def locked(path, readonly):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(database, "_open", locked)
+    for _ in range(3):
+        with pytest.raises(RuntimeError, match="locked"):
+            with pool.connection():
+                pass
+    assert pool.stats()["opened"] == 0
+
+    monkeypatch.setattr(database, "_open", real_open)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone()[0] == 1
+
+
+def test_stats_count_every_checkout_across_threads(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=4)
+    per_thread = 200
+
+    def borrow():
+        for _ in range(per_thread):
+            with pool.connection() as conn:
+                conn.execute("SELECT 1")
+
+    threads = [threading.Thread(target=borrow) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = pool.stats()
+    assert stats["hits"] + stats["misses"] + stats["waits"] == 8 * per_thread
+    assert stats["opened"] <= 4
+
+
+def test_nested_use_joins_the_outer_transaction(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x)")
+    with pytest.raises(ZeroDivisionError):
+        with pool.connection() as outer:
+            outer.execute("INSERT INTO t VALUES (1)")
+            with pool.connection() as inner:
+                assert inner is outer
+            1 / 0
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_cursor_round_trip_and_shape_check():
+    token = encode_cursor("2024-01-02", 7)
+    assert decode_cursor(token) == ["2024-01-02", 7]
+    assert decode_cursor(token, 2) == ["2024-01-02", 7]
+    assert decode_cursor(None, 2) is None
+    for bad in (encode_cursor(5), "NQ", "!!!"):
+        with pytest.raises(ValueError):
+            decode_cursor(bad, 2)
@@ -0,0 +1,146 @@
+import datetime
+
+import pytest
+
+import standins
+from database import get_db
+from firestore_sync import FirestoreSync, LeaseLost
+
+
+@pytest.fixture
+def store():
+    return standins.FakeStore()
+
+
+@pytest.fixture
+def make_sync(db_path, store):
+    def make(**kwargs):
+        sync = FirestoreSync(standins.FakeFirestore(store), db_path, **kwargs)
+        sync.init_schema()
+        return sync
+    return make
+
+
+def old(store):
+    """A version outside the incremental overlap window"""
+    return store.now() - datetime.timedelta(hours=1)
+
+
+def seed(store, n):
+    for i in range(n):
+        store.write("patients", f"p{i}", {"name": f"Patient {i}", "email": f"p{i}@example.com", "updated_at": old(store)})
+
+
+def local(db_path, column="name"):
+    with get_db(db_path) as conn:
+        return {r["doc_id"]: r[column] for r in conn.execute(f"SELECT doc_id, {column} FROM patient_index")}
+
+
+def restart_snapshot(db_path):
+    with get_db(db_path) as conn:
+        conn.execute("UPDATE sync_checkpoints SET phase = 'restart'")
+        # Rows written locally after a snapshot starts survive it; these are older
+        conn.execute("UPDATE patient_index SET updated_at = 0")
+
+
+def test_snapshot_then_remote_deletes_are_reconciled(db_path, store, make_sync):
+    sync = make_sync(page_size=2)
+    seed(store, 5)
+    assert sync.pull("patients") == 5
+    assert set(local(db_path)) == {f"p{i}" for i in range(5)}
+    assert sync.checkpoint("patients")["phase"] == "incremental"
+
+    del store.rows("patients")["p1"], store.rows("patients")["p3"]
+    queued = sync.write("patients", {"name": "Walk-in", "email": None})
+    restart_snapshot(db_path)
+    sync.pull("patients")
+
+    # Gone from Firestore: deleted; not pushed yet: kept
+    assert set(local(db_path)) == {"p0", "p2", "p4", queued}
+    assert sync.counts["deleted"] == 2
+
+
+def test_interrupted_snapshot_resumes_from_its_checkpoint(db_path, store, make_sync, monkeypatch):
+    sync = make_sync(page_size=2)
+    seed(store, 5)
+    original = standins.FakeQuery._matches
+    pages = []
+
+    def second_page_fails(query):
+        pages.append(query.cursor)
+        if len(pages) == 2:
+            raise ConnectionError("stream reset")
+        return original(query)
+
+    monkeypatch.setattr(standins.FakeQuery, "_matches", second_page_fails)
+    with pytest.raises(ConnectionError):
+        sync.pull("patients")
+    checkpoint = sync.checkpoint("patients")
+    assert checkpoint["phase"] == "snapshot" and checkpoint["cursor_id"] == "p1"
+    assert set(local(db_path)) == {"p0", "p1"}
+
+    monkeypatch.setattr(standins.FakeQuery, "_matches", original)
+    assert sync.pull("patients") == 3
+    assert set(local(db_path)) == {f"p{i}" for i in range(5)}
+    assert sync.checkpoint("patients")["phase"] == "incremental"
+
+
+def test_incremental_pull_reads_only_changes(db_path, store, make_sync):
+    sync = make_sync()
+    seed(store, 4)
+    sync.pull("patients")
+    store.write("patients", "p2", {"email": "new@example.com", "updated_at": store.now()}, merge=True)
+    assert sync.pull("patients") == 1
+    assert local(db_path, "email")["p2"] == "new@example.com"
+    # Already applied: the overlap window re-reads it but changes nothing
+    assert sync.pull("patients") == 0
+
+
+@pytest.mark.parametrize("policy, winner", [("remote", "Remote Edit"), ("local", "Local Edit")])
+def test_concurrent_edits_follow_the_conflict_policy(db_path, store, make_sync, policy, winner):
+    sync = make_sync(policy=policy)
+    seed(store, 1)
+    sync.pull("patients")
+
+    sync.write("patients", {"name": "Local Edit"}, doc_id="p0")
+    store.write("patients", "p0", {"name": "Remote Edit", "updated_at": store.now()}, merge=True)
+    sync.sync_once()
+
+    assert sync.counts["conflicts"] == 1
+    assert local(db_path)["p0"] == winner
+    assert store.rows("patients")["p0"]["name"] == winner
+    # Settled either way: the next pass changes nothing
+    sync.sync_once()
+    assert local(db_path)["p0"] == winner and sync.counts["conflicts"] == 1
+
+
+def test_edit_based_on_the_current_version_is_not_a_conflict(db_path, store, make_sync):
+    sync = make_sync()
+    seed(store, 1)
+    sync.pull("patients")
+    sync.write("patients", {"name": "Renamed"}, doc_id="p0")
+    sync.sync_once()
+    assert store.rows("patients")["p0"]["name"] == "Renamed"
+    assert sync.counts["conflicts"] == 0
+
+
+def test_one_pass_at_a_time_across_engines_sharing_a_database(db_path, store, make_sync):
+    first, second = make_sync(), make_sync()
+    seed(store, 2)
+    assert first.acquire()
+    assert second.sync_once() is None
+    assert second.counts["skipped"] == 1 and local(db_path) == {}
+
+    first.release()
+    assert second.sync_once() == {"patients": 2, "doctors": 0, "pushed": 0}
+
+
+def test_pass_stops_once_its_lease_is_taken_over(db_path, store, make_sync):
+    # An expired lease (a stalled or dead holder) may be taken by another process
+    stalled, other = make_sync(lease_seconds=-1), make_sync()
+    seed(store, 2)
+    assert stalled.acquire()
+    assert other.acquire()
+    with pytest.raises(LeaseLost):
+        stalled.pull("patients")
+    assert local(db_path) == {}
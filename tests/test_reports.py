@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from archive import Archive
+from database import get_db
+from http_cache import table_versions
+from reports import Reports
+
+
+@pytest.fixture
+def reports(db_path, tmp_path):
+    with get_db(db_path) as conn:
+        conn.executemany("INSERT INTO appointments (patient, doctor, date, time, status) VALUES ('P', ?, ?, ?, ?)", [
+            ("Dr A", "2020-01-06", "09:00", "Booked"),
+            ("Dr A", "2020-02-03", "09:00", "Cancelled"),
+            ("Dr B", "2099-01-05", "10:00", "Booked"),
+        ])
+    return Reports(db_path, Archive(db_path, directory=str(tmp_path / "archive"), horizon_days=30))
+
+
+def doctor_days(path):
+    with get_db(path) as conn:
+        return sorted(tuple(row) for row in conn.execute("SELECT day, doctor, status, n FROM report_doctor_day"))
+
+
+def test_backfill_counts_archived_months_once(reports):
+    expected = doctor_days(reports.path)
+    assert reports.archive.run()["appointments"] == 2
+    assert doctor_days(reports.path) == expected
+    with get_db(reports.path) as conn:
+        conn.execute("DELETE FROM report_doctor_day")
+    reports.backfill()
+    assert doctor_days(reports.path) == expected
+
+
+def test_backfill_bumps_the_report_version(reports):
+    with get_db(reports.path) as conn:
+        before = table_versions(conn, ("appointments", "report"))
+    reports.backfill()
+    with get_db(reports.path) as conn:
+        after = table_versions(conn, ("appointments", "report"))
+    assert after["report"] == before["report"] + 1
+    assert after["appointments"] == before["appointments"]
+
+
+def test_backfill_starts_over_when_rows_are_archived_mid_pass(reports, monkeypatch):
+    expected = doctor_days(reports.path)
+    passes = []
+
+    def months():
+        # Archive the hot rows from another connection after the (empty) archives were read
+        passes.append(1)
+        if len(passes) == 1:
+            mover = threading.Thread(target=reports.archive.run)
+            mover.start()
+            mover.join()
+            return []
+        return Archive.months(reports.archive)
+
+    monkeypatch.setattr(reports.archive, "months", months)
+    reports.backfill()
+    assert len(passes) == 2
+    assert doctor_days(reports.path) == expected
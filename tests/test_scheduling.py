@@ -0,0 +1,92 @@
+import datetime
+
+import pytest
+
+from database import get_db
+from scheduling import Scheduler, SlotConflict, InvalidSlot, parse_slots, normalize_time
+
+DAY = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+
+
+@pytest.fixture
+def scheduler(db_path):
+    with get_db(db_path) as conn:
+        conn.executemany("INSERT INTO doctors (name, specialization, slots) VALUES (?, ?, ?)", [
+            ("Dr A", "Cardiology", "09:00, 9:30,10:00"),
+            ("Dr B", "Cardiology", "9am, 10:00:00, 10-30, 25:00, 11:00"),
+            ("Dr C", "General", "9am"),
+        ])
+    scheduler = Scheduler(db_path)
+    scheduler.load()
+    return scheduler
+
+
+def book(db_path, doctor, time, date=DAY):
+    with get_db(db_path) as conn:
+        conn.execute("INSERT INTO appointments (patient, doctor, date, time, status) VALUES ('P', ?, ?, ?, 'Booked')",
+                     (doctor, date, time))
+
+
+def test_parse_slots_normalizes_and_skips_malformed_parts():
+    assert parse_slots("10:00, 9:30,,9:30") == ["09:30", "10:00"]
+    assert parse_slots("9am, 10:00:00, 10-30, 25:00, 11:00") == ["11:00"]
+    assert parse_slots(None) == [] and parse_slots(5) == []
+    assert normalize_time(" 9:05") == "09:05"
+    assert normalize_time("9am") == "9am" and normalize_time(5) == 5
+
+
+def test_malformed_slots_on_one_doctor_do_not_break_loading(scheduler):
+    assert scheduler.doctors["Dr A"]["slots"] == ["09:00", "09:30", "10:00"]
+    assert scheduler.doctors["Dr B"]["slots"] == ["11:00"]
+    # Nothing bookable: not indexed at all
+    assert "Dr C" not in scheduler.doctors
+    scheduler.check("Dr B", DAY, "11:00")
+
+
+def test_unknown_slot_is_invalid(scheduler):
+    with pytest.raises(InvalidSlot):
+        scheduler.check("Dr A", DAY, "11:00")
+    with pytest.raises(InvalidSlot):
+        scheduler.check("Dr A", DAY, "9am")
+
+
+def test_booked_slot_conflicts_until_released(db_path, scheduler):
+    book(db_path, "Dr A", "09:30")
+    scheduler.book("Dr A", DAY, "9:30")
+    with pytest.raises(SlotConflict):
+        scheduler.check("Dr A", DAY, "09:30")
+    scheduler.check("Dr A", DAY, "10:00")
+
+    with get_db(db_path) as conn:
+        conn.execute("DELETE FROM appointments")
+    scheduler.release("Dr A", DAY, "09:30")
+    scheduler.check("Dr A", DAY, "09:30")
+
+
+def test_slot_freed_by_another_worker_is_not_refused(db_path, scheduler):
+    book(db_path, "Dr A", "09:00")
+    other_worker = Scheduler(db_path)
+    other_worker.load()
+    with get_db(db_path) as conn:
+        conn.execute("DELETE FROM appointments")
+    # The bitmap still has the slot taken; SQLite says it is free
+    other_worker.check("Dr A", DAY, "09:00")
+
+
+def test_database_rejects_a_double_booking(db_path):
+    import sqlite3
+
+    book(db_path, "Dr A", "09:00")
+    with pytest.raises(sqlite3.IntegrityError):
+        book(db_path, "Dr A", "09:00")
+
+
+def test_next_free_skips_booked_slots(db_path, scheduler):
+    book(db_path, "Dr A", "09:00")
+    scheduler.load()
+    tomorrow = datetime.date.fromisoformat(DAY)
+    found = scheduler.next_free(specialization="cardiology", n=3, start=tomorrow,
+                                now=datetime.datetime.combine(tomorrow, datetime.time(0, 0)))
+    assert found == [{"date": DAY, "time": "09:30", "doctor": "Dr A"},
+                     {"date": DAY, "time": "10:00", "doctor": "Dr A"},
+                     {"date": DAY, "time": "11:00", "doctor": "Dr B"}]